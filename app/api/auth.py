@@ -1,5 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any
+import hashlib
+
+from app import config
+from app.models.session import sessions
 
 router = APIRouter()
 
@@ -12,5 +16,22 @@ async def auth_status() -> Dict[str, Any]:
 @router.post("/validate")
 async def validate_session(session_data: Dict[str, Any]) -> Dict[str, Any]:
     """Validate session from SvelteKit frontend"""
-    # This will validate sessions from the frontend auth system
-    return {"valid": True, "user_id": "placeholder"}
\ No newline at end of file
+    if not config.DATABASE_ENABLED:
+        return {"valid": True, "user_id": "placeholder"}
+
+    # The frontend stores sessions under the SHA-256 of the cookie token
+    session_id = session_data.get("session_id")
+    if not session_id and session_data.get("token"):
+        session_id = hashlib.sha256(session_data["token"].encode()).hexdigest()
+    if not session_id:
+        raise HTTPException(status_code=400, detail="session_id or token is required")
+
+    session = await sessions.validate(session_id)
+    if session is None:
+        return {"valid": False}
+    return {
+        "valid": True,
+        "user_id": session["user_id"],
+        "username": session["username"],
+        "expires_at": session["expires_at"].isoformat()
+    }
\ No newline at end of file
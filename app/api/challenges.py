@@ -1,7 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from typing import List, Dict, Any, Optional
+import math
+import time
 import uuid
 
+from app import config
+from app.api.websocket import broadcast_to_session
+from app.core.admission import Reservation, admission
+from app.core.challenge_engine import CachedBody, challenge_catalog, etag_matches
+from app.core.execution import BACKEND_DOCKER, BACKEND_VIRTUAL, ExecutionBackend, challenge_backend
+from app.core.images import challenge_image_tag
+from app.core.sandbox_pool import sandbox_pools
+from app.core.scoring import scoring_engine
+from app.core.session_manager import session_manager
+from app.core.submissions import Submission, submission_pipeline
+from app.core.virtual_shell import VirtualShell, filesystem_snapshots
+from app.models.challenge import public_files
+from app.models.leaderboard import leaderboard
+from app.utils.exceptions import AdmissionRejected, RateLimitExceeded, SubmissionQueueFull
+
 router = APIRouter()
 
 # Temporary in-memory storage for challenges
@@ -16,6 +33,7 @@ SAMPLE_CHALLENGES = [
         "instructions": "Use the 'ls' command to list all files in the current directory. Then use 'ls -la' to see detailed information.",
         "expected_commands": ["ls", "ls -la"],
         "flag": "CLI_QUEST_LS_MASTER",
+        "backend": "virtual",
         "setup_files": {
             "file1.txt": "This is file 1",
             "file2.txt": "This is file 2",
@@ -30,7 +48,12 @@ SAMPLE_CHALLENGES = [
         "category": "file-operations",
         "instructions": "Use the 'cat' command to read the contents of secret.txt. The flag is hidden inside!",
         "expected_commands": ["cat secret.txt"],
+        "objectives": [
+            {"id": "read-secret", "description": "Read secret.txt", "command": "cat secret.txt"},
+            {"id": "find-flag", "description": "Print the flag", "output_contains": "CLI_QUEST_CAT_READER"}
+        ],
         "flag": "CLI_QUEST_CAT_READER",
+        "backend": "virtual",
         "setup_files": {
             "secret.txt": "The flag is: CLI_QUEST_CAT_READER\nCongratulations on reading this file!",
             "readme.txt": "Try reading different files to find the flag!"
@@ -39,75 +62,240 @@ SAMPLE_CHALLENGES = [
 ]
 
 
+challenge_catalog.load(SAMPLE_CHALLENGES)
+scoring_engine.configure(SAMPLE_CHALLENGES)
+
+
+def get_challenge_image(challenge: Dict[str, Any]) -> str:
+    """Get the sandbox image a challenge runs in"""
+    return challenge.get("image") or challenge_image_tag(challenge)
+
+
+def needs_admission(challenge: Dict[str, Any]) -> bool:
+    """Whether starting a challenge may create a new container"""
+    if challenge_backend(challenge) == BACKEND_VIRTUAL or not config.SANDBOX_ENABLED:
+        return False
+    # Claiming a warm container commits nothing new; its refill is admitted separately
+    return not sandbox_pools.has_ready(get_challenge_image(challenge))
+
+
+async def create_session_backend(
+    challenge: Dict[str, Any],
+    session_id: str,
+    reservation: Optional[Reservation] = None
+) -> Optional[ExecutionBackend]:
+    """
+    Start the execution backend a challenge declares
+
+    Virtual shell challenges always get an in-process shell. Container
+    challenges get a warm sandbox, or None while sandboxes are disabled.
+    A reservation granted by admission control is handed to the container.
+    """
+    if challenge_backend(challenge) == BACKEND_VIRTUAL:
+        # Sessions are copy-on-write layers over the challenge's shared baseline
+        snapshot = filesystem_snapshots.get(challenge["id"], challenge.get("setup_files", {}))
+        shell = VirtualShell(session_id, snapshot=snapshot)
+        await shell.initialize()
+        return shell
+
+    if not config.SANDBOX_ENABLED:
+        return None
+
+    # Claim a warm container; challenge files are already baked into its image
+    return await sandbox_pools.acquire(get_challenge_image(challenge), session_id, reservation)
+
+
+def get_challenge_or_404(challenge_id: str) -> Dict[str, Any]:
+    """Look up a challenge by ID or raise a 404"""
+    challenge = challenge_catalog.get(challenge_id)
+
+    if not challenge:
+        raise HTTPException(status_code=404, detail="Challenge not found")
+
+    return challenge
+
+
+def _cached_response(request: Request, cached: CachedBody) -> Response:
+    """Serve a pre-serialized body, answering 304 when the client's copy is current"""
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
 @router.get("/")
-async def get_challenges() -> List[Dict[str, Any]]:
-    """Get all available challenges"""
-    return [
-        {
-            "id": challenge["id"],
-            "title": challenge["title"],
-            "description": challenge["description"],
-            "difficulty": challenge["difficulty"],
-            "category": challenge["category"]
-        }
-        for challenge in SAMPLE_CHALLENGES
-    ]
+async def get_challenges(
+    request: Request,
+    category: Optional[str] = None,
+    difficulty: Optional[str] = None
+) -> Response:
+    """Get all available challenges, optionally filtered by category and difficulty"""
+    return _cached_response(request, challenge_catalog.list_body(category, difficulty))
 
 
 @router.get("/{challenge_id}")
-async def get_challenge(challenge_id: str) -> Dict[str, Any]:
+async def get_challenge(challenge_id: str, request: Request) -> Response:
     """Get a specific challenge by ID"""
-    challenge = next((c for c in SAMPLE_CHALLENGES if c["id"] == challenge_id), None)
+    # The cached detail body never includes the flag
+    cached = challenge_catalog.detail_body(challenge_id)
 
-    if not challenge:
+    if cached is None:
         raise HTTPException(status_code=404, detail="Challenge not found")
 
-    # Don't expose the flag in the response
-    response = challenge.copy()
-    response.pop("flag", None)
-
-    return response
+    return _cached_response(request, cached)
 
 
 @router.post("/{challenge_id}/start")
-async def start_challenge(challenge_id: str) -> Dict[str, Any]:
-    """Start a challenge session"""
-    challenge = next((c for c in SAMPLE_CHALLENGES if c["id"] == challenge_id), None)
+async def start_challenge(challenge_id: str, request: Request, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Start a challenge session
 
-    if not challenge:
-        raise HTTPException(status_code=404, detail="Challenge not found")
+    When the host has no room for another container the session is queued
+    and started in the background; the terminal websocket reports its queue
+    position until then. Requests that cannot be queued get a 503 with
+    Retry-After.
+    """
+    challenge = get_challenge_or_404(challenge_id)
 
     # Generate a session ID for this challenge attempt
     session_id = str(uuid.uuid4())
+    response = {
+        "session_id": session_id,
+        "challenge_id": challenge_id,
+        "websocket_url": f"/api/terminal/{session_id}",
+        "setup_files": public_files(challenge.get("setup_files", {})),
+        "status": "ready"
+    }
+
+    reservation = None
+    if needs_admission(challenge):
+        # User identity comes from the auth layer once wired up; fall back to the client address
+        user_key = user_id or (request.client.host if request.client else "unknown")
+        try:
+            ticket = admission.admit(user_key, session_id)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=503,
+                detail="All sandboxes are busy. Please retry shortly.",
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+
+        if not ticket.granted:
+            async def start_when_admitted(granted: Reservation):
+                backend = await create_session_backend(challenge, session_id, granted)
+                await session_manager.register(session_id, backend, challenge_id)
+
+            admission.schedule(ticket, start_when_admitted)
+            # Sessions nobody is connected to give way to learners who are waiting
+            await session_manager.evict_detached(BACKEND_DOCKER)
+            eta = admission.eta(ticket)
+            response.update({
+                "status": "queued",
+                "queue_position": admission.position(ticket),
+                "eta_seconds": round(eta, 1) if eta is not None else None
+            })
+            return response
+        reservation = ticket.reservation
+
+    backend = await create_session_backend(challenge, session_id, reservation)
+    if backend is not None:
+        await session_manager.register(session_id, backend, challenge_id)
+
+    return response
+
+
+@router.post("/{challenge_id}/reset")
+async def reset_challenge(challenge_id: str, reset: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Restore a session's workspace to the challenge's starting state
+
+    The session keeps its sandbox; only the files it changed are discarded,
+    so retrying a challenge doesn't cost a new container.
+    """
+    get_challenge_or_404(challenge_id)
+
+    session_id = reset.get("session_id", "")
+    session = session_manager.get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.challenge_id is not None and session.challenge_id != challenge_id:
+        raise HTTPException(status_code=409, detail="Session belongs to a different challenge")
+
+    started = time.perf_counter()
+    try:
+        await session.sandbox.reset()
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    session_manager.touch(session_id)
+    elapsed = time.perf_counter() - started
+
+    await broadcast_to_session(session_id, {"type": "reset", "challenge_id": challenge_id})
 
     return {
         "session_id": session_id,
         "challenge_id": challenge_id,
-        "websocket_url": f"/api/terminal/{session_id}",
-        "setup_files": challenge.get("setup_files", {})
+        "status": "reset",
+        "elapsed_ms": round(elapsed * 1000, 3)
     }
 
 
 @router.post("/{challenge_id}/submit")
-async def submit_flag(challenge_id: str, submission: Dict[str, str]) -> Dict[str, Any]:
+async def submit_flag(challenge_id: str, submission: Dict[str, str], request: Request) -> Dict[str, Any]:
     """Submit a flag for verification"""
-    challenge = next((c for c in SAMPLE_CHALLENGES if c["id"] == challenge_id), None)
+    challenge = get_challenge_or_404(challenge_id)
 
-    if not challenge:
-        raise HTTPException(status_code=404, detail="Challenge not found")
+    # User identity comes from the auth layer once wired up; until then anyone can
+    # claim any user_id, so attempts are limited by client address first
+    user_id = submission.get("user_id")
+    address = request.client.host if request.client else "unknown"
+
+    try:
+        submission_pipeline.check_rate(address, user_id)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts. Slow down!",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
 
     submitted_flag = submission.get("flag", "").strip()
     expected_flag = challenge["flag"]
+    correct = submitted_flag == expected_flag
+    # Only a player's first solve awards anything
+    awarded = 0
 
-    if submitted_flag == expected_flag:
+    if user_id:
+        new_solve = correct and not leaderboard.has_solved(user_id, challenge_id)
+        attempt = Submission(user_id, challenge_id, correct)
+        try:
+            # Persisted in the background, so a full queue is refused before anything is scored
+            submission_pipeline.submit(attempt)
+        except SubmissionQueueFull as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Submissions are temporarily overloaded. Please retry.",
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+
+        if new_solve:
+            update = scoring_engine.record_solve(user_id, challenge_id)
+            if update is not None:
+                # Dynamic value: decays with the solve count, plus a bonus for the first solvers.
+                # The writer only reads the attempt after this handler returns.
+                awarded = attempt.points = update.awarded
+                leaderboard.record_solve(user_id, submission.get("username", user_id), challenge_id, awarded)
+                # Earlier solvers lose whatever the challenge's value just dropped by
+                leaderboard.apply_scores(update.totals)
+
+    if correct:
         return {
             "success": True,
             "message": "Congratulations! You've completed the challenge!",
-            "points": 100  # Basic scoring
+            "points": awarded
         }
     else:
         return {
             "success": False,
             "message": "Incorrect flag. Keep trying!",
             "points": 0
-        }
\ No newline at end of file
+        }
@@ -1,19 +1,23 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from typing import Dict, Any, List
 
+from app.models.leaderboard import leaderboard
+
 router = APIRouter()
 
 @router.get("/")
-async def get_leaderboard() -> List[Dict[str, Any]]:
+async def get_leaderboard(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500)
+) -> List[Dict[str, Any]]:
     """Get the current leaderboard"""
-    # Sample leaderboard data
-    return [
-        {"rank": 1, "username": "cli_master", "score": 1500, "challenges_completed": 15},
-        {"rank": 2, "username": "terminal_ninja", "score": 1200, "challenges_completed": 12},
-        {"rank": 3, "username": "bash_wizard", "score": 900, "challenges_completed": 9}
-    ]
+    # The first page is served from the cached top-K snapshot
+    return leaderboard.page(offset, limit)
 
 @router.get("/user/{user_id}")
 async def get_user_rank(user_id: str) -> Dict[str, Any]:
     """Get a specific user's rank and stats"""
-    return {"message": "User rank endpoint - to be implemented"}
\ No newline at end of file
+    standing = leaderboard.rank(user_id)
+    if standing is None:
+        raise HTTPException(status_code=404, detail="User has no solves yet")
+    return standing
@@ -1,17 +1,191 @@
 from fastapi import APIRouter
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
+import asyncio
+import json
+import math
+
+from app import config
+from app.core.admission import admission
+from app.core.challenge_engine import ObjectiveProgress, challenge_catalog
+from app.core.fanout import Subscriber, session_fanout
+from app.core.session_manager import SandboxSession, session_manager
+from app.core.scrollback import ScrollbackBuffer
+from app.core.terminal import PtyStream
+from app.core.transcripts import EVENT_OUTPUT, transcripts
+from app.core.transport import TerminalTransport
 
 router = APIRouter()
 
+# Store active WebSocket connections (sandboxes are tracked by the session manager)
+active_connections: Dict[str, TerminalTransport] = {}
+
 # WebSocket functionality is implemented directly in main.py
 # This file can be used for WebSocket-related utilities and helpers
 
+async def send_terminal_output(
+    transport: TerminalTransport,
+    session_id: str,
+    scrollback: ScrollbackBuffer,
+    data: Union[str, bytes],
+    progress: Optional[ObjectiveProgress] = None
+):
+    """Record output in the session's scrollback and transcript, send it, then match it against objectives"""
+    payload = data.encode("utf-8") if isinstance(data, str) else data
+    seq = scrollback.write(payload)
+    transcripts.record(session_id, EVENT_OUTPUT, payload)
+    session_fanout.publish_output(session_id, payload, seq)
+    await transport.send_output(payload, seq)
+    if progress is not None:
+        await progress.report(progress.feed_output(payload))
+
+async def record_local_echo(
+    transport: TerminalTransport,
+    session_id: str,
+    scrollback: ScrollbackBuffer,
+    text: str
+):
+    """
+    Account for text the client echoed itself (commands in command mode)
+
+    It goes into the scrollback and out to viewers, and the client is sent
+    the sequence number past it since it never received those bytes.
+    """
+    payload = text.encode("utf-8")
+    seq = scrollback.write(payload)
+    session_fanout.publish_output(session_id, payload, seq)
+    await transport.send_message({"type": "sync", "seq": seq})
+
+async def resume_terminal_output(transport: TerminalTransport, scrollback: ScrollbackBuffer, seq: Optional[int]):
+    """
+    Bring a (re)connecting client up to date from the session's scrollback
+
+    Sends {"type": "sync", "seq", "truncated"} with the sequence number the
+    replay starts at, then the output after seq (all of the scrollback for a
+    client without one). Clients count output bytes from there on, and send
+    the count back as ?resume= when they reconnect. "truncated" means some
+    of the output the client missed has already been overwritten.
+    """
+    start, data = scrollback.since(seq if seq is not None else 0)
+    await transport.send_message({
+        "type": "sync",
+        "seq": start,
+        "truncated": seq is not None and start > seq
+    })
+    if data:
+        await transport.send_output(data, start + len(data))
+
+async def stream_terminal_output(
+    transport: TerminalTransport,
+    terminal: PtyStream,
+    session_id: str,
+    scrollback: ScrollbackBuffer,
+    progress: Optional[ObjectiveProgress] = None
+):
+    """Push PTY output to the client as it arrives, pausing while the client is behind"""
+    while True:
+        chunk = await terminal.read()
+        if not chunk:
+            break
+        await send_terminal_output(transport, session_id, scrollback, chunk, progress)
+
+    await send_terminal_output(transport, session_id, scrollback, "\r\n[Shell exited]\r\n")
+
+async def wait_for_admission(transport: TerminalTransport, session_id: str) -> bool:
+    """
+    Keep a queued session's client informed until its sandbox starts
+
+    Sends {"type": "queue", "position", "eta_seconds"} whenever either
+    changes. Returns False, after telling the client when to retry, if the
+    session was shed or failed to start.
+    """
+    pending = admission.pending(session_id)
+    if pending is None:
+        return True
+    ticket, task = pending
+
+    last_update = None
+    while not task.done():
+        eta = admission.eta(ticket)
+        update = (admission.position(ticket), round(eta) if eta is not None else None)
+        if update != last_update and update[0] > 0:
+            await transport.send_message({"type": "queue", "position": update[0], "eta_seconds": update[1]})
+            last_update = update
+        await asyncio.wait({task}, timeout=config.ADMISSION_UPDATE_INTERVAL)
+
+    error = task.exception() if not task.cancelled() else asyncio.CancelledError()
+    if error is None:
+        return True
+
+    retry_after = math.ceil(getattr(error, "retry_after", config.ADMISSION_RETRY_AFTER))
+    await transport.send_message({
+        "type": "error",
+        "data": f"All sandboxes are busy. Please retry in {retry_after}s.\r\n",
+        "retry_after": retry_after
+    })
+    return False
+
 async def broadcast_to_session(session_id: str, message: Dict[str, Any]):
-    """Broadcast a message to a specific session"""
-    # Implementation for broadcasting messages
-    pass
+    """Send a control message to a session's learner and everyone watching it"""
+    session_fanout.publish_message(session_id, message)
+    transport = active_connections.get(session_id)
+    if transport is not None:
+        await transport.send_message(message)
+
+def track_objectives(session: SandboxSession) -> Optional[ObjectiveProgress]:
+    """
+    The session's objective tracker, started on its first connection
+
+    Sessions without a challenge, or whose challenge has no objectives,
+    aren't tracked. Progress is reported to the learner and viewers as
+    {"type": "progress", "challenge_id", "completed", "done", "total", "complete"}.
+    """
+    if session.progress is None and session.challenge_id is not None:
+        objectives = challenge_catalog.objectives(session.challenge_id)
+        if objectives:
+            session.progress = ObjectiveProgress(
+                objectives,
+                session.sandbox,
+                lambda message: broadcast_to_session(session.session_id, message)
+            )
+    return session.progress
+
+async def serve_viewer(subscriber: Subscriber):
+    """
+    Run a viewer socket until it disconnects
+
+    Multiplexed viewers manage what they watch with {"type": "subscribe" or
+    "unsubscribe", "session_ids": [...]}; sessions that aren't live on this
+    node are answered with an error naming them, and sessions that end are
+    announced with {"type": "end", "session_id", "data": reason}. Other
+    input is ignored, since viewers are read-only.
+    """
+    try:
+        while not subscriber.closed:
+            message = await subscriber.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if not subscriber.multiplexed or not message.get("text"):
+                continue
+            try:
+                request = json.loads(message["text"])
+                session_ids = [str(session_id) for session_id in request.get("session_ids", [])]
+            except (ValueError, AttributeError, TypeError):
+                continue
+
+            if request.get("type") == "subscribe":
+                missing = [sid for sid in session_ids if not session_fanout.subscribe(subscriber, sid)]
+                if missing:
+                    subscriber.offer(json.dumps({"type": "error", "data": "Session not found", "session_ids": missing}))
+            elif request.get("type") == "unsubscribe":
+                for session_id in session_ids:
+                    session_fanout.unsubscribe(subscriber, session_id)
+    finally:
+        session_fanout.unsubscribe_all(subscriber)
+        await subscriber.close()
 
 async def cleanup_session(session_id: str):
     """Clean up resources for a session"""
-    # Implementation for session cleanup
-    pass
\ No newline at end of file
+    transport = active_connections.pop(session_id, None)
+    if transport is not None:
+        await transport.close()
+    await session_manager.remove(session_id)
\ No newline at end of file
@@ -0,0 +1,332 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app import config
+from app.services.metrics import metrics
+from app.utils.exceptions import AdmissionRejected
+from app.utils.logger import setup_logger
+from app.utils.validators import parse_memory_size
+
+logger = setup_logger(__name__)
+
+# Docker's default CFS period: cpu_quota / period is the share of one core
+CPU_PERIOD = 100000
+
+ADMISSION_SHED = metrics.counter("cli_quest_admission_shed_total", "Session requests turned away with a retry hint")
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "cli_quest_admission_wait_seconds",
+    "Time session requests spent queued for host capacity"
+)
+
+
+def _host_memory_bytes() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def default_memory_capacity() -> int:
+    """Memory sandboxes may commit: ADMISSION_MEMORY_LIMIT, or a fraction of host RAM"""
+    if config.ADMISSION_MEMORY_LIMIT:
+        return parse_memory_size(config.ADMISSION_MEMORY_LIMIT)
+    return int(_host_memory_bytes() * config.ADMISSION_MEMORY_FRACTION)
+
+
+def default_cpu_capacity() -> float:
+    """Cores sandboxes may commit: ADMISSION_CPU_LIMIT, or host cores times the overcommit"""
+    if config.ADMISSION_CPU_LIMIT:
+        return float(config.ADMISSION_CPU_LIMIT)
+    return (os.cpu_count() or 1) * config.ADMISSION_CPU_OVERCOMMIT
+
+
+class Reservation:
+    """Host memory and CPU held by one sandbox container until released"""
+
+    __slots__ = ("controller", "memory", "cpu", "released")
+
+    def __init__(self, controller: "AdmissionController", memory: int, cpu: float):
+        self.controller = controller
+        self.memory = memory
+        self.cpu = cpu
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionTicket:
+    """A session request waiting for (or granted) host capacity"""
+
+    __slots__ = ("user_key", "session_id", "future", "enqueued_at", "reservation")
+
+    def __init__(self, user_key: str, session_id: Optional[str] = None):
+        self.user_key = user_key
+        self.session_id = session_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+        self.reservation: Optional[Reservation] = None
+
+    @property
+    def granted(self) -> bool:
+        return self.reservation is not None
+
+
+class AdmissionController:
+    """
+    Admission control for sandbox containers against host capacity
+
+    Every running container holds a Reservation of its memory limit and CPU
+    quota. A session request is admitted at once while the host has room;
+    otherwise it waits in a queue that is served round-robin across users, so
+    one user opening many sessions cannot starve everyone else. Capacity is
+    handed to the next ticket as soon as a container is released.
+
+    Requests are shed with a retry hint rather than queued when the queue is
+    full, the user already has too many requests waiting, or the estimated
+    wait is longer than max_wait. Background work (warm pool refills) only
+    gets capacity nobody is queued for.
+    """
+
+    def __init__(
+        self,
+        memory_capacity: Optional[int] = None,
+        cpu_capacity: Optional[float] = None,
+        sandbox_memory: int = parse_memory_size(config.SANDBOX_MEM_LIMIT),
+        sandbox_cpu: float = config.SANDBOX_CPU_QUOTA / CPU_PERIOD,
+        queue_size: int = config.ADMISSION_QUEUE_SIZE,
+        max_queued_per_user: int = config.ADMISSION_MAX_QUEUED_PER_USER,
+        max_wait: float = config.ADMISSION_MAX_WAIT
+    ):
+        self.memory_capacity = memory_capacity if memory_capacity is not None else default_memory_capacity()
+        self.cpu_capacity = cpu_capacity if cpu_capacity is not None else default_cpu_capacity()
+        self.sandbox_memory = sandbox_memory
+        self.sandbox_cpu = sandbox_cpu
+        self.queue_size = queue_size
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait
+
+        self.committed_memory = 0
+        self.committed_cpu = 0.0
+
+        # Round-robin over users, FIFO within each user
+        self._queues: "OrderedDict[str, Deque[AdmissionTicket]]" = OrderedDict()
+        self._queued = 0
+        self._pending: Dict[str, Tuple[AdmissionTicket, asyncio.Task]] = {}
+
+        # Smoothed seconds between grants while requests are queued, for ETAs
+        self._grant_interval: Optional[float] = None
+        self._last_grant: Optional[float] = None
+
+        # Admission statistics
+        self.admitted = 0
+        self.queued_total = 0
+        self.shed = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return self._queued
+
+    def _fits(self, count: int = 1) -> bool:
+        return (
+            self.committed_memory + count * self.sandbox_memory <= self.memory_capacity
+            and self.committed_cpu + count * self.sandbox_cpu <= self.cpu_capacity + 1e-9
+        )
+
+    def reserve(self) -> Reservation:
+        """Account for a container unconditionally (callers decide whether it may start)"""
+        reservation = Reservation(self, self.sandbox_memory, self.sandbox_cpu)
+        self.committed_memory += reservation.memory
+        self.committed_cpu += reservation.cpu
+        return reservation
+
+    def _release(self, reservation: Reservation):
+        self.committed_memory -= reservation.memory
+        self.committed_cpu -= reservation.cpu
+        self._dispatch()
+
+    def background_slots(self) -> int:
+        """How many containers background work may start without taking capacity from queued users"""
+        if self._queued:
+            return 0
+        slots = 0
+        while self._fits(slots + 1):
+            slots += 1
+        return slots
+
+    def admit(self, user_key: str, session_id: Optional[str] = None) -> AdmissionTicket:
+        """
+        Ask for capacity for one container
+
+        Returns:
+            A granted ticket holding a reservation, or a queued ticket
+
+        Raises:
+            AdmissionRejected: If the request should be retried later instead
+        """
+        ticket = AdmissionTicket(user_key, session_id)
+        if not self._queued and self._fits():
+            self._grant(ticket)
+            return ticket
+
+        if self._queued >= self.queue_size:
+            self._shed(f"admission queue is full ({self._queued})")
+        user_queue = self._queues.get(user_key)
+        if user_queue is not None and len(user_queue) >= self.max_queued_per_user:
+            self._shed(f"{user_key} already has {len(user_queue)} queued sessions")
+        eta = self._eta_for(self._queued + 1)
+        if eta is not None and eta > self.max_wait:
+            self._shed(f"estimated wait {eta:.0f}s exceeds {self.max_wait:.0f}s")
+
+        if user_queue is None:
+            user_queue = deque()
+            self._queues[user_key] = user_queue
+        user_queue.append(ticket)
+        self._queued += 1
+        self.queued_total += 1
+        return ticket
+
+    def _shed(self, reason: str):
+        self.shed += 1
+        ADMISSION_SHED.inc()
+        retry_after = self._eta_for(self._queued + 1) or config.ADMISSION_RETRY_AFTER
+        logger.warning(f"Shedding session request: {reason}")
+        raise AdmissionRejected(reason, retry_after=max(1.0, min(retry_after, self.max_wait)))
+
+    def _grant(self, ticket: AdmissionTicket):
+        ticket.reservation = self.reserve()
+        self.admitted += 1
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued_at)
+        if not ticket.future.done():
+            ticket.future.set_result(ticket.reservation)
+
+    def _dispatch(self):
+        """Grant queued tickets, one user at a time, while capacity allows"""
+        while self._queued and self._fits():
+            user_key, user_queue = next(iter(self._queues.items()))
+            ticket = user_queue.popleft()
+            self._queued -= 1
+            if user_queue:
+                self._queues.move_to_end(user_key)
+            else:
+                del self._queues[user_key]
+            if ticket.future.done():
+                continue
+
+            now = time.monotonic()
+            if self._last_grant is not None:
+                interval = now - self._last_grant
+                self._grant_interval = interval if self._grant_interval is None else 0.8 * self._grant_interval + 0.2 * interval
+            self._last_grant = now
+            self._grant(ticket)
+
+    def _remove(self, ticket: AdmissionTicket):
+        user_queue = self._queues.get(ticket.user_key)
+        if user_queue is not None and ticket in user_queue:
+            user_queue.remove(ticket)
+            self._queued -= 1
+            if not user_queue:
+                del self._queues[ticket.user_key]
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """1-based place in line, following the round-robin order; 0 once granted"""
+        user_queue = self._queues.get(ticket.user_key)
+        if ticket.granted or user_queue is None or ticket not in user_queue:
+            return 0
+        index = user_queue.index(ticket)
+        ahead = index
+        before_user = True
+        for user_key, other in self._queues.items():
+            if user_key == ticket.user_key:
+                before_user = False
+                continue
+            ahead += min(len(other), index + (1 if before_user else 0))
+        return ahead + 1
+
+    def _eta_for(self, position: int) -> Optional[float]:
+        if self._grant_interval is None:
+            return None
+        return position * self._grant_interval
+
+    def eta(self, ticket: AdmissionTicket) -> Optional[float]:
+        """Estimated seconds until a ticket is granted, once grants have been observed"""
+        position = self.position(ticket)
+        if position == 0:
+            return 0.0
+        return self._eta_for(position)
+
+    async def wait(self, ticket: AdmissionTicket) -> Reservation:
+        """
+        Wait until a queued ticket is granted
+
+        Raises:
+            AdmissionRejected: If no capacity freed up within max_wait
+        """
+        if ticket.granted:
+            return ticket.reservation
+        try:
+            return await asyncio.wait_for(asyncio.shield(ticket.future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self._remove(ticket)
+            if ticket.granted:
+                return ticket.reservation
+            self.expired += 1
+            ADMISSION_SHED.inc()
+            raise AdmissionRejected(
+                f"no sandbox capacity within {self.max_wait:.0f}s",
+                retry_after=config.ADMISSION_RETRY_AFTER
+            )
+        except asyncio.CancelledError:
+            self._remove(ticket)
+            if ticket.granted:
+                ticket.reservation.release()
+            raise
+
+    def schedule(self, ticket: AdmissionTicket, start: Callable[[Reservation], Awaitable[Any]]):
+        """Start a session in the background once its queued ticket is granted"""
+        async def run():
+            try:
+                reservation = await self.wait(ticket)
+                await start(reservation)
+            finally:
+                self._pending.pop(ticket.session_id, None)
+
+        task = asyncio.create_task(run())
+        self._pending[ticket.session_id] = (ticket, task)
+
+    def pending(self, session_id: str) -> Optional[Tuple[AdmissionTicket, asyncio.Task]]:
+        """Queued ticket and start task of a session that is still waiting"""
+        return self._pending.get(session_id)
+
+    async def shutdown(self):
+        """Cancel every queued session start"""
+        tasks = [task for _, task in self._pending.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory_capacity_bytes": self.memory_capacity,
+            "committed_memory_bytes": self.committed_memory,
+            "cpu_capacity": self.cpu_capacity,
+            "committed_cpu": round(self.committed_cpu, 3),
+            "queued": self._queued,
+            "queued_users": len(self._queues),
+            "queue_size": self.queue_size,
+            "grant_interval_s": round(self._grant_interval, 3) if self._grant_interval is not None else None,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "shed": self.shed,
+            "expired": self.expired
+        }
+
+
+# Process-wide admission controller
+admission = AdmissionController()
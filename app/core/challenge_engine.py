@@ -1 +1,542 @@
-# Challenge validation logic
\ No newline at end of file
+import asyncio
+import hashlib
+import json
+import re
+import shlex
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from app import config
+from app.core.execution import ExecutionBackend, FileCheck
+from app.core.terminal import LineBuffer
+from app.models.challenge import challenge_detail, challenge_summary, objective_id
+from app.services.metrics import metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+OBJECTIVES_COMPLETED = metrics.counter("cli_quest_objectives_completed_total", "Challenge objectives completed by learners")
+FILE_CHECKS = metrics.counter("cli_quest_objective_file_checks_total", "Workspace file checks run for objectives")
+
+
+def _encode(payload: Any) -> bytes:
+    """Serialize the way FastAPI's JSONResponse does"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class CachedBody:
+    """A pre-serialized JSON response body and its ETag"""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, payload: Any):
+        self.body = _encode(payload)
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+
+EMPTY_LIST_BODY = CachedBody([])
+
+
+class ChallengeCatalog:
+    """
+    Indexed, read-optimized view of the challenge definitions
+
+    Lookups by id, category and difficulty are dictionary hits. List and
+    detail responses are serialized once per catalog version, so reads never
+    touch the database or the JSON encoder; any change to the underlying data
+    goes through load/upsert/remove, which invalidate the cached bodies.
+    """
+
+    def __init__(self, challenges: Optional[Iterable[Dict[str, Any]]] = None):
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_category: Dict[str, List[str]] = {}
+        self._by_difficulty: Dict[str, List[str]] = {}
+        self._list_bodies: Dict[Tuple[Optional[str], Optional[str]], CachedBody] = {}
+        self._detail_bodies: Dict[str, CachedBody] = {}
+        self._objectives: Dict[str, "ObjectiveSet"] = {}
+        self.version = 0
+
+        if challenges is not None:
+            self.load(challenges)
+
+    def load(self, challenges: Iterable[Dict[str, Any]]):
+        """Replace the whole catalog"""
+        self._by_id = {challenge["id"]: challenge for challenge in challenges}
+        self._reindex()
+
+    def upsert(self, challenge: Dict[str, Any]):
+        """Add or replace a single challenge"""
+        self._by_id[challenge["id"]] = challenge
+        self._reindex()
+
+    def remove(self, challenge_id: str):
+        """Remove a challenge if present"""
+        if self._by_id.pop(challenge_id, None) is not None:
+            self._reindex()
+
+    def _reindex(self):
+        by_category: Dict[str, List[str]] = {}
+        by_difficulty: Dict[str, List[str]] = {}
+        for challenge_id, challenge in self._by_id.items():
+            by_category.setdefault(challenge["category"], []).append(challenge_id)
+            by_difficulty.setdefault(challenge["difficulty"], []).append(challenge_id)
+
+        self._by_category = by_category
+        self._by_difficulty = by_difficulty
+        self._list_bodies = {}
+        self._detail_bodies = {}
+        self._objectives = {}
+        self.version += 1
+
+        # Pre-render the unfiltered list, the hottest read
+        self.list_body()
+        logger.info(f"Challenge catalog indexed: {len(self._by_id)} challenges (version {self.version})")
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        """Full challenge definition (including the flag) by id"""
+        return self._by_id.get(challenge_id)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Every challenge definition in catalog order"""
+        return list(self._by_id.values())
+
+    def ids(self, category: Optional[str] = None, difficulty: Optional[str] = None) -> List[str]:
+        """Challenge ids matching the filters, in catalog order"""
+        if category is None and difficulty is None:
+            return list(self._by_id)
+
+        candidates = None
+        if category is not None:
+            candidates = self._by_category.get(category, [])
+        if difficulty is not None:
+            by_difficulty = self._by_difficulty.get(difficulty, [])
+            if candidates is None:
+                candidates = by_difficulty
+            else:
+                allowed = set(by_difficulty)
+                candidates = [challenge_id for challenge_id in candidates if challenge_id in allowed]
+        return list(candidates)
+
+    def list_body(self, category: Optional[str] = None, difficulty: Optional[str] = None) -> CachedBody:
+        """Serialized challenge list for a filter combination"""
+        # Unknown filter values share one empty body so arbitrary queries can't grow the cache
+        if (category is not None and category not in self._by_category) or (
+            difficulty is not None and difficulty not in self._by_difficulty
+        ):
+            return EMPTY_LIST_BODY
+
+        key = (category, difficulty)
+        cached = self._list_bodies.get(key)
+        if cached is None:
+            cached = CachedBody([
+                challenge_summary(self._by_id[challenge_id])
+                for challenge_id in self.ids(category, difficulty)
+            ])
+            self._list_bodies[key] = cached
+        return cached
+
+    def detail_body(self, challenge_id: str) -> Optional[CachedBody]:
+        """Serialized public view of one challenge"""
+        cached = self._detail_bodies.get(challenge_id)
+        if cached is None:
+            challenge = self._by_id.get(challenge_id)
+            if challenge is None:
+                return None
+            cached = CachedBody(challenge_detail(challenge, self.objectives(challenge_id).public()))
+            self._detail_bodies[challenge_id] = cached
+        return cached
+
+    def objectives(self, challenge_id: str) -> Optional["ObjectiveSet"]:
+        """Compiled objectives of a challenge (compiled once per catalog version)"""
+        compiled = self._objectives.get(challenge_id)
+        if compiled is None:
+            challenge = self._by_id.get(challenge_id)
+            if challenge is None:
+                return None
+            compiled = self._objectives[challenge_id] = ObjectiveSet.compile(challenge)
+        return compiled
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# Objective kinds, named by the key that defines each one in a challenge's "objectives"
+OBJECTIVE_COMMAND = "command"
+OBJECTIVE_COMMAND_PATTERN = "command_pattern"
+OBJECTIVE_OUTPUT_CONTAINS = "output_contains"
+OBJECTIVE_OUTPUT_PATTERN = "output_pattern"
+OBJECTIVE_FILE_EXISTS = "file_exists"
+OBJECTIVE_FILE_CONTAINS = "file_contains"
+OBJECTIVE_KINDS = (
+    OBJECTIVE_COMMAND,
+    OBJECTIVE_COMMAND_PATTERN,
+    OBJECTIVE_OUTPUT_CONTAINS,
+    OBJECTIVE_OUTPUT_PATTERN,
+    OBJECTIVE_FILE_EXISTS,
+    OBJECTIVE_FILE_CONTAINS
+)
+
+# Output patterns see this much of the previous chunk, so matches can straddle chunks
+OUTPUT_PATTERN_OVERLAP = 256
+
+_COMMAND_SEPARATORS = frozenset({"|", "||", "&&", ";", "&", "(", ")"})
+_REDIRECTS = frozenset({">", ">>", "<", "<<", "<<<", ">&", "<&", "&>", "&>>", ">|"})
+
+# Commands that never change the workspace; anything else (or any redirect) may
+READ_ONLY_COMMANDS = frozenset({
+    "ls", "cat", "pwd", "cd", "echo", "printf", "grep", "egrep", "fgrep", "head", "tail", "wc",
+    "less", "more", "whoami", "id", "clear", "history", "man", "help", "file", "stat", "du", "df",
+    "tree", "which", "type", "env", "printenv", "date", "uname", "sort", "uniq", "cut", "diff",
+    "cmp", "hostname", "basename", "dirname", "realpath", "readlink", "true", "false", "test", "["
+})
+_FIND_ACTIONS = frozenset({"-delete", "-exec", "-execdir", "-ok", "-okdir", "-fprint", "-fprintf", "-fls"})
+
+CommandKey = Tuple[str, FrozenSet[str], Tuple[str, ...]]
+PipelineKey = Tuple[CommandKey, ...]
+
+
+def command_key(argv: List[str]) -> CommandKey:
+    """
+    Normalized form of one simple command
+
+    Short flags are split and unordered ("ls -la" == "ls -a -l" == "ls -al")
+    and long options are unordered; positional arguments keep their order.
+    """
+    name = argv[0].rsplit("/", 1)[-1]
+    options = set()
+    args = []
+    for arg in argv[1:]:
+        if arg.startswith("--") and len(arg) > 2:
+            options.add(arg)
+        elif arg.startswith("-") and len(arg) > 1 and not arg[1:].isdigit():
+            options.update(f"-{flag}" for flag in arg[1:])
+        else:
+            args.append(arg)
+    return name, frozenset(options), tuple(args)
+
+
+def pipeline_key(pipeline: List[List[str]]) -> PipelineKey:
+    """Normalized form of a pipeline: its stages' command keys, in order"""
+    return tuple(command_key(argv) for argv in pipeline)
+
+
+def parse_command_line(line: str) -> Tuple[List[List[List[str]]], bool]:
+    """
+    Split a command line into pipelines of simple commands
+
+    Returns:
+        The pipelines (split on ;, &&, || and &), each the argv of its
+        stages, and whether the line redirects any output
+    """
+    lexer = shlex.shlex(line, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:
+        # Unbalanced quotes: fall back to plain words
+        tokens = line.split()
+
+    pipelines: List[List[List[str]]] = []
+    pipeline: List[List[str]] = []
+    current: List[str] = []
+    redirected = False
+    skip_target = False
+    for token in tokens:
+        if skip_target:
+            skip_target = False
+        elif token in _COMMAND_SEPARATORS:
+            if current:
+                pipeline.append(current)
+            current = []
+            if token != "|" and pipeline:
+                pipelines.append(pipeline)
+                pipeline = []
+        elif token in _REDIRECTS:
+            redirected = redirected or token != "<"
+            skip_target = True
+            # "2>" lexes as "2" then ">"
+            if current and current[-1].isdigit():
+                current.pop()
+        else:
+            current.append(token)
+    if current:
+        pipeline.append(current)
+    if pipeline:
+        pipelines.append(pipeline)
+    return pipelines, redirected
+
+
+def could_modify_files(pipelines: List[List[List[str]]], redirected: bool) -> bool:
+    """Cheap check for whether a command line might have changed the workspace"""
+    if redirected:
+        return True
+    for argv in (argv for pipeline in pipelines for argv in pipeline):
+        name = argv[0].rsplit("/", 1)[-1]
+        if name == "find":
+            if any(arg in _FIND_ACTIONS for arg in argv):
+                return True
+        elif name not in READ_ONLY_COMMANDS:
+            return True
+    return False
+
+
+class Objective(NamedTuple):
+    """Public description of one objective"""
+
+    id: str
+    description: str
+    kind: str
+
+
+class ObjectiveSet:
+    """
+    A challenge's objectives compiled into matchers
+
+    Each objective is one bit. Exact commands are keyed by their normalized
+    pipelines, so matching a command line is a dict lookup per pipeline: a
+    stage of an objective's pipeline on its own doesn't count, and an
+    objective made of several pipelines (";" or "&&" lists) needs all of
+    them in one command line. Patterns, output needles and file predicates
+    are kept in lists that progress trackers skip once the objective is done.
+
+    Objectives come from the challenge's "objectives" list, each a dict with
+    an optional "id" and "description" and one matcher key: "command",
+    "command_pattern", "output_contains", "output_pattern", "file_exists" or
+    "file_contains" ({"path", "text"}). Challenges without one get a command
+    objective per entry in "expected_commands".
+    """
+
+    def __init__(self, challenge_id: str):
+        self.challenge_id = challenge_id
+        self.objectives: List[Objective] = []
+        self.commands: Dict[PipelineKey, int] = {}
+        self.command_lists: List[Tuple[int, FrozenSet[PipelineKey]]] = []
+        self.command_patterns: List[Tuple[int, "re.Pattern[str]"]] = []
+        self.output_needles: List[Tuple[int, bytes]] = []
+        self.output_patterns: List[Tuple[int, "re.Pattern[bytes]"]] = []
+        self.file_checks: List[Tuple[int, FileCheck]] = []
+        self.output_mask = 0
+        self.file_mask = 0
+        self.output_overlap = 0
+
+    def __len__(self) -> int:
+        return len(self.objectives)
+
+    @property
+    def all_mask(self) -> int:
+        return (1 << len(self.objectives)) - 1
+
+    @classmethod
+    def compile(cls, challenge: Dict[str, Any]) -> "ObjectiveSet":
+        compiled = cls(challenge["id"])
+        definitions = challenge.get("objectives")
+        if definitions is None:
+            definitions = [
+                {"id": f"command-{index + 1}", "description": f"Run `{command}`", OBJECTIVE_COMMAND: command}
+                for index, command in enumerate(challenge.get("expected_commands", []))
+            ]
+        for index, definition in enumerate(definitions):
+            try:
+                compiled._add(definition)
+            except (KeyError, TypeError, ValueError, re.error) as e:
+                logger.error(f"Skipping invalid objective {index} of challenge {challenge['id']}: {e}")
+        return compiled
+
+    def _add(self, definition: Dict[str, Any]):
+        kind = next((kind for kind in OBJECTIVE_KINDS if kind in definition), None)
+        if kind is None:
+            raise ValueError(f"no matcher (expected one of {', '.join(OBJECTIVE_KINDS)})")
+        value = definition[kind]
+        bit = 1 << len(self.objectives)
+
+        if kind == OBJECTIVE_COMMAND:
+            keys = {pipeline_key(pipeline) for pipeline in parse_command_line(value)[0]}
+            if not keys:
+                raise ValueError("empty command")
+            if len(keys) == 1:
+                key = next(iter(keys))
+                self.commands[key] = self.commands.get(key, 0) | bit
+            else:
+                self.command_lists.append((bit, frozenset(keys)))
+        elif kind == OBJECTIVE_COMMAND_PATTERN:
+            self.command_patterns.append((bit, re.compile(value)))
+        elif kind == OBJECTIVE_OUTPUT_CONTAINS:
+            needle = value.encode("utf-8")
+            self.output_needles.append((bit, needle))
+            self.output_overlap = max(self.output_overlap, len(needle) - 1)
+            self.output_mask |= bit
+        elif kind == OBJECTIVE_OUTPUT_PATTERN:
+            self.output_patterns.append((bit, re.compile(value.encode("utf-8"))))
+            self.output_overlap = max(self.output_overlap, OUTPUT_PATTERN_OVERLAP)
+            self.output_mask |= bit
+        elif kind == OBJECTIVE_FILE_EXISTS:
+            self.file_checks.append((bit, FileCheck(value)))
+            self.file_mask |= bit
+        else:
+            self.file_checks.append((bit, FileCheck(value["path"], value["text"])))
+            self.file_mask |= bit
+
+        # Numbered among the objectives that compiled, like the public view
+        objective = Objective(objective_id(len(self.objectives), definition), definition.get("description", ""), kind)
+        self.objectives.append(objective)
+
+    def ids(self, mask: int) -> List[str]:
+        return [objective.id for index, objective in enumerate(self.objectives) if mask >> index & 1]
+
+    def public(self) -> List[Dict[str, str]]:
+        """Objectives as shown to learners, without their matchers"""
+        return [{"id": objective.id, "description": objective.description} for objective in self.objectives]
+
+
+class ObjectiveProgress:
+    """
+    One session's progress through its challenge, advanced by the live terminal
+
+    Commands and output are matched as they stream past, in time bounded by
+    the command line or output chunk rather than the session's history.
+    File predicates run on the backend, batched into one check, and only
+    after a command that could have changed the workspace (or the command
+    after it, for editors and scripts that outlive their command line).
+    """
+
+    def __init__(
+        self,
+        objectives: ObjectiveSet,
+        backend: ExecutionBackend,
+        notify: Callable[[Dict[str, Any]], Awaitable[Any]],
+        check_delay: float = config.OBJECTIVE_FILE_CHECK_DELAY
+    ):
+        self.objectives = objectives
+        self.backend = backend
+        self.notify = notify
+        self.check_delay = check_delay
+        self.done = 0
+        self._input = LineBuffer()
+        self._tail = b""
+        self._recheck_next = False
+        self._check_task: Optional[asyncio.Task] = None
+        self._check_again = False
+
+        # Progress statistics
+        self.file_checks = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.done == self.objectives.all_mask
+
+    def _mark(self, completed: int) -> int:
+        completed &= ~self.done
+        if completed:
+            self.done |= completed
+            OBJECTIVES_COMPLETED.inc(bin(completed).count("1"))
+        return completed
+
+    def feed_input(self, data: str) -> int:
+        """Raw keystrokes (streaming terminals); returns newly completed objectives"""
+        completed = 0
+        for line in self._input.feed(data):
+            completed |= self.feed_command(line)
+        return completed
+
+    def feed_command(self, line: str) -> int:
+        """One submitted command line; returns newly completed objectives"""
+        if not line.strip():
+            return 0
+        pipelines, redirected = parse_command_line(line)
+        keys = {pipeline_key(pipeline) for pipeline in pipelines}
+        completed = 0
+        for key in keys:
+            completed |= self.objectives.commands.get(key, 0)
+        for bit, required in self.objectives.command_lists:
+            if not self.done & bit and required <= keys:
+                completed |= bit
+        for bit, pattern in self.objectives.command_patterns:
+            if not self.done & bit and pattern.search(line):
+                completed |= bit
+
+        if self.objectives.file_mask & ~self.done:
+            modifies = could_modify_files(pipelines, redirected)
+            if modifies or self._recheck_next:
+                self._schedule_file_check()
+            self._recheck_next = modifies
+        return self._mark(completed)
+
+    def feed_output(self, data: bytes) -> int:
+        """A chunk of terminal output; returns newly completed objectives"""
+        if not self.objectives.output_mask & ~self.done:
+            return 0
+        window = self._tail + data if self._tail else data
+        completed = 0
+        for bit, needle in self.objectives.output_needles:
+            if not self.done & bit and needle in window:
+                completed |= bit
+        for bit, pattern in self.objectives.output_patterns:
+            if not self.done & bit and pattern.search(window):
+                completed |= bit
+        overlap = self.objectives.output_overlap
+        self._tail = window[-overlap:] if overlap else b""
+        return self._mark(completed)
+
+    def _schedule_file_check(self):
+        if self._check_task is None or self._check_task.done():
+            self._check_task = asyncio.create_task(self._check_files())
+        else:
+            self._check_again = True
+
+    async def _check_files(self):
+        # Give the command a moment to finish writing
+        await asyncio.sleep(self.check_delay)
+        while True:
+            self._check_again = False
+            pending = [(bit, check) for bit, check in self.objectives.file_checks if not self.done & bit]
+            if not pending:
+                return
+            try:
+                results = await self.backend.check_files([check for _, check in pending])
+            except Exception as e:
+                logger.warning(f"Objective file check failed for {self.backend.session_id}: {e}")
+                return
+            self.file_checks += 1
+            FILE_CHECKS.inc()
+            await self.report(self._mark(sum(bit for (bit, _), ok in zip(pending, results) if ok)))
+            if not self._check_again:
+                return
+
+    def event(self, completed: int = 0) -> Dict[str, Any]:
+        """Progress message for the client: what just completed and where the session stands"""
+        return {
+            "type": "progress",
+            "challenge_id": self.objectives.challenge_id,
+            "completed": self.objectives.ids(completed),
+            "done": self.objectives.ids(self.done),
+            "total": len(self.objectives),
+            "complete": self.complete
+        }
+
+    async def report(self, completed: int):
+        """Tell the session's clients about newly completed objectives"""
+        if completed:
+            await self.notify(self.event(completed))
+
+    async def close(self):
+        if self._check_task is not None:
+            self._check_task.cancel()
+            try:
+                await self._check_task
+            except asyncio.CancelledError:
+                pass
+            self._check_task = None
+
+
+# Process-wide challenge catalog
+challenge_catalog = ChallengeCatalog()
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from app import config
+from app.core.terminal import PtyStream
+from app.utils.archive import FileContent
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Challenge "backend" values
+BACKEND_DOCKER = "docker"
+BACKEND_VIRTUAL = "virtual"
+
+
+class FileCheck(NamedTuple):
+    """A workspace file predicate: the path exists, or (with text) contains text"""
+
+    path: str
+    text: Optional[str] = None
+
+
+def challenge_backend(challenge: Dict[str, Any]) -> str:
+    """Execution backend a challenge declares (containers unless it opts out)"""
+    return config.CHALLENGE_BACKEND_OVERRIDE or challenge.get("backend", BACKEND_DOCKER)
+
+
+class ExecutionBackend:
+    """
+    Where a session's commands run
+
+    Implementations are a real container (DockerSandbox) or the in-process
+    VirtualShell. Only backends with supports_streaming can attach an
+    interactive PTY; the others answer one command at a time.
+    """
+
+    kind = "abstract"
+    supports_streaming = False
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.container_name: Optional[str] = None
+
+    @property
+    def memory_bytes(self) -> int:
+        """Memory the session commits on this host"""
+        return 0
+
+    async def initialize(self):
+        raise NotImplementedError
+
+    async def execute_command(self, command: str) -> str:
+        """
+        Run one command
+
+        Returns:
+            Command output, with an exit code note if it failed
+        """
+        raise NotImplementedError
+
+    async def setup_challenge(self, challenge_files: Dict[str, FileContent]):
+        raise NotImplementedError
+
+    async def open_terminal(self, cols: int = 80, rows: int = 24) -> PtyStream:
+        raise NotImplementedError(f"{self.kind} backend has no interactive terminal")
+
+    async def send_input(self, data: str) -> bool:
+        raise NotImplementedError(f"{self.kind} backend has no interactive terminal")
+
+    async def resize_terminal(self, cols: int, rows: int):
+        pass
+
+    async def reset(self):
+        """Restore the challenge's starting files, discarding the session's changes"""
+        raise NotImplementedError(f"{self.kind} backend cannot be reset")
+
+    async def check_files(self, checks: List[FileCheck]) -> List[bool]:
+        """Evaluate file predicates (paths relative to the workspace) in one round trip"""
+        raise NotImplementedError(f"{self.kind} backend cannot check files")
+
+    async def cleanup(self, grace_period: int = 5):
+        """Release the backend; containers get grace_period seconds to stop before being killed"""
+
+
+async def cleanup_backends(
+    backends: Iterable[ExecutionBackend],
+    concurrency: int,
+    deadline: float,
+    grace_period: int = 5
+) -> int:
+    """
+    Clean up many backends in parallel, giving up at a deadline
+
+    Args:
+        backends: Backends to clean up
+        concurrency: Most cleanups in flight at once
+        deadline: time.monotonic() value after which unfinished cleanups are abandoned
+        grace_period: Stop grace passed to each cleanup
+
+    Returns:
+        Number of backends that finished cleaning up
+    """
+    backends = list(backends)
+    if not backends:
+        return 0
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def clean(backend: ExecutionBackend) -> bool:
+        async with semaphore:
+            try:
+                await backend.cleanup(grace_period)
+                return True
+            except Exception as e:
+                logger.error(f"Error cleaning up {backend.kind} backend {backend.session_id}: {e}")
+                return False
+
+    tasks = [asyncio.create_task(clean(backend)) for backend in backends]
+    done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning(f"Cleanup deadline passed with {len(pending)} backends left; the reaper will reclaim them")
+    return sum(1 for task in done if task.result())
@@ -0,0 +1,352 @@
+import asyncio
+import codecs
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket
+
+from app import config
+from app.core.session_manager import session_manager
+from app.core.transport import BINARY_SUBPROTOCOL, FRAME_MUX_OUTPUT, FRAME_OUTPUT
+from app.services.metrics import metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FANOUT_DROPPED_FRAMES = metrics.counter(
+    "cli_quest_fanout_dropped_frames_total",
+    "Output frames a slow viewer missed (caught up from scrollback instead)"
+)
+
+Frame = Union[str, bytes]
+
+
+class Subscriber:
+    """
+    One viewer socket with its own bounded queue of encoded frames
+
+    Publishing only appends to the queue, and a sender task per subscriber
+    writes to the socket, so a slow viewer never holds up the learner or
+    other viewers. When the queue is full the viewer's output for that
+    session is dropped; once the queue drains the viewer is caught up from
+    the session's scrollback, starting after the last byte it was sent.
+
+    A multiplexed subscriber can watch many sessions over one socket; its
+    frames carry the session id.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        multiplexed: bool = False,
+        max_bytes: int = config.FANOUT_QUEUE_BYTES
+    ):
+        self.websocket = websocket
+        self.multiplexed = multiplexed
+        self.max_bytes = max_bytes
+        self.binary = BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+
+        self._frames: Deque[Frame] = deque()
+        self._queued_bytes = 0
+        self._ready = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+        self.closed = False
+        # Set by finish(): close the socket with this code and reason once the queue drains
+        self._close: Optional[Tuple[int, str]] = None
+
+        # Per watched session: sequence number past the last output queued (None before the first)
+        self.seqs: Dict[str, Optional[int]] = {}
+        # Sessions whose output was dropped and must be caught up from scrollback
+        self.lagging: Set[str] = set()
+        # Text viewers, per lagging session: bytes of a split character it was sent no text for yet
+        self.partial: Dict[str, bytes] = {}
+
+        # Subscriber statistics
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.catch_ups = 0
+
+    async def accept(self):
+        """Accept the websocket and start sending"""
+        await self.websocket.accept(subprotocol=BINARY_SUBPROTOCOL if self.binary else None)
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def watch(self, session_id: str):
+        """Start from the session's scrollback, sent by the next catch-up"""
+        self.seqs[session_id] = None
+        self.lagging.add(session_id)
+        self.partial.pop(session_id, None)
+        self._ready.set()
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._queued_bytes
+
+    def offer(self, frame: Frame, force: bool = False) -> bool:
+        """Queue a frame unless the queue is full"""
+        if self.closed:
+            return False
+        size = len(frame)
+        if not force and self._frames and self._queued_bytes + size > self.max_bytes:
+            self.frames_dropped += 1
+            FANOUT_DROPPED_FRAMES.inc()
+            return False
+        self._frames.append(frame)
+        self._queued_bytes += size
+        self._ready.set()
+        return True
+
+    def finish(self, code: int, reason: str):
+        """Close the socket with code once everything queued so far is sent"""
+        self._close = (code, reason)
+        self._ready.set()
+
+    async def _send_loop(self):
+        try:
+            while not self.closed:
+                if not self._frames and self._close is not None:
+                    self.closed = True
+                    code, reason = self._close
+                    await self.websocket.close(code=code, reason=reason)
+                    break
+                if not self._frames and not self.lagging:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                if not self._frames:
+                    self._catch_up()
+                    continue
+                frame = self._frames.popleft()
+                self._queued_bytes -= len(frame)
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+                self.frames_sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"Viewer stopped: {e}")
+            self.closed = True
+
+    def _catch_up(self):
+        """Queue what lagging sessions produced since this viewer's last frame"""
+        for session_id in list(self.lagging):
+            self.lagging.discard(session_id)
+            session = session_manager.get_session(session_id)
+            if session is None:
+                continue
+            seq = self.seqs.get(session_id)
+            start, data = session.scrollback.since(seq if seq is not None else 0)
+            partial = self.partial.pop(session_id, b"")
+            if start != seq:
+                # Resynced past what it missed: the split character is gone too
+                partial = b""
+            self.offer(self.encode_message(session_id, {
+                "type": "sync",
+                "seq": start,
+                "truncated": seq is not None and start > seq
+            }), force=True)
+            if data:
+                text = None
+                if not self.binary:
+                    # Hold back a trailing partial character, as the channel's live decoder does
+                    text = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(partial + data)
+                self.offer(self.encode_output(session_id, data, start + len(data), text), force=True)
+            self.seqs[session_id] = start + len(data)
+            self.catch_ups += 1
+
+    def encode_output(self, session_id: str, data: bytes, seq: int, text: Optional[str] = None) -> Frame:
+        """Frame output in this subscriber's format (used for catch-ups; live output is encoded by the channel)"""
+        if self.binary:
+            if self.multiplexed:
+                return _mux_binary(session_id, data)
+            return bytes([FRAME_OUTPUT]) + data
+        if text is None:
+            text = data.decode("utf-8", errors="replace")
+        message = {"type": "output", "data": text}
+        if self.multiplexed:
+            message.update(session_id=session_id, seq=seq)
+        return json.dumps(message)
+
+    def encode_message(self, session_id: str, message: Dict[str, Any]) -> str:
+        if self.multiplexed:
+            message = dict(message, session_id=session_id)
+        return json.dumps(message)
+
+    async def close(self):
+        self.closed = True
+        if self._sender is not None:
+            self._sender.cancel()
+            try:
+                await self._sender
+            except asyncio.CancelledError:
+                pass
+            self._sender = None
+        self._frames.clear()
+        self._queued_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.seqs),
+            "multiplexed": self.multiplexed,
+            "queued_bytes": self._queued_bytes,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "catch_ups": self.catch_ups
+        }
+
+
+def _mux_binary(session_id: str, data: bytes) -> bytes:
+    """Multiplexed binary output: type byte, session id length, session id, output"""
+    key = session_id.encode("utf-8")[:255]
+    return bytes([FRAME_MUX_OUTPUT, len(key)]) + key + data
+
+
+class SessionChannel:
+    """
+    Viewers of one session; each output chunk is encoded once per wire format
+
+    Text is decoded by one incremental decoder fed every chunk, whether or
+    not any viewer takes it live, so a character split across chunks comes
+    out whole. A viewer that starts lagging mid-character keeps the split
+    bytes, and its catch-up decodes them together with the scrollback.
+    """
+
+    def __init__(self, session_id: str, tail: bytes = b""):
+        self.session_id = session_id
+        self.subscribers: Set[Subscriber] = set()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Start from wherever the session's output stream is, possibly mid-character
+        self._decoder.decode(tail)
+
+    def publish_output(self, data: bytes, seq: int):
+        frames: Dict[Any, Frame] = {}
+        partial = self._decoder.getstate()[0]
+        text = self._decoder.decode(data)
+        for subscriber in self.subscribers:
+            if self.session_id in subscriber.lagging:
+                # Its next catch-up includes this chunk
+                continue
+
+            key = (subscriber.binary, subscriber.multiplexed)
+            frame = frames.get(key)
+            if frame is None:
+                frame = frames[key] = subscriber.encode_output(self.session_id, data, seq, text)
+
+            if subscriber.offer(frame):
+                subscriber.seqs[self.session_id] = seq
+            else:
+                subscriber.lagging.add(self.session_id)
+                if partial and not subscriber.binary:
+                    subscriber.partial[self.session_id] = partial
+
+    def publish_message(self, message: Dict[str, Any]):
+        frames: Dict[bool, str] = {}
+        for subscriber in self.subscribers:
+            frame = frames.get(subscriber.multiplexed)
+            if frame is None:
+                frame = frames[subscriber.multiplexed] = subscriber.encode_message(self.session_id, message)
+            subscriber.offer(frame)
+
+
+class SessionFanout:
+    """
+    Read-only viewers of terminal sessions
+
+    Spectators watch one session with the learner's own wire format;
+    instructors watch many sessions multiplexed over one socket. New
+    viewers start with the session's scrollback, then get live output.
+    """
+
+    def __init__(self):
+        self._channels: Dict[str, SessionChannel] = {}
+
+    def subscribe(self, subscriber: Subscriber, session_id: str) -> bool:
+        """Start sending a session's output to a viewer; False if the session isn't live here"""
+        session = session_manager.get_session(session_id)
+        if session is None:
+            return False
+        channel = self._channels.get(session_id)
+        if channel is None:
+            # The last few bytes carry any character still being written
+            tail = session.scrollback.since(max(session.scrollback.start, session.scrollback.end - 3))[1]
+            channel = self._channels[session_id] = SessionChannel(session_id, tail)
+        channel.subscribers.add(subscriber)
+        # The first catch-up sends the scrollback
+        subscriber.watch(session_id)
+        return True
+
+    def unsubscribe(self, subscriber: Subscriber, session_id: str):
+        channel = self._channels.get(session_id)
+        if channel is not None:
+            channel.subscribers.discard(subscriber)
+            if not channel.subscribers:
+                del self._channels[session_id]
+        _forget(subscriber, session_id)
+
+    def unsubscribe_all(self, subscriber: Subscriber):
+        for session_id in list(subscriber.seqs):
+            self.unsubscribe(subscriber, session_id)
+
+    def close_session(self, session_id: str, code: int, reason: str):
+        """
+        Tell a session's viewers that it ended (or moved to another node)
+
+        Multiplexed viewers get {"type": "end", "session_id", "data": reason}
+        and keep watching their other sessions. Single-session viewers get
+        the reason as an error and are then closed with code, like the learner.
+        The channel goes away with its decoder, so an id registered again
+        starts from scratch.
+        """
+        channel = self._channels.pop(session_id, None)
+        if channel is None:
+            return
+        for subscriber in channel.subscribers:
+            _forget(subscriber, session_id)
+            if subscriber.multiplexed:
+                subscriber.offer(subscriber.encode_message(session_id, {"type": "end", "data": reason}), force=True)
+            else:
+                subscriber.offer(json.dumps({"type": "error", "data": f"\r\n{reason}\r\n"}), force=True)
+                subscriber.finish(code, reason)
+
+    def publish_output(self, session_id: str, data: bytes, seq: int):
+        """Fan a session's output chunk out to its viewers; a no-op without viewers"""
+        channel = self._channels.get(session_id)
+        if channel is not None:
+            channel.publish_output(data, seq)
+
+    def publish_message(self, session_id: str, message: Dict[str, Any]):
+        channel = self._channels.get(session_id)
+        if channel is not None:
+            channel.publish_message(message)
+
+    def viewers(self, session_id: str) -> int:
+        channel = self._channels.get(session_id)
+        return len(channel.subscribers) if channel is not None else 0
+
+    def __len__(self) -> int:
+        return len({subscriber for channel in self._channels.values() for subscriber in channel.subscribers})
+
+    def stats(self) -> Dict[str, Any]:
+        subscribers: List[Subscriber] = list({s for c in self._channels.values() for s in c.subscribers})
+        return {
+            "watched_sessions": len(self._channels),
+            "viewers": len(subscribers),
+            "queued_bytes": sum(s.queued_bytes for s in subscribers),
+            "frames_sent": sum(s.frames_sent for s in subscribers),
+            "frames_dropped": sum(s.frames_dropped for s in subscribers),
+            "catch_ups": sum(s.catch_ups for s in subscribers)
+        }
+
+
+def _forget(subscriber: Subscriber, session_id: str):
+    subscriber.seqs.pop(session_id, None)
+    subscriber.lagging.discard(session_id)
+    subscriber.partial.pop(session_id, None)
+
+
+# Process-wide viewer fan-out
+session_fanout = SessionFanout()
+session_manager.on_disconnect(session_fanout.close_session)
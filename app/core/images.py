@@ -0,0 +1,177 @@
+import hashlib
+import json
+from typing import IO, Any, Dict, Iterable, Optional
+
+import docker
+from docker.errors import ImageNotFound
+
+from app import config
+from app.services.docker_client import docker_service
+from app.utils.archive import FileContent, pack_files
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Tools baked into the base image so containers never run a package manager at start
+BASE_TOOLS = ["curl", "wget", "nano", "vim", "less", "tree", "file"]
+
+WORKSPACE_DIR = "/workspace"
+# Read-only copy of the provisioned workspace that resets restore from
+BASELINE_DIR = "/opt/cli-quest/baseline"
+# One exec that discards the session's changes and restores the baseline
+RESTORE_WORKSPACE_COMMAND = (
+    f"find {WORKSPACE_DIR} -mindepth 1 -delete && cp -a {BASELINE_DIR}/. {WORKSPACE_DIR}/"
+)
+# Evaluates (kind, path, text) argument triples, printing 1 or 0 for each
+FILE_CHECK_SCRIPT = (
+    'while [ "$#" -ge 3 ]; do '
+    'if [ "$1" = exists ]; then [ -e "$2" ]; else grep -qF -- "$3" "$2" 2>/dev/null; fi '
+    '&& echo 1 || echo 0; shift 3; done'
+)
+WORKSPACE_README = "Welcome to CLI Quest!\nUse ls to see available files and directories.\n"
+
+IMAGE_REPOSITORY = "cli-quest"
+IMAGE_LABEL = "cli-quest.content-hash"
+
+
+def _encode_bytes(value: Any) -> Dict[str, str]:
+    if isinstance(value, bytes):
+        return {"hex": value.hex()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _content_hash(payload: Dict[str, Any]) -> str:
+    """Stable SHA-256 of a JSON-serializable payload (binary setup files included)"""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=_encode_bytes).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _base_definition() -> Dict[str, Any]:
+    return {
+        "from": config.SANDBOX_BASE_IMAGE,
+        "tools": BASE_TOOLS,
+        "readme": WORKSPACE_README,
+        "baseline": BASELINE_DIR
+    }
+
+
+def base_image_tag() -> str:
+    """Tag of the shared toolset image, derived from its definition"""
+    return f"{IMAGE_REPOSITORY}/base:{_content_hash(_base_definition())[:16]}"
+
+
+def challenge_image_tag(challenge: Dict[str, Any]) -> str:
+    """
+    Tag of a challenge image
+
+    Only the parts of the definition that end up in the image are hashed, so
+    editing a title or description does not trigger a rebuild.
+
+    Args:
+        challenge: Challenge definition
+
+    Returns:
+        Image tag of the form cli-quest/challenge-<id>:<hash>
+    """
+    digest = _content_hash({
+        "base": base_image_tag(),
+        "setup_files": challenge.get("setup_files", {})
+    })
+    return f"{IMAGE_REPOSITORY}/challenge-{challenge['id']}:{digest[:16]}"
+
+
+def _build_context(dockerfile: str, files: Optional[Dict[str, FileContent]] = None) -> IO[bytes]:
+    """Pack a Dockerfile and workspace files into a build context"""
+    return pack_files(files or {}, prefix="workspace", extra={"Dockerfile": dockerfile})
+
+
+class ChallengeImageBuilder:
+    """
+    Builds the base toolset image and one image per challenge
+
+    Images are tagged by content hash and only rebuilt when the hash changes.
+    """
+
+    def __init__(self, client: Optional[docker.DockerClient] = None):
+        self.client = client or docker_service.client
+
+    def _image_exists(self, tag: str) -> bool:
+        try:
+            self.client.images.get(tag)
+            return True
+        except ImageNotFound:
+            return False
+
+    def _build(self, tag: str, context: IO[bytes]):
+        digest = tag.rsplit(":", 1)[1]
+        logger.info(f"Building sandbox image {tag}")
+        self.client.images.build(
+            fileobj=context,
+            custom_context=True,
+            tag=tag,
+            rm=True,
+            labels={IMAGE_LABEL: digest}
+        )
+
+    def ensure_base_image(self) -> str:
+        """Build the toolset image if it is missing and return its tag"""
+        tag = base_image_tag()
+        if self._image_exists(tag):
+            return tag
+
+        readme = WORKSPACE_README.replace("\n", "\\n")
+        dockerfile = "\n".join([
+            f"FROM {config.SANDBOX_BASE_IMAGE}",
+            "RUN apt-get update -qq"
+            f" && apt-get install -y -qq --no-install-recommends {' '.join(BASE_TOOLS)}"
+            " && rm -rf /var/lib/apt/lists/*",
+            f"RUN mkdir -p {WORKSPACE_DIR}/challenges && printf '{readme}' > {WORKSPACE_DIR}/README.txt"
+            f" && mkdir -p {BASELINE_DIR} && cp -a {WORKSPACE_DIR}/. {BASELINE_DIR}/",
+            f"WORKDIR {WORKSPACE_DIR}",
+            ""
+        ])
+        self._build(tag, _build_context(dockerfile))
+        return tag
+
+    def ensure_challenge_image(self, challenge: Dict[str, Any]) -> str:
+        """Build a challenge image if its content hash changed and return its tag"""
+        tag = challenge_image_tag(challenge)
+        if self._image_exists(tag):
+            return tag
+
+        base_tag = self.ensure_base_image()
+        dockerfile = "\n".join([
+            f"FROM {base_tag}",
+            f"COPY workspace/ {WORKSPACE_DIR}/",
+            # The provisioned workspace doubles as the baseline resets restore
+            f"COPY workspace/ {BASELINE_DIR}/",
+            ""
+        ])
+        self._build(tag, _build_context(dockerfile, challenge.get("setup_files", {})))
+        return tag
+
+    def ensure_images(self, challenges: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Make sure every challenge has an up-to-date image
+
+        Args:
+            challenges: Challenge definitions
+
+        Returns:
+            Mapping of challenge id -> image tag
+        """
+        self.ensure_base_image()
+
+        tags = {}
+        for challenge in challenges:
+            try:
+                tags[challenge["id"]] = self.ensure_challenge_image(challenge)
+            except Exception as e:
+                logger.error(f"Failed to build image for challenge {challenge['id']}: {e}")
+        return tags
+
+
+async def build_challenge_images(challenges: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """Build challenge images without blocking the event loop"""
+    builder = ChallengeImageBuilder()
+    return await docker_service.run("build", builder.ensure_images, list(challenges))
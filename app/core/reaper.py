@@ -0,0 +1,152 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from app import config
+from app.core.sandbox import LABEL_MANAGED, LABEL_NODE, active_containers
+from app.core.session_manager import session_manager
+from app.services.docker_client import docker_service
+from app.services.metrics import metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Workspace volumes are named after their container
+VOLUME_PREFIX = "cli-quest-"
+
+REAPER_RECLAIMED = metrics.counter(
+    "cli_quest_reaper_reclaimed_total",
+    "Orphaned sandbox containers and volumes removed by the reaper",
+    ["kind"]
+)
+
+
+class OrphanReaper:
+    """
+    Removes sandbox containers and workspace volumes nobody owns
+
+    Every sandbox container is labelled with the node that started it. A
+    container is an orphan if it belongs to this node but no live sandbox
+    uses it (left behind by a crash, an abandoned shutdown or a failed
+    cleanup), or if it belongs to a node that has stopped heartbeating to
+    the session directory. Dangling workspace volumes are removed too.
+
+    Other nodes' containers are only touched when the session directory is
+    shared (redis): with the in-memory directory there is no telling a dead
+    node from another worker on the same host, so they are left alone. Set
+    a fixed NODE_ID per worker for a restarted worker to reclaim what its
+    previous run left behind.
+
+    Runs once at startup, before this node creates containers of its own,
+    and then every REAPER_INTERVAL seconds.
+    """
+
+    def __init__(self, interval: float = config.REAPER_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        # Reaper statistics
+        self.runs = 0
+        self.containers_reclaimed = 0
+        self.volumes_reclaimed = 0
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+
+    async def _is_orphan(self, container: Any, alive: Dict[str, bool]) -> bool:
+        if container.name in active_containers:
+            return False
+        node_id = (container.labels or {}).get(LABEL_NODE, "")
+        if node_id == config.NODE_ID:
+            return True
+        if not session_manager.directory.shared:
+            return False
+        if node_id not in alive:
+            try:
+                alive[node_id] = await session_manager.directory.is_node_alive(node_id)
+            except Exception as e:
+                # Can't tell, so leave the node's containers alone this round
+                logger.error(f"Could not check whether node {node_id} is alive: {e}")
+                alive[node_id] = True
+        return not alive[node_id]
+
+    async def reap(self) -> Dict[str, int]:
+        """
+        Remove orphaned containers, then dangling workspace volumes
+
+        Returns:
+            Number of containers and volumes removed
+        """
+        started = time.perf_counter()
+        removed = {"containers": 0, "volumes": 0}
+
+        alive: Dict[str, bool] = {}
+        containers = await docker_service.list_containers({"label": LABEL_MANAGED})
+        for container in containers:
+            if not await self._is_orphan(container, alive):
+                continue
+            try:
+                await docker_service.remove_container(container)
+                removed["containers"] += 1
+            except Exception as e:
+                logger.error(f"Failed to remove orphaned container {container.name}: {e}")
+
+        # Removed containers' volumes only become dangling once the daemon is done with them
+        volumes = await docker_service.list_volumes({"dangling": True, "name": VOLUME_PREFIX})
+        for volume in volumes:
+            if not volume.name.startswith(VOLUME_PREFIX) or volume.name in active_containers:
+                continue
+            try:
+                await docker_service.remove_volume(volume.name)
+                removed["volumes"] += 1
+            except Exception as e:
+                logger.error(f"Failed to remove dangling volume {volume.name}: {e}")
+
+        self.runs += 1
+        self.containers_reclaimed += removed["containers"]
+        self.volumes_reclaimed += removed["volumes"]
+        REAPER_RECLAIMED.labels("container").inc(removed["containers"])
+        REAPER_RECLAIMED.labels("volume").inc(removed["volumes"])
+        self.last_run = time.time()
+        self.last_duration = time.perf_counter() - started
+        if removed["containers"] or removed["volumes"]:
+            logger.warning(
+                f"Reaped {removed['containers']} orphaned containers and {removed['volumes']} volumes "
+                f"in {self.last_duration * 1000:.0f}ms"
+            )
+        return removed
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Orphan reaper error: {e}")
+
+    def start(self):
+        """Reap periodically in the background"""
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "containers_reclaimed": self.containers_reclaimed,
+            "volumes_reclaimed": self.volumes_reclaimed,
+            "last_run": self.last_run,
+            "last_duration_ms": round(self.last_duration * 1000, 1) if self.last_duration is not None else None
+        }
+
+
+# Process-wide orphan reaper
+orphan_reaper = OrphanReaper()
@@ -2,77 +2,111 @@ import asyncio
 import docker
 import os
 import tempfile
+import time
 import uuid
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set
+from app import config
+from app.core.admission import Reservation, admission
+from app.core.execution import BACKEND_DOCKER, ExecutionBackend, FileCheck
+from app.core.images import FILE_CHECK_SCRIPT, RESTORE_WORKSPACE_COMMAND, WORKSPACE_DIR, base_image_tag
+from app.core.terminal import LineBuffer, PtyStream
+from app.services.docker_client import docker_service
+from app.services.metrics import metrics
+from app.utils.archive import FileContent, pack_files
 from app.utils.logger import setup_logger
+from app.utils.validators import parse_memory_size
 
 logger = setup_logger(__name__)
 
+# Every container is started with the same memory limit
+SANDBOX_MEMORY_BYTES = parse_memory_size(config.SANDBOX_MEM_LIMIT)
 
-class DockerSandbox:
+# Ownership labels the orphan reaper matches on
+LABEL_MANAGED = "cli-quest.managed"
+LABEL_NODE = "cli-quest.node"
+LABEL_SESSION = "cli-quest.session"
+
+# Names of containers this process has started (or is starting) and not yet removed
+active_containers: Set[str] = set()
+
+SANDBOX_START_SECONDS = metrics.histogram("cli_quest_sandbox_start_seconds", "Time to start a sandbox container")
+SANDBOX_START_FAILURES = metrics.counter("cli_quest_sandbox_start_failures_total", "Sandbox containers that failed to start")
+SANDBOX_EXEC_SECONDS = metrics.histogram("cli_quest_sandbox_exec_seconds", "Latency of one-shot commands run with exec_run")
+SANDBOX_EXEC_ERRORS = metrics.counter("cli_quest_sandbox_exec_errors_total", "One-shot commands that raised an error")
+SANDBOX_BLOCKED_COMMANDS = metrics.counter("cli_quest_sandbox_blocked_commands_total", "Commands rejected by the command filter")
+SANDBOX_RESET_SECONDS = metrics.histogram("cli_quest_sandbox_reset_seconds", "Time to restore a sandbox workspace to its baseline")
+SANDBOX_CLEANUP_SECONDS = metrics.histogram("cli_quest_sandbox_cleanup_seconds", "Time to stop and remove a sandbox container")
+
+
+class DockerSandbox(ExecutionBackend):
     """
     Docker-based sandbox for safe command execution
     """
 
-    def __init__(self, session_id: str):
-        self.session_id = session_id
+    kind = BACKEND_DOCKER
+    supports_streaming = True
+
+    def __init__(self, session_id: str, image: Optional[str] = None, reservation: Optional[Reservation] = None):
+        super().__init__(session_id)
+        self.image = image or base_image_tag()
+        # Host capacity this container holds; taken on initialize unless admission granted one
+        self.reservation = reservation
         self.container: Optional[docker.models.containers.Container] = None
-        self.client = docker.from_env()
+        self.terminal: Optional[PtyStream] = None
+        self._input = LineBuffer()
         self.container_name = f"cli-quest-{session_id}"
-        self.working_dir = "/workspace"
+        # Named workspace volume; not removed with the container, so cleanup deletes it
+        self.volume_name = self.container_name
+        self.working_dir = WORKSPACE_DIR
+
+    @property
+    def memory_bytes(self) -> int:
+        return SANDBOX_MEMORY_BYTES
 
     async def initialize(self):
         """Initialize the sandbox container"""
+        started = time.perf_counter()
+        if self.reservation is None:
+            self.reservation = admission.reserve()
+        active_containers.add(self.container_name)
         try:
-            # Create a simple Ubuntu container with basic CLI tools
-            self.container = self.client.containers.run(
-                "ubuntu:22.04",
+            # Tools and challenge files are baked into the image, so this is a single run
+            self.container = await docker_service.run_container(
+                self.image,
                 name=self.container_name,
                 command="/bin/bash",
                 stdin_open=True,
                 tty=True,
                 detach=True,
                 working_dir=self.working_dir,
-                mem_limit="128m",  # Limit memory usage
-                cpu_quota=50000,   # Limit CPU usage (50% of one core)
+                mem_limit=config.SANDBOX_MEM_LIMIT,  # Limit memory usage
+                cpu_quota=config.SANDBOX_CPU_QUOTA,  # Limit CPU usage
                 network_disabled=True,  # Disable network access for security
                 remove=True,  # Auto-remove when stopped
+                labels={
+                    LABEL_MANAGED: "true",
+                    LABEL_NODE: config.NODE_ID,
+                    LABEL_SESSION: self.session_id
+                },
                 volumes={
                     # Create a temporary volume for the workspace
-                    f"cli-quest-{self.session_id}": {
+                    self.volume_name: {
                         "bind": self.working_dir,
                         "mode": "rw"
                     }
                 }
             )
 
-            # Install basic tools in the container
-            await self._setup_container()
-
+            SANDBOX_START_SECONDS.observe(time.perf_counter() - started)
             logger.info(f"Sandbox container initialized: {self.container_name}")
 
         except Exception as e:
+            SANDBOX_START_FAILURES.inc()
             logger.error(f"Failed to initialize sandbox: {e}")
+            active_containers.discard(self.container_name)
+            self._release_reservation()
             raise
 
-    async def _setup_container(self):
-        """Set up the container with basic tools and files"""
-        setup_commands = [
-            "apt-get update -qq",
-            "apt-get install -y -qq curl wget nano vim less tree file",
-            "mkdir -p /workspace/challenges",
-            "echo 'Welcome to CLI Quest!' > /workspace/README.txt",
-            "echo 'Use ls to see available files and directories.' >> /workspace/README.txt"
-        ]
-
-        for cmd in setup_commands:
-            try:
-                result = self.container.exec_run(cmd, workdir=self.working_dir)
-                if result.exit_code != 0:
-                    logger.warning(f"Setup command failed: {cmd} - {result.output.decode()}")
-            except Exception as e:
-                logger.warning(f"Error running setup command '{cmd}': {e}")
-
     async def execute_command(self, command: str) -> str:
         """
         Execute a command in the sandbox
@@ -89,14 +123,18 @@ class DockerSandbox:
         try:
             # Security: Basic command filtering
             if self._is_dangerous_command(command):
+                SANDBOX_BLOCKED_COMMANDS.inc()
                 return "Error: Command not allowed for security reasons"
 
             # Execute the command
-            result = self.container.exec_run(
+            started = time.perf_counter()
+            result = await docker_service.exec_run(
+                self.container,
                 f"/bin/bash -c '{command}'",
                 workdir=self.working_dir,
                 tty=True
             )
+            SANDBOX_EXEC_SECONDS.observe(time.perf_counter() - started)
 
             output = result.output.decode('utf-8', errors='replace')
 
@@ -107,9 +145,62 @@ class DockerSandbox:
             return output
 
         except Exception as e:
+            SANDBOX_EXEC_ERRORS.inc()
             logger.error(f"Command execution error: {e}")
             return f"Error executing command: {str(e)}"
 
+    async def open_terminal(self, cols: int = 80, rows: int = 24) -> PtyStream:
+        """
+        Attach (or re-attach) the session's interactive shell
+
+        Args:
+            cols: Initial terminal width
+            rows: Initial terminal height
+
+        Returns:
+            The session's PTY stream
+        """
+        if not self.container:
+            raise RuntimeError("Sandbox not initialized")
+
+        if self.terminal is None or self.terminal.closed:
+            self.terminal = PtyStream(self.container, self.working_dir)
+            await self.terminal.open(cols, rows)
+            self._input.clear()
+            logger.info(f"Interactive shell attached: {self.container_name}")
+
+        return self.terminal
+
+    async def send_input(self, data: str) -> bool:
+        """
+        Forward keystrokes to the interactive shell
+
+        Keystrokes are tracked into a line buffer so the command filter can
+        still discard a dangerous line before Enter reaches the shell. This is
+        best-effort; the container's own limits are the real boundary.
+
+        Args:
+            data: Raw keystrokes from the client
+
+        Returns:
+            False if a line was discarded by the command filter
+        """
+        if self.terminal is None or self.terminal.closed:
+            raise RuntimeError("Terminal not attached")
+
+        allowed = True
+        keys = []
+        for key in data:
+            line = self._input.feed_key(key)
+            if line is not None and self._is_dangerous_command(line):
+                keys.append("\x15")  # Ctrl+U: discard the pending line
+                allowed = False
+                SANDBOX_BLOCKED_COMMANDS.inc()
+            keys.append(key)
+
+        await self.terminal.write("".join(keys))
+        return allowed
+
     def _is_dangerous_command(self, command: str) -> bool:
         """
         Check if a command is potentially dangerous
@@ -158,51 +249,118 @@ class DockerSandbox:
             cols: Number of columns
             rows: Number of rows
         """
-        if self.container:
+        if self.terminal is not None and not self.terminal.closed:
+            await self.terminal.resize(cols, rows)
+        elif self.container:
             try:
-                self.container.resize(height=rows, width=cols)
+                await docker_service.resize(self.container, height=rows, width=cols)
             except Exception as e:
                 logger.warning(f"Failed to resize terminal: {e}")
 
-    async def setup_challenge(self, challenge_files: Dict[str, str]):
+    async def check_files(self, checks: List[FileCheck]) -> List[bool]:
+        """Evaluate every file predicate with a single exec; arguments are passed as argv, never through a shell"""
+        if not self.container:
+            raise RuntimeError("Sandbox not initialized")
+
+        args: List[str] = []
+        for check in checks:
+            args += ["exists", check.path, ""] if check.text is None else ["contains", check.path, check.text]
+        result = await docker_service.exec_run(
+            self.container,
+            ["/bin/sh", "-c", FILE_CHECK_SCRIPT, "sh", *args],
+            workdir=self.working_dir
+        )
+        answers = result.output.decode("utf-8", errors="replace").split()
+        return [index < len(answers) and answers[index] == "1" for index in range(len(checks))]
+
+    async def reset(self):
+        """
+        Restore the workspace to the challenge baseline
+
+        The image keeps a copy of the provisioned workspace, so a reset is one
+        exec in the running container rather than a new container. An
+        attached shell is interrupted and returned to the workspace.
+        """
+        if not self.container:
+            raise RuntimeError("Sandbox not initialized")
+
+        started = time.perf_counter()
+        result = await docker_service.exec_run(
+            self.container,
+            ["/bin/sh", "-c", RESTORE_WORKSPACE_COMMAND],
+            workdir="/"
+        )
+        if result.exit_code != 0:
+            output = result.output.decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"Workspace restore failed ({result.exit_code}): {output}")
+
+        if self.terminal is not None and not self.terminal.closed:
+            self._input.clear()
+            await self.terminal.write(f"\x03cd {self.working_dir}\n")
+        SANDBOX_RESET_SECONDS.observe(time.perf_counter() - started)
+        logger.info(f"Sandbox workspace reset: {self.container_name}")
+
+    async def setup_challenge(self, challenge_files: Dict[str, FileContent]):
         """
         Set up files for a specific challenge
 
+        All files are packed into one tar stream and uploaded with a single
+        archive request, regardless of how many files the challenge has.
+
         Args:
-            challenge_files: Dictionary of filename -> content
+            challenge_files: Dictionary of filename -> content (str or bytes)
         """
         if not self.container:
             raise RuntimeError("Sandbox not initialized")
 
-        for filename, content in challenge_files.items():
+        if not challenge_files:
+            return
+
+        try:
+            archive = await asyncio.to_thread(pack_files, challenge_files)
             try:
-                # Create file in container
-                self.container.exec_run(
-                    f"bash -c 'cat > {filename}'",
-                    stdin=True,
-                    workdir=self.working_dir
-                )
-
-                # Write content to file
-                self.container.exec_run(
-                    f"bash -c 'echo {repr(content)} > {filename}'",
-                    workdir=self.working_dir
-                )
+                await docker_service.put_archive(self.container, self.working_dir, archive)
+            finally:
+                archive.close()
+        except Exception as e:
+            logger.error(f"Failed to provision challenge files for {self.container_name}: {e}")
+            raise
 
-            except Exception as e:
-                logger.error(f"Failed to create challenge file {filename}: {e}")
+    async def cleanup(self, grace_period: int = 5):
+        """
+        Clean up the sandbox container and its workspace volume
+
+        Args:
+            grace_period: Seconds the container gets to stop before it is killed
+        """
+        started = time.perf_counter()
+        if self.terminal is not None:
+            await self.terminal.close()
+            self.terminal = None
 
-    async def cleanup(self):
-        """Clean up the sandbox container"""
         if self.container:
             try:
-                self.container.stop(timeout=5)
+                await docker_service.stop(self.container, grace_period=grace_period)
                 logger.info(f"Sandbox container stopped: {self.container_name}")
             except Exception as e:
                 logger.error(f"Error stopping container: {e}")
                 try:
-                    self.container.kill()
+                    await docker_service.kill(self.container)
                 except Exception as kill_error:
                     logger.error(f"Error killing container: {kill_error}")
 
-            self.container = None
\ No newline at end of file
+            self.container = None
+            try:
+                await docker_service.remove_volume(self.volume_name)
+            except Exception as e:
+                # Usually still attached while the daemon removes the container; the reaper retries
+                logger.debug(f"Workspace volume {self.volume_name} not removed yet: {e}")
+            SANDBOX_CLEANUP_SECONDS.observe(time.perf_counter() - started)
+
+        active_containers.discard(self.container_name)
+        self._release_reservation()
+
+    def _release_reservation(self):
+        if self.reservation is not None:
+            self.reservation.release()
+            self.reservation = None
\ No newline at end of file
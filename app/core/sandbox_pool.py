@@ -0,0 +1,255 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from app import config
+from app.core.admission import Reservation, admission
+from app.core.execution import cleanup_backends
+from app.core.sandbox import DockerSandbox
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SandboxPool:
+    """
+    Warm pool of ready, fully set-up sandbox containers for one image
+
+    When the number of ready plus in-flight containers drops to the low
+    watermark, a background task tops the pool back up to the high watermark.
+    """
+
+    def __init__(
+        self,
+        image: str,
+        low_watermark: int = config.SANDBOX_POOL_LOW_WATERMARK,
+        high_watermark: int = config.SANDBOX_POOL_HIGH_WATERMARK,
+        refill_concurrency: int = config.SANDBOX_POOL_REFILL_CONCURRENCY
+    ):
+        self.image = image
+        self.low_watermark = max(0, low_watermark)
+        self.high_watermark = max(self.low_watermark, high_watermark)
+        self.refill_concurrency = max(1, refill_concurrency)
+
+        self._ready: Deque[DockerSandbox] = deque()
+        self._provisioning = 0
+        self._refill_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # Pool statistics
+        self.hits = 0
+        self.misses = 0
+        self.provisioned = 0
+        self.failures = 0
+
+    @property
+    def size(self) -> int:
+        """Number of ready containers waiting to be claimed"""
+        return len(self._ready)
+
+    async def acquire(self, session_id: str, reservation: Optional[Reservation] = None) -> DockerSandbox:
+        """
+        Claim a sandbox for a session
+
+        Args:
+            session_id: Session that will own the sandbox
+            reservation: Host capacity admission granted for a new container
+
+        Returns:
+            An initialized sandbox, taken from the pool when one is ready
+        """
+        if self._ready:
+            sandbox = self._ready.popleft()
+            sandbox.session_id = session_id
+            if reservation is not None:
+                # The pooled container already holds its own reservation
+                reservation.release()
+            self.hits += 1
+            self._maybe_refill()
+            logger.info(f"Sandbox pool hit for {self.image}: {sandbox.container_name} -> {session_id}")
+            return sandbox
+
+        self.misses += 1
+        self._maybe_refill()
+        logger.info(f"Sandbox pool miss for {self.image}, provisioning on demand for {session_id}")
+
+        sandbox = DockerSandbox(session_id, image=self.image, reservation=reservation)
+        await sandbox.initialize()
+        return sandbox
+
+    def start(self):
+        """Begin filling the pool in the background"""
+        self._closed = False
+        self._maybe_refill(force=True)
+
+    def _maybe_refill(self, force: bool = False):
+        """Schedule a refill once the pool falls to its low watermark"""
+        if self._closed or self.high_watermark == 0:
+            return
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        if force or self.size + self._provisioning <= self.low_watermark:
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        """Provision containers until the high watermark is reached"""
+        while not self._closed:
+            missing = self.high_watermark - self.size - self._provisioning
+            if missing <= 0:
+                break
+
+            # Only capacity no queued session is waiting for
+            batch = min(missing, self.refill_concurrency, admission.background_slots())
+            if batch <= 0:
+                logger.info(f"Sandbox pool refill for {self.image} paused: no spare host capacity")
+                break
+            self._provisioning += batch
+            try:
+                results = await asyncio.gather(
+                    *(self._provision() for _ in range(batch)),
+                    return_exceptions=True
+                )
+            finally:
+                self._provisioning -= batch
+
+            failed = sum(1 for result in results if isinstance(result, BaseException))
+            if failed == batch:
+                # Back off instead of hammering a broken daemon
+                logger.warning(f"Sandbox pool refill for {self.image} failed, retrying later")
+                break
+
+    async def _provision(self):
+        """Create one warm container and add it to the pool"""
+        sandbox = DockerSandbox(f"pool-{uuid.uuid4().hex[:12]}", image=self.image)
+        try:
+            await sandbox.initialize()
+        except Exception:
+            self.failures += 1
+            raise
+
+        if self._closed:
+            await sandbox.cleanup()
+            return
+
+        self._ready.append(sandbox)
+        self.provisioned += 1
+
+    async def close(self) -> List[DockerSandbox]:
+        """
+        Stop refilling and hand back every unclaimed container
+
+        Returns:
+            Ready sandboxes the caller must clean up
+        """
+        self._closed = True
+
+        if self._refill_task is not None and not self._refill_task.done():
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+        ready = list(self._ready)
+        self._ready.clear()
+        return ready
+
+    async def shutdown(self, deadline: Optional[float] = None):
+        """Stop refilling and remove every unclaimed container"""
+        if deadline is None:
+            deadline = time.monotonic() + config.SHUTDOWN_TIMEOUT
+        await cleanup_backends(await self.close(), config.SHUTDOWN_CONCURRENCY, deadline, config.SHUTDOWN_STOP_GRACE)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool statistics"""
+        claims = self.hits + self.misses
+        return {
+            "image": self.image,
+            "ready": self.size,
+            "provisioning": self._provisioning,
+            "low_watermark": self.low_watermark,
+            "high_watermark": self.high_watermark,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / claims, 4) if claims else None,
+            "provisioned": self.provisioned,
+            "failures": self.failures
+        }
+
+
+class SandboxPoolManager:
+    """
+    Holds one warm pool per challenge image
+
+    Pools exist only for the images warm() was given; claims for any other
+    image get a container provisioned on demand, so nothing outside the
+    challenge catalog is refilled in the background.
+    """
+
+    def __init__(self):
+        self._pools: Dict[str, SandboxPool] = {}
+
+    def get_pool(self, image: str) -> SandboxPool:
+        """Get (or create and start filling) the pool for an image"""
+        pool = self._pools.get(image)
+        if pool is None:
+            pool = SandboxPool(image)
+            self._pools[image] = pool
+            if config.SANDBOX_POOL_ENABLED:
+                pool.start()
+        return pool
+
+    async def acquire(self, image: str, session_id: str, reservation: Optional[Reservation] = None) -> DockerSandbox:
+        """
+        Claim a sandbox for a session
+
+        Args:
+            image: Challenge image the sandbox should run
+            session_id: Session that will own the sandbox
+            reservation: Host capacity admission granted for a new container
+
+        Returns:
+            An initialized sandbox
+        """
+        pool = self._pools.get(image) if config.SANDBOX_POOL_ENABLED else None
+        if pool is None:
+            sandbox = DockerSandbox(session_id, image=image, reservation=reservation)
+            await sandbox.initialize()
+            return sandbox
+
+        return await pool.acquire(session_id, reservation)
+
+    def has_ready(self, image: str) -> bool:
+        """Whether a warm container for an image can be claimed right now"""
+        pool = self._pools.get(image)
+        return pool is not None and pool.size > 0
+
+    def warm(self, images: Iterable[str]):
+        """Start warming pools for the given images"""
+        if not config.SANDBOX_POOL_ENABLED:
+            return
+        for image in set(images):
+            self.get_pool(image)
+
+    async def shutdown(self, deadline: Optional[float] = None):
+        """Drain all pools, removing their containers in parallel until the deadline"""
+        if deadline is None:
+            deadline = time.monotonic() + config.SHUTDOWN_TIMEOUT
+        closed = await asyncio.gather(*(pool.close() for pool in self._pools.values()))
+        self._pools.clear()
+        ready = [sandbox for sandboxes in closed for sandbox in sandboxes]
+        cleaned = await cleanup_backends(ready, config.SHUTDOWN_CONCURRENCY, deadline, config.SHUTDOWN_STOP_GRACE)
+        logger.info(f"Removed {cleaned} of {len(ready)} pooled sandboxes")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get statistics for every pool"""
+        return {
+            "enabled": config.SANDBOX_POOL_ENABLED,
+            "pools": [pool.stats() for pool in self._pools.values()]
+        }
+
+
+# Process-wide pool manager
+sandbox_pools = SandboxPoolManager()
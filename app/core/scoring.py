@@ -1 +1,309 @@
-# Scoring algorithms
\ No newline at end of file
+# Scoring algorithms
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app import config
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Starting value of a challenge by difficulty, unless it sets "points" itself
+DIFFICULTY_POINTS = {
+    "beginner": 100,
+    "intermediate": 250,
+    "advanced": 500,
+    "expert": 1000
+}
+DEFAULT_POINTS = 100
+
+
+def _bonus_table(value: str) -> np.ndarray:
+    """Parse "50,25,10" into first, second, third... solver bonuses"""
+    bonuses = [int(part) for part in value.split(",") if part.strip()]
+    return np.array(bonuses, dtype=np.int64)
+
+
+def decayed_values(
+    solves: np.ndarray,
+    initial: np.ndarray,
+    minimum: np.ndarray,
+    decay: float
+) -> np.ndarray:
+    """
+    Current value of challenges with the given solve counts
+
+    Values fall parabolically from initial (first solver) to minimum, which
+    is reached after `decay` further solves, and stay there.
+    """
+    extra = np.maximum(solves - 1, 0).astype(np.float64)
+    fraction = np.minimum(extra / max(decay, 1.0), 1.0) ** 2
+    return np.ceil(initial - (initial - minimum) * fraction).astype(np.int64)
+
+
+class ScoreUpdate(NamedTuple):
+    """Outcome of one solve"""
+
+    awarded: int
+    value: int
+    first_blood_bonus: int
+    totals: Dict[str, int]
+
+
+class ScoringEngine:
+    """
+    Dynamic scoring over an array-backed copy of the solves table
+
+    Users and challenges are mapped to dense indices and solves are stored
+    column-wise (user, challenge, solved_at). Every solver of a challenge
+    earns its current value, which decays as the solve count grows, plus a
+    fixed first-blood bonus for the first few solvers.
+
+    A new solve is applied as a delta: the solver gets value plus bonus,
+    and if the challenge's value dropped, the difference is subtracted from
+    every previous solver's total with one vectorized update. rebuild()
+    recomputes every total from the solve columns in a handful of numpy
+    passes, with no per-row Python work.
+    """
+
+    def __init__(
+        self,
+        decay: float = config.SCORING_DECAY_SOLVES,
+        minimum_fraction: float = config.SCORING_MINIMUM_FRACTION,
+        first_blood_bonuses: str = config.SCORING_FIRST_BLOOD_BONUSES
+    ):
+        self.decay = decay
+        self.minimum_fraction = minimum_fraction
+        self.bonuses = _bonus_table(first_blood_bonuses)
+
+        self._user_ids: List[str] = []
+        self._user_index: Dict[str, int] = {}
+        self._challenge_ids: List[str] = []
+        self._challenge_index: Dict[str, int] = {}
+
+        # Per-challenge columns
+        self._initial = np.zeros(0, dtype=np.int64)
+        self._minimum = np.zeros(0, dtype=np.int64)
+        self._solve_counts = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros(0, dtype=np.int64)
+        # Solver user indices per challenge, in solve order
+        self._solvers: List[array] = []
+
+        # Per-user totals
+        self._totals = np.zeros(0, dtype=np.int64)
+
+        # Solve columns, appended in arrival order
+        self._solve_users = array("i")
+        self._solve_challenges = array("i")
+        self._solve_times = array("d")
+        self._solved: set = set()
+
+    def __len__(self) -> int:
+        return len(self._solve_users)
+
+    def _base_points(self, challenge: Dict[str, Any]) -> int:
+        points = challenge.get("points")
+        if points is None:
+            points = DIFFICULTY_POINTS.get(challenge.get("difficulty"), DEFAULT_POINTS)
+        return int(points)
+
+    def _grow(self, column: np.ndarray, size: int) -> np.ndarray:
+        """Column with room for at least size entries (doubling, zero filled)"""
+        if size <= len(column):
+            return column
+        grown = np.zeros(max(size, 2 * len(column), 64), dtype=column.dtype)
+        grown[:len(column)] = column
+        return grown
+
+    def _user(self, user_id: str) -> int:
+        index = self._user_index.get(user_id)
+        if index is None:
+            index = len(self._user_ids)
+            self._user_ids.append(user_id)
+            self._user_index[user_id] = index
+            self._totals = self._grow(self._totals, index + 1)
+        return index
+
+    def _challenge(self, challenge_id: str) -> int:
+        index = self._challenge_index.get(challenge_id)
+        if index is None:
+            index = len(self._challenge_ids)
+            self._challenge_ids.append(challenge_id)
+            self._challenge_index[challenge_id] = index
+            self._initial = self._grow(self._initial, index + 1)
+            self._minimum = self._grow(self._minimum, index + 1)
+            self._solve_counts = self._grow(self._solve_counts, index + 1)
+            self._values = self._grow(self._values, index + 1)
+            self._initial[index] = DEFAULT_POINTS
+            self._minimum[index] = int(DEFAULT_POINTS * self.minimum_fraction)
+            self._values[index] = DEFAULT_POINTS
+            self._solvers.append(array("i"))
+        return index
+
+    def configure(self, challenges: Iterable[Dict[str, Any]]) -> bool:
+        """
+        Set challenge values from their definitions
+
+        Returns:
+            True if any value changed, in which case totals need a rebuild()
+        """
+        changed = False
+        for challenge in challenges:
+            index = self._challenge(challenge["id"])
+            initial = self._base_points(challenge)
+            minimum = int(challenge.get("minimum_points", initial * self.minimum_fraction))
+            if self._initial[index] != initial or self._minimum[index] != minimum:
+                self._initial[index] = initial
+                self._minimum[index] = minimum
+                changed = True
+        return changed
+
+    def value(self, challenge_id: str) -> int:
+        """What the next solver of a challenge would earn before bonuses"""
+        index = self._challenge(challenge_id)
+        count = self._solve_counts[index:index + 1] + 1
+        return int(decayed_values(count, self._initial[index:index + 1], self._minimum[index:index + 1], self.decay)[0])
+
+    def next_award(self, challenge_id: str) -> int:
+        """Points the next solver of a challenge would earn, bonus included"""
+        position = int(self._solve_counts[self._challenge(challenge_id)])
+        bonus = int(self.bonuses[position]) if position < len(self.bonuses) else 0
+        return self.value(challenge_id) + bonus
+
+    def score(self, user_id: str) -> int:
+        index = self._user_index.get(user_id)
+        return int(self._totals[index]) if index is not None else 0
+
+    def has_solved(self, user_id: str, challenge_id: str) -> bool:
+        return (user_id, challenge_id) in self._solved
+
+    def _append(self, user: int, challenge: int, solved_at: float):
+        self._solve_users.append(user)
+        self._solve_challenges.append(challenge)
+        self._solve_times.append(solved_at)
+        self._solvers[challenge].append(user)
+
+    def record_solve(self, user_id: str, challenge_id: str, solved_at: Optional[float] = None) -> Optional[ScoreUpdate]:
+        """
+        Apply one new solve as a delta
+
+        Returns:
+            The points awarded and the new totals of every user whose score
+            changed, or None if the user had already solved the challenge
+        """
+        if (user_id, challenge_id) in self._solved:
+            return None
+        user = self._user(user_id)
+        challenge = self._challenge(challenge_id)
+        self._solved.add((user_id, challenge_id))
+
+        previous = self._solvers[challenge]
+        old_value = int(self._values[challenge])
+        position = len(previous)
+        self._solve_counts[challenge] += 1
+        value = int(decayed_values(
+            self._solve_counts[challenge:challenge + 1],
+            self._initial[challenge:challenge + 1],
+            self._minimum[challenge:challenge + 1],
+            self.decay
+        )[0])
+        self._values[challenge] = value
+
+        totals: Dict[str, int] = {}
+        delta = value - old_value if position else 0
+        if delta and previous:
+            solvers = np.frombuffer(previous, dtype=np.int32)
+            self._totals[solvers] += delta
+            totals = {self._user_ids[i]: int(self._totals[i]) for i in solvers.tolist()}
+            del solvers
+
+        bonus = int(self.bonuses[position]) if position < len(self.bonuses) else 0
+        self._totals[user] += value + bonus
+        totals[user_id] = int(self._totals[user])
+        self._append(user, challenge, solved_at if solved_at is not None else time.time())
+        return ScoreUpdate(value + bonus, value, bonus, totals)
+
+    def load(self, solves: Iterable[Tuple[str, str, float]]):
+        """Replace all solves with (user_id, challenge_id, solved_at) rows, then rebuild()"""
+        self._solve_users = array("i")
+        self._solve_challenges = array("i")
+        self._solve_times = array("d")
+        self._solvers = [array("i") for _ in self._challenge_ids]
+        self._solved = set()
+        for user_id, challenge_id, solved_at in solves:
+            if (user_id, challenge_id) in self._solved:
+                continue
+            self._solved.add((user_id, challenge_id))
+            self._append(self._user(user_id), self._challenge(challenge_id), solved_at)
+
+    def rebuild(self) -> Dict[str, int]:
+        """
+        Recompute every challenge value and user total in one pass
+
+        Returns:
+            New total per user id
+        """
+        started = time.perf_counter()
+        n_users = len(self._user_ids)
+        n_challenges = len(self._challenge_ids)
+        users = np.frombuffer(self._solve_users, dtype=np.int32)
+        challenges = np.frombuffer(self._solve_challenges, dtype=np.int32)
+        times = np.frombuffer(self._solve_times, dtype=np.float64)
+
+        counts = np.bincount(challenges, minlength=n_challenges).astype(np.int64)
+        values = decayed_values(counts, self._initial[:n_challenges], self._minimum[:n_challenges], self.decay)
+        points = values[challenges]
+
+        if len(self.bonuses) and len(challenges):
+            # Position of each solve within its challenge, in solve-time order
+            order = np.lexsort((times, challenges))
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            positions = np.empty(len(order), dtype=np.int64)
+            positions[order] = np.arange(len(order)) - starts[challenges[order]]
+            eligible = positions < len(self.bonuses)
+            points[eligible] += self.bonuses[positions[eligible]]
+
+            # Keep solver lists in solve-time order so later deltas line up
+            ordered_users = users[order]
+            bounds = np.cumsum(counts)
+            self._solvers = [
+                array("i", ordered_users[start:end].tobytes())
+                for start, end in zip(starts.tolist(), bounds.tolist())
+            ]
+
+        totals = np.bincount(users, weights=points, minlength=n_users).astype(np.int64)
+        del users, challenges, times
+
+        self._solve_counts = self._grow(counts, len(self._initial))
+        self._values = self._grow(values, len(self._initial))
+        self._totals = self._grow(totals, len(self._totals))
+        logger.info(
+            f"Rescored {n_users} users over {len(self)} solves and {n_challenges} challenges "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return {user_id: int(total) for user_id, total in zip(self._user_ids, totals.tolist())}
+
+    def values(self) -> Dict[str, int]:
+        """Current value of each challenge for its next solver, before bonuses"""
+        counts = self._solve_counts[:len(self._challenge_ids)] + 1
+        values = decayed_values(counts, self._initial[:len(counts)], self._minimum[:len(counts)], self.decay)
+        return dict(zip(self._challenge_ids, values.tolist()))
+
+    async def load_from_database(self, db: Any) -> Dict[str, int]:
+        """Load the solves table and rescore everyone"""
+        records = await db.fetch(SOLVES_QUERY)
+        self.load((record["user_id"], record["challenge_id"], record["solved_at"].timestamp()) for record in records)
+        return self.rebuild()
+
+
+SOLVES_QUERY = """
+SELECT user_id, challenge_id, solved_at
+FROM challenge_solves
+ORDER BY solved_at
+"""
+
+
+# Process-wide scoring engine
+scoring_engine = ScoringEngine()
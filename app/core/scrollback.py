@@ -0,0 +1,82 @@
+from typing import Tuple
+
+from app import config
+
+# When replay starts inside overwritten output, skip ahead to the next line
+# (up to this far) so the client doesn't get half an escape sequence
+_RESYNC_SCAN_BYTES = 1024
+
+
+class ScrollbackBuffer:
+    """
+    Fixed-size ring of a session's most recent terminal output
+
+    Output bytes are numbered by their offset in the session's output
+    stream, so a client that remembers the sequence number of the last byte
+    it saw can be sent exactly what it missed. The ring is allocated once;
+    older output is overwritten, and memory never depends on how much a
+    session printed.
+    """
+
+    __slots__ = ("capacity", "end", "_buffer")
+
+    def __init__(self, capacity: int = config.TERMINAL_SCROLLBACK_BYTES):
+        self.capacity = max(1, capacity)
+        self.end = 0
+        self._buffer = bytearray(self.capacity)
+
+    @property
+    def start(self) -> int:
+        """Sequence number of the oldest byte still held"""
+        return max(0, self.end - self.capacity)
+
+    def write(self, data: bytes) -> int:
+        """
+        Append output, overwriting the oldest bytes once full
+
+        Returns:
+            Sequence number just past the written data
+        """
+        size = len(data)
+        view = memoryview(data)
+        if size > self.capacity:
+            view = view[size - self.capacity:]
+
+        position = (self.end + size - len(view)) % self.capacity
+        first = min(len(view), self.capacity - position)
+        self._buffer[position:position + first] = view[:first]
+        if first < len(view):
+            self._buffer[:len(view) - first] = view[first:]
+
+        self.end += size
+        return self.end
+
+    def since(self, seq: int) -> Tuple[int, bytes]:
+        """
+        Output from sequence number seq onwards
+
+        A seq from before the oldest byte held (or from a previous incarnation
+        of the session, past the end) gets everything still in the ring.
+
+        Returns:
+            Sequence number of the first byte returned, and the bytes
+        """
+        if seq > self.end:
+            seq = 0
+        start = max(seq, self.start)
+        length = self.end - start
+        if length <= 0:
+            return self.end, b""
+
+        position = start % self.capacity
+        first = min(length, self.capacity - position)
+        data = bytes(self._buffer[position:position + first])
+        if first < length:
+            data += bytes(self._buffer[:length - first])
+
+        if start > seq:
+            newline = data.find(b"\n", 0, _RESYNC_SCAN_BYTES)
+            if newline >= 0:
+                data = data[newline + 1:]
+                start += newline + 1
+        return start, data
@@ -0,0 +1,275 @@
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app import config
+from app.services.redis_client import RedisClient
+from app.utils.exceptions import NodeConfigurationError
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SessionOwner:
+    """Which node (and container) currently owns a session"""
+
+    def __init__(self, node_id: str, node_url: str, container: Optional[str] = None):
+        self.node_id = node_id
+        self.node_url = node_url
+        self.container = container
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"node_id": self.node_id, "node_url": self.node_url, "container": self.container}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SessionOwner":
+        return cls(data["node_id"], data.get("node_url", ""), data.get("container"))
+
+
+class SessionDirectory:
+    """
+    Maps session ids to the node that owns their sandbox
+
+    Ownership is a lease with a TTL: the owning node renews it periodically,
+    and if the node dies the lease expires and another node may claim the
+    session.
+
+    Only a shared directory can tell whether another node is alive; one
+    that lives in this process reports every node as alive, so nothing acts
+    on another node's resources.
+    """
+
+    # Whether other workers and nodes see the same directory
+    shared = False
+
+    def __init__(self, node_id: str = config.NODE_ID, node_url: str = config.NODE_URL):
+        self.node_id = node_id
+        self.node_url = node_url
+
+    def local_owner(self, container: Optional[str] = None) -> SessionOwner:
+        return SessionOwner(self.node_id, self.node_url, container)
+
+    def is_local(self, owner: Optional[SessionOwner]) -> bool:
+        return owner is not None and owner.node_id == self.node_id
+
+    async def claim(self, session_id: str, container: Optional[str], ttl: float) -> SessionOwner:
+        """
+        Take the lease on a session unless another node holds it
+
+        Returns:
+            The owner after the call; compare with is_local() to see if the claim succeeded
+        """
+        raise NotImplementedError
+
+    async def lookup(self, session_id: str) -> Optional[SessionOwner]:
+        """Current owner of a session, or None if nobody holds a live lease"""
+        raise NotImplementedError
+
+    async def renew(self, session_ids: Iterable[str], ttl: float) -> List[str]:
+        """
+        Extend this node's leases
+
+        Returns:
+            Session ids whose lease was lost to (or expired for) another node
+        """
+        raise NotImplementedError
+
+    async def release(self, session_id: str):
+        """Drop this node's lease on a session"""
+        raise NotImplementedError
+
+    async def heartbeat(self, ttl: float):
+        """Advertise that this node is alive for the next ttl seconds"""
+
+    async def is_node_alive(self, node_id: str) -> bool:
+        """Whether a node has heartbeated recently (always, when the directory isn't shared)"""
+        return True
+
+    async def close(self):
+        pass
+
+
+class InMemorySessionDirectory(SessionDirectory):
+    """
+    Single-process directory
+
+    Used when running one worker, and as the in-process stand-in for the
+    Redis backend in tests: it implements the same lease semantics.
+    """
+
+    def __init__(self, node_id: str = config.NODE_ID, node_url: str = config.NODE_URL):
+        super().__init__(node_id, node_url)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def _live_entry(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(session_id)
+        if entry is not None and entry["expires_at"] <= time.monotonic():
+            del self._entries[session_id]
+            return None
+        return entry
+
+    async def claim(self, session_id: str, container: Optional[str], ttl: float) -> SessionOwner:
+        entry = self._live_entry(session_id)
+        if entry is not None and entry["owner"].node_id != self.node_id:
+            return entry["owner"]
+
+        owner = self.local_owner(container)
+        self._entries[session_id] = {"owner": owner, "expires_at": time.monotonic() + ttl}
+        return owner
+
+    async def lookup(self, session_id: str) -> Optional[SessionOwner]:
+        entry = self._live_entry(session_id)
+        return entry["owner"] if entry is not None else None
+
+    async def renew(self, session_ids: Iterable[str], ttl: float) -> List[str]:
+        lost = []
+        expires_at = time.monotonic() + ttl
+        for session_id in session_ids:
+            entry = self._live_entry(session_id)
+            if entry is None or entry["owner"].node_id != self.node_id:
+                lost.append(session_id)
+            else:
+                entry["expires_at"] = expires_at
+        return lost
+
+    async def release(self, session_id: str):
+        entry = self._entries.get(session_id)
+        if entry is not None and entry["owner"].node_id == self.node_id:
+            del self._entries[session_id]
+
+
+# Take or refresh a lease unless another node holds it; returns the other node's entry, or nil once claimed
+_CLAIM_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value and cjson.decode(value)['node_id'] ~= ARGV[1] then
+    return value
+end
+redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+return false
+"""
+
+# Extend a lease only if this node still owns it
+_RENEW_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then return 0 end
+if cjson.decode(value)['node_id'] ~= ARGV[1] then return 0 end
+return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+"""
+
+# Delete a lease only if this node still owns it
+_RELEASE_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value and cjson.decode(value)['node_id'] == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Mark this node alive and hold its URL; returns the node already advertising that URL, or nil
+_HEARTBEAT_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+local holder = redis.call('GET', KEYS[2])
+if holder and holder ~= ARGV[1] then
+    return holder
+end
+redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[3])
+return false
+"""
+
+
+class RedisSessionDirectory(SessionDirectory):
+    """
+    Directory shared by every worker and node through a Redis-protocol server
+
+    Each session is one key holding the owner as JSON, with the lease as the
+    key's TTL. Claims, renewals and releases run as scripts so a node never
+    takes, extends or deletes a lease another node holds.
+
+    Other nodes redirect sessions to their owner's node_url, so every node
+    needs its own: construction fails without one, and heartbeat() raises
+    NodeConfigurationError if another live node advertises the same URL.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        client: Optional[RedisClient] = None,
+        node_id: str = config.NODE_ID,
+        node_url: str = config.NODE_URL,
+        key_prefix: str = "cli-quest:session:",
+        node_prefix: str = "cli-quest:node:",
+        node_url_prefix: str = "cli-quest:node-url:"
+    ):
+        if not node_url:
+            raise NodeConfigurationError(
+                "NODE_URL must be set to this worker's own address when SESSION_DIRECTORY_BACKEND=redis"
+            )
+        super().__init__(node_id, node_url)
+        self.client = client or RedisClient(config.REDIS_URL)
+        self.key_prefix = key_prefix
+        self.node_prefix = node_prefix
+        self.node_url_prefix = node_url_prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}"
+
+    async def claim(self, session_id: str, container: Optional[str], ttl: float) -> SessionOwner:
+        owner = self.local_owner(container)
+        key = self._key(session_id)
+        ttl_ms = max(1, int(ttl * 1000))
+
+        # One script, so a lease expiring mid-claim can't leave us believing we own it
+        current = await self.client.execute(
+            "EVAL", _CLAIM_SCRIPT, 1, key, self.node_id, json.dumps(owner.to_dict()), ttl_ms
+        )
+        return SessionOwner.from_dict(json.loads(current)) if current is not None else owner
+
+    async def lookup(self, session_id: str) -> Optional[SessionOwner]:
+        value = await self.client.execute("GET", self._key(session_id))
+        return SessionOwner.from_dict(json.loads(value)) if value is not None else None
+
+    async def renew(self, session_ids: Iterable[str], ttl: float) -> List[str]:
+        session_ids = list(session_ids)
+        if not session_ids:
+            return []
+
+        ttl_ms = max(1, int(ttl * 1000))
+        replies = await self.client.pipeline([
+            ["EVAL", _RENEW_SCRIPT, 1, self._key(session_id), self.node_id, ttl_ms]
+            for session_id in session_ids
+        ])
+        return [
+            session_id
+            for session_id, reply in zip(session_ids, replies)
+            if reply != 1
+        ]
+
+    async def release(self, session_id: str):
+        await self.client.execute("EVAL", _RELEASE_SCRIPT, 1, self._key(session_id), self.node_id)
+
+    async def heartbeat(self, ttl: float):
+        holder = await self.client.execute(
+            "EVAL", _HEARTBEAT_SCRIPT, 2,
+            f"{self.node_prefix}{self.node_id}", f"{self.node_url_prefix}{self.node_url}",
+            self.node_id, self.node_url, max(1, int(ttl * 1000))
+        )
+        if holder is not None:
+            raise NodeConfigurationError(
+                f"NODE_URL {self.node_url} is already used by node {holder}; every worker needs its own"
+            )
+
+    async def is_node_alive(self, node_id: str) -> bool:
+        if node_id == self.node_id:
+            return True
+        return await self.client.execute("EXISTS", f"{self.node_prefix}{node_id}") == 1
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_session_directory() -> SessionDirectory:
+    """Build the directory backend selected in config"""
+    if config.SESSION_DIRECTORY_BACKEND == "redis":
+        return RedisSessionDirectory()
+    return InMemorySessionDirectory()
@@ -0,0 +1,418 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app import config
+from app.core.execution import BACKEND_DOCKER, BACKEND_VIRTUAL, ExecutionBackend, cleanup_backends
+from app.core.scrollback import ScrollbackBuffer
+from app.core.session_directory import SessionDirectory, create_session_directory
+from app.core.transport import CLOSE_SESSION_ENDED, CLOSE_SESSION_MOVED
+from app.utils.logger import setup_logger
+from app.utils.validators import parse_memory_size
+
+logger = setup_logger(__name__)
+
+
+class SandboxSession:
+    """A live sandbox and its activity bookkeeping"""
+
+    def __init__(self, session_id: str, sandbox: ExecutionBackend, challenge_id: Optional[str] = None):
+        now = time.monotonic()
+        self.session_id = session_id
+        self.sandbox = sandbox
+        self.challenge_id = challenge_id
+        self.created_at = now
+        self.last_activity = now
+        self.connections = 0
+        self.disconnected_at: Optional[float] = now
+        # Terminal transports connected to the session, closed before the sandbox goes away
+        self.transports: Set[Any] = set()
+        # Output the client is shown, kept for replay on reconnect
+        self.scrollback = ScrollbackBuffer()
+        # Challenge objective tracking (ObjectiveProgress), attached by the terminal endpoint
+        self.progress: Optional[Any] = None
+
+
+class SessionManager:
+    """
+    Tracks live sandboxes, reaps idle ones and caps how many can exist
+
+    Sessions are kept in least-recently-used order, overall and per kind,
+    and detached sessions additionally in the order they were detached, so
+    picking an eviction victim and recording activity are O(1), and the
+    reaper only looks at the sessions it reaps. Container and virtual shell
+    sessions are capped separately, since the two differ in cost by orders
+    of magnitude.
+
+    A session counts as detached only once a client has connected and left.
+    Until its first connection it is waiting for the learner it was started
+    for (possibly just admitted from the queue), so it is never given away
+    to a queued session; it is reaped once the reconnect grace has passed
+    since it was created.
+
+    A session removed while a client is still connected has its websocket
+    closed with a reason before the sandbox is cleaned up.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = config.SESSION_IDLE_TIMEOUT,
+        reconnect_grace: float = config.SESSION_RECONNECT_GRACE,
+        reap_interval: float = config.SESSION_REAP_INTERVAL,
+        max_sandboxes: int = config.SESSION_MAX_SANDBOXES,
+        max_virtual: int = config.SESSION_MAX_VIRTUAL,
+        sandbox_memory: int = parse_memory_size(config.SANDBOX_MEM_LIMIT),
+        directory: Optional[SessionDirectory] = None,
+        lease_ttl: float = config.SESSION_LEASE_TTL
+    ):
+        self.idle_timeout = idle_timeout
+        self.reconnect_grace = reconnect_grace
+        self.reap_interval = reap_interval
+        self.max_sandboxes = max_sandboxes
+        self.max_virtual = max_virtual
+        self.sandbox_memory = sandbox_memory
+        self.directory = directory or create_session_directory()
+        self.lease_ttl = lease_ttl
+
+        self._sessions: "OrderedDict[str, SandboxSession]" = OrderedDict()
+        self._by_kind: Dict[str, "OrderedDict[str, SandboxSession]"] = {}
+        self._detached: Dict[str, "OrderedDict[str, SandboxSession]"] = {}
+        self._unattached: Dict[str, "OrderedDict[str, SandboxSession]"] = {}
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._lease_task: Optional[asyncio.Task] = None
+        self._disconnect_listeners: List[Callable[[str, int, str], None]] = []
+
+        # Lifecycle statistics
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[ExecutionBackend]:
+        """Get a session's sandbox and mark it as recently used"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        self.touch(session_id)
+        return session.sandbox
+
+    def get_session(self, session_id: str) -> Optional[SandboxSession]:
+        """Get the session record without updating its activity"""
+        return self._sessions.get(session_id)
+
+    def _limit(self, kind: str) -> int:
+        return self.max_virtual if kind == BACKEND_VIRTUAL else self.max_sandboxes
+
+    def _count(self, kind: str) -> int:
+        return len(self._by_kind.get(kind, ()))
+
+    def _add(self, session: SandboxSession):
+        kind = session.sandbox.kind
+        self._sessions[session.session_id] = session
+        self._by_kind.setdefault(kind, OrderedDict())[session.session_id] = session
+        self._detached.setdefault(kind, OrderedDict())
+        self._unattached.setdefault(kind, OrderedDict())[session.session_id] = session
+
+    def _pop(self, session_id: str) -> Optional[SandboxSession]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            kind = session.sandbox.kind
+            del self._by_kind[kind][session_id]
+            self._detached[kind].pop(session_id, None)
+            self._unattached[kind].pop(session_id, None)
+        return session
+
+    async def register(
+        self,
+        session_id: str,
+        sandbox: ExecutionBackend,
+        challenge_id: Optional[str] = None
+    ) -> SandboxSession:
+        """
+        Start tracking a sandbox, evicting the least recently used ones at the cap
+
+        Args:
+            session_id: Session identifier
+            sandbox: Initialized sandbox owned by the session
+            challenge_id: Challenge the session is working on
+
+        Returns:
+            The session record
+        """
+        previous = self._pop(session_id)
+        if previous is not None and previous.sandbox is not sandbox:
+            # Connected clients reconnect to the new sandbox
+            await self._disconnect(previous, CLOSE_SESSION_MOVED, "Session restarted, reconnecting...")
+            await self._cleanup(previous)
+
+        kind = sandbox.kind
+        while self._count(kind) >= self._limit(kind) > 0:
+            victim = self._pick_lru_victim(kind)
+            logger.warning(f"{kind} session cap reached, evicting least recently used session {victim.session_id}")
+            self.evicted_lru += 1
+            await self.remove(victim.session_id, "Session ended: the server is at capacity")
+
+        owner = await self.directory.claim(session_id, sandbox.container_name, self.lease_ttl)
+        if not self.directory.is_local(owner):
+            await sandbox.cleanup()
+            raise RuntimeError(f"Session {session_id} is owned by node {owner.node_id}")
+
+        session = SandboxSession(session_id, sandbox, challenge_id)
+        self._add(session)
+        return session
+
+    def _pick_lru_victim(self, kind: str) -> SandboxSession:
+        """Longest detached session of a kind, or the least recently used of that kind if all are connected"""
+        candidates = self._detached.get(kind) or self._by_kind[kind]
+        return next(iter(candidates.values()))
+
+    async def evict_detached(self, kind: str, count: int = 1) -> int:
+        """
+        Remove the longest detached sessions of a kind
+
+        Used to make room for queued sessions ahead of the reconnect grace.
+        Sessions nobody has connected to yet are left alone.
+
+        Returns:
+            Number of sessions evicted
+        """
+        victims = list(itertools.islice(self._detached.get(kind, {}), count))
+        for session_id in victims:
+            logger.info(f"Evicting detached {kind} session {session_id} for a queued session")
+            await self.remove(session_id)
+        self.evicted_lru += len(victims)
+        return len(victims)
+
+    def touch(self, session_id: str):
+        """Record activity on a session"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_activity = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._by_kind[session.sandbox.kind].move_to_end(session_id)
+
+    def attach(self, session_id: str, transport: Optional[Any] = None):
+        """
+        Record a websocket connecting to the session
+
+        Args:
+            session_id: Session identifier
+            transport: The connection's TerminalTransport, closed if the session is removed under it
+        """
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.connections += 1
+            session.disconnected_at = None
+            if transport is not None:
+                session.transports.add(transport)
+            self._detached[session.sandbox.kind].pop(session_id, None)
+            self._unattached[session.sandbox.kind].pop(session_id, None)
+            self.touch(session_id)
+
+    def detach(self, session_id: str, transport: Optional[Any] = None):
+        """Record a websocket leaving; the reconnect grace window starts when none remain"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        if transport is not None:
+            if transport not in session.transports:
+                # Attached to an earlier session with this id, already removed
+                return
+            session.transports.discard(transport)
+        session.connections = max(0, session.connections - 1)
+        if session.connections == 0:
+            session.disconnected_at = time.monotonic()
+            self._detached[session.sandbox.kind][session_id] = session
+
+    async def remove(self, session_id: str, reason: str = "Session ended"):
+        """
+        Stop tracking a session and clean up its sandbox
+
+        Args:
+            session_id: Session identifier
+            reason: Shown to clients still connected, whose websockets are closed first
+        """
+        session = self._pop(session_id)
+        if session is not None:
+            await self._disconnect(session, CLOSE_SESSION_ENDED, reason)
+            await self._cleanup(session)
+            try:
+                await self.directory.release(session_id)
+            except Exception as e:
+                logger.warning(f"Failed to release session lease {session_id}: {e}")
+
+    def on_disconnect(self, listener: Callable[[str, int, str], None]):
+        """Call listener(session_id, code, reason) whenever a session's clients are told it ended or moved"""
+        self._disconnect_listeners.append(listener)
+
+    async def _disconnect(self, session: SandboxSession, code: int, reason: str):
+        """Close the websockets still connected to a session, and tell the listeners"""
+        for listener in self._disconnect_listeners:
+            try:
+                listener(session.session_id, code, reason)
+            except Exception as e:
+                logger.error(f"Session disconnect listener failed for {session.session_id}: {e}")
+        transports, session.transports = session.transports, set()
+        for transport in transports:
+            await transport.disconnect(code, reason)
+
+    async def _cleanup(self, session: SandboxSession):
+        if session.progress is not None:
+            await session.progress.close()
+        try:
+            await session.sandbox.cleanup()
+            logger.info(f"Cleaned up sandbox session: {session.session_id}")
+        except Exception as e:
+            logger.error(f"Error cleaning up sandbox {session.session_id}: {e}")
+
+    async def reap(self) -> int:
+        """
+        Evict idle and abandoned sessions
+
+        Returns:
+            Number of sessions evicted
+        """
+        now = time.monotonic()
+        idle: List[str] = []
+        for session in self._sessions.values():
+            # Least recently used first, so the idle ones are a prefix
+            if now - session.last_activity <= self.idle_timeout:
+                break
+            idle.append(session.session_id)
+
+        abandoned: List[str] = []
+        for detached in itertools.chain(self._detached.values(), self._unattached.values()):
+            for session in detached.values():
+                # In the order they were detached
+                if now - session.disconnected_at <= self.reconnect_grace:
+                    break
+                abandoned.append(session.session_id)
+
+        expired = list(dict.fromkeys(idle + abandoned))
+        for session_id in expired:
+            logger.info(f"Reaping idle sandbox session: {session_id}")
+            await self.remove(session_id, "Session ended after being idle too long")
+
+        self.evicted_idle += len(expired)
+        return len(expired)
+
+    async def _reap_loop(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.error(f"Session reaper error: {e}")
+
+    async def renew_leases(self) -> List[str]:
+        """
+        Renew this node's directory leases and drop sessions another node took over
+
+        Returns:
+            Session ids whose lease was lost
+        """
+        lost = await self.directory.renew(list(self._sessions), self.lease_ttl)
+        for session_id in lost:
+            logger.warning(f"Lost lease on session {session_id}, releasing local sandbox")
+            session = self._pop(session_id)
+            if session is not None:
+                # Reconnecting clients are redirected to the node that holds it now
+                await self._disconnect(session, CLOSE_SESSION_MOVED, "Session moved to another server, reconnecting...")
+                await self._cleanup(session)
+        return lost
+
+    async def _lease_loop(self):
+        while True:
+            try:
+                # Other nodes' reapers leave this node's containers alone while it heartbeats
+                await self.directory.heartbeat(self.lease_ttl)
+            except Exception as e:
+                logger.error(f"Node heartbeat error: {e}")
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self.renew_leases()
+            except Exception as e:
+                logger.error(f"Session lease renewal error: {e}")
+
+    def start(self):
+        """Start the background reaper and lease renewal"""
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reap_loop())
+        if self._lease_task is None or self._lease_task.done():
+            self._lease_task = asyncio.create_task(self._lease_loop())
+
+    async def shutdown(self, deadline: Optional[float] = None):
+        """
+        Stop the background tasks and clean up every session
+
+        Sandboxes are torn down in parallel (SHUTDOWN_CONCURRENCY at a time)
+        with a short stop grace. Whatever is still running at the deadline
+        is left for the orphan reaper.
+
+        Args:
+            deadline: time.monotonic() value to give up at (default: SHUTDOWN_TIMEOUT from now)
+        """
+        if deadline is None:
+            deadline = time.monotonic() + config.SHUTDOWN_TIMEOUT
+        for task in (self._reaper_task, self._lease_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._reaper_task = None
+        self._lease_task = None
+
+        sessions = [self._pop(session_id) for session_id in list(self._sessions)]
+        cleaned = await cleanup_backends(
+            (session.sandbox for session in sessions),
+            config.SHUTDOWN_CONCURRENCY,
+            deadline,
+            config.SHUTDOWN_STOP_GRACE
+        )
+        logger.info(f"Cleaned up {cleaned} of {len(sessions)} sessions")
+
+        # Hand leases back so reconnects don't get routed here until they expire
+        releases = [asyncio.create_task(self.directory.release(session.session_id)) for session in sessions]
+        if releases:
+            _, pending = await asyncio.wait(releases, timeout=max(0.1, deadline - time.monotonic()))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*releases, return_exceptions=True)
+
+        await self.directory.close()
+
+    def session_ids(self) -> List[str]:
+        """Ids of all live sessions, least recently used first"""
+        return list(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current counts and memory commitment"""
+        live = len(self._sessions)
+        connected = sum(1 for session in self._sessions.values() if session.connections > 0)
+        return {
+            "node_id": self.directory.node_id,
+            "live_sessions": live,
+            "live_sandboxes": self._count(BACKEND_DOCKER),
+            "live_virtual": self._count(BACKEND_VIRTUAL),
+            "connected": connected,
+            "detached": live - connected,
+            "max_sandboxes": self.max_sandboxes,
+            "max_virtual": self.max_virtual,
+            "sandbox_memory_bytes": self.sandbox_memory,
+            "committed_memory_bytes": sum(session.sandbox.memory_bytes for session in self._sessions.values()),
+            "max_memory_bytes": self.max_sandboxes * self.sandbox_memory,
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru
+        }
+
+
+# Process-wide session manager
+session_manager = SessionManager()
@@ -0,0 +1,208 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app import config
+from app.models.submission import SubmissionRepository
+from app.utils.exceptions import RateLimitExceeded, SubmissionQueueFull
+from app.utils.logger import setup_logger
+from app.utils.rate_limit import TokenBucketLimiter
+
+logger = setup_logger(__name__)
+
+# Queued by shutdown behind the last accepted attempt
+_STOP = object()
+
+
+class Submission:
+    """One flag attempt waiting to be persisted"""
+
+    __slots__ = ("user_id", "challenge_id", "correct", "points", "submitted_at")
+
+    def __init__(self, user_id: str, challenge_id: str, correct: bool, points: int = 0):
+        self.user_id = user_id
+        self.challenge_id = challenge_id
+        self.correct = correct
+        self.points = points
+        self.submitted_at = datetime.now(timezone.utc)
+
+
+class SubmissionPipeline:
+    """
+    Write-behind pipeline for flag attempts
+
+    Attempts are accepted into a bounded queue immediately and written to
+    Postgres in batches, triggered by whichever comes first: the batch size
+    or the flush interval. Each batch is one SubmissionRepository write: COPY
+    for the attempts and a prepared executemany for new solves. A full queue
+    is reported as SubmissionQueueFull so callers can shed load, and shutdown
+    drains everything still queued.
+
+    Attempts are rate limited per client address, and per user within an
+    address. The user id comes from the request body until real auth
+    exists, so the address bucket is what stops a caller from buying more
+    attempts by inventing user ids.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = config.SUBMISSION_QUEUE_SIZE,
+        batch_size: int = config.SUBMISSION_BATCH_SIZE,
+        flush_interval: float = config.SUBMISSION_FLUSH_INTERVAL,
+        rate_burst: int = config.SUBMISSION_RATE_BURST,
+        rate_per_second: float = config.SUBMISSION_RATE_PER_SECOND,
+        address_rate_burst: int = config.SUBMISSION_ADDRESS_RATE_BURST,
+        address_rate_per_second: float = config.SUBMISSION_ADDRESS_RATE_PER_SECOND
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.limiter = TokenBucketLimiter(rate_burst, rate_per_second)
+        self.address_limiter = TokenBucketLimiter(address_rate_burst, address_rate_per_second)
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._repository: Optional[SubmissionRepository] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._accepting = False
+
+        # Pipeline statistics
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and not self._writer.done()
+
+    def check_rate(self, address: str, user_id: Optional[str] = None):
+        """
+        Count an attempt against the caller's rate limits
+
+        Args:
+            address: Client address the attempt came from
+            user_id: User the attempt claims to be from, if any
+
+        Raises:
+            RateLimitExceeded: If the address, or the user at that address, has no attempts left
+        """
+        # An address out of attempts never gets a per-user bucket, so invented ids can't fill the table
+        retry_after = self.address_limiter.acquire(address)
+        if not retry_after:
+            retry_after = self.limiter.acquire(f"{address}/{user_id or ''}")
+        if retry_after:
+            raise RateLimitExceeded(retry_after)
+
+    def submit(self, submission: Submission):
+        """
+        Accept an attempt for persistence without waiting on the database
+
+        Raises:
+            SubmissionQueueFull: If the writer is too far behind
+        """
+        if not self._accepting:
+            # Persistence disabled (no database); nothing to queue
+            return
+        try:
+            self._queue.put_nowait(submission)
+            self.accepted += 1
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise SubmissionQueueFull(retry_after=max(1.0, self.flush_interval * 4))
+
+    def start(self, repository: SubmissionRepository):
+        """Start writing batches through the given repository"""
+        self._repository = repository
+        self._accepting = True
+        if not self.running:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def _next_batch(self) -> List[Any]:
+        """Wait for the first attempt, then collect more until the size or time trigger fires"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write_loop(self):
+        while True:
+            batch = await self._next_batch()
+            stopping = batch[-1] is _STOP
+            if stopping:
+                batch.pop()
+            if batch:
+                await self._write_with_retry(batch)
+            if stopping:
+                return
+
+    async def _write_with_retry(self, batch: List[Submission], attempts: int = 3):
+        for attempt in range(1, attempts + 1):
+            try:
+                await self._write(batch)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Submission batch write failed (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    await asyncio.sleep(0.5 * attempt)
+
+        self.failed_batches += 1
+        logger.error(f"Dropped {len(batch)} submissions after {attempts} failed writes")
+
+    async def _write(self, batch: List[Submission]):
+        records = [
+            (item.user_id, item.challenge_id, item.correct, item.submitted_at)
+            for item in batch
+        ]
+        solves = [
+            (item.user_id, item.challenge_id, item.points, item.submitted_at)
+            for item in batch
+            if item.correct
+        ]
+        await self._repository.record_batch(records, solves)
+
+        self.written += len(batch)
+        self.batches += 1
+
+    async def shutdown(self, timeout: float = config.SUBMISSION_DRAIN_TIMEOUT):
+        """Stop accepting attempts and write out everything already queued"""
+        self._accepting = False
+        if not self.running:
+            return
+
+        # The stop marker queues behind every accepted attempt, so the writer
+        # flushes all of them before it exits
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout=timeout)
+            await asyncio.wait_for(asyncio.shield(self._writer), timeout=timeout)
+            logger.info("Submission pipeline drained")
+        except asyncio.TimeoutError:
+            logger.error(f"Submission drain timed out with {self._queue.qsize()} attempts unwritten")
+            self._writer.cancel()
+        self._writer = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pipeline statistics"""
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches
+        }
+
+
+# Process-wide submission pipeline
+submission_pipeline = SubmissionPipeline()
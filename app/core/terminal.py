@@ -0,0 +1,166 @@
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Union
+
+from app.services.docker_client import docker_service
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class LineBuffer:
+    """Reassembles typed lines from raw keystrokes, honouring the basic line editing keys"""
+
+    __slots__ = ("line",)
+
+    def __init__(self):
+        self.line = ""
+
+    def feed_key(self, key: str) -> Optional[str]:
+        """Apply one keystroke; returns the finished line on Enter"""
+        if key in "\r\n":
+            line, self.line = self.line, ""
+            return line
+        if key == "\x7f":
+            self.line = self.line[:-1]
+        elif key in ("\x03", "\x15"):
+            self.line = ""
+        elif key >= " ":
+            self.line += key
+        return None
+
+    def feed(self, data: str) -> List[str]:
+        """Apply keystrokes; returns every line finished on the way"""
+        lines = []
+        for key in data:
+            line = self.feed_key(key)
+            if line is not None:
+                lines.append(line)
+        return lines
+
+    def clear(self):
+        self.line = ""
+
+
+class PtyStream:
+    """
+    Long-lived interactive shell attached to a container over its TTY socket
+
+    Keystrokes are written straight into the shell and output is read back in
+    chunks as soon as it arrives, so shell state (cwd, environment, jobs)
+    persists between commands and long-running commands stream.
+
+    Plain unix/tcp sockets to the daemon are driven by the event loop. TLS
+    connections need blocking calls, and an idle shell blocks in recv
+    indefinitely, so each such stream gets two threads of its own (one
+    reading, one writing) instead of holding the shared docker workers.
+    """
+
+    def __init__(self, container: Any, working_dir: str, shell: str = "/bin/bash"):
+        self.container = container
+        self.working_dir = working_dir
+        self.shell = shell
+        self.exec_id: Optional[str] = None
+        self._socket: Any = None
+        self._raw: Optional[socket.socket] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._write_lock = asyncio.Lock()
+        self.closed = False
+
+    async def open(self, cols: int = 80, rows: int = 24):
+        """
+        Start the shell and attach to its PTY
+
+        Args:
+            cols: Initial terminal width
+            rows: Initial terminal height
+        """
+        self.exec_id = await docker_service.exec_create(
+            self.container,
+            [self.shell, "-i"],
+            stdin=True,
+            tty=True,
+            workdir=self.working_dir,
+            environment={"TERM": "xterm-256color", "COLUMNS": str(cols), "LINES": str(rows)}
+        )
+        self._socket = await docker_service.exec_attach(self.exec_id, tty=True)
+
+        raw = getattr(self._socket, "_sock", self._socket)
+        if type(raw) is socket.socket:
+            raw.setblocking(False)
+            self._raw = raw
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="docker-stream")
+
+        await self.resize(cols, rows)
+
+    async def read(self) -> bytes:
+        """
+        Read the next chunk of output
+
+        Returns:
+            Output bytes, or b"" once the shell has exited
+        """
+        if self.closed:
+            return b""
+
+        try:
+            if self._raw is not None:
+                data = await asyncio.get_running_loop().sock_recv(self._raw, READ_CHUNK_SIZE)
+            else:
+                data = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._socket.recv, READ_CHUNK_SIZE
+                )
+        except (ConnectionError, OSError) as e:
+            logger.info(f"Terminal stream closed: {e}")
+            data = b""
+
+        if not data:
+            self.closed = True
+        return data
+
+    async def write(self, data: Union[str, bytes]):
+        """Write keystrokes to the shell"""
+        if self.closed:
+            raise RuntimeError("Terminal stream is closed")
+
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        async with self._write_lock:
+            if self._raw is not None:
+                await asyncio.get_running_loop().sock_sendall(self._raw, payload)
+            else:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._socket.sendall, payload)
+
+    async def resize(self, cols: int, rows: int):
+        """Resize the PTY"""
+        if self.exec_id is None or self.closed:
+            return
+        try:
+            await docker_service.exec_resize(self.exec_id, height=rows, width=cols)
+        except Exception as e:
+            logger.warning(f"Failed to resize terminal stream: {e}")
+
+    async def close(self):
+        """Detach from the shell"""
+        if self.closed and self._socket is None:
+            return
+        self.closed = True
+
+        sock, self._socket, self._raw = self._socket, None, None
+        if sock is not None:
+            try:
+                if self._executor is not None:
+                    # Wakes the thread blocked reading from it; close() alone doesn't
+                    getattr(sock, "_sock", sock).shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                sock.close()
+            except Exception as e:
+                logger.warning(f"Error closing terminal stream: {e}")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
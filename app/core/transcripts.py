@@ -0,0 +1,501 @@
+import asyncio
+import hashlib
+import os
+import re
+import struct
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+from app import config
+from app.services.metrics import metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Event kinds
+EVENT_INPUT = 1
+EVENT_OUTPUT = 2
+EVENT_RESIZE = 3
+EVENT_NAMES = {EVENT_INPUT: "input", EVENT_OUTPUT: "output", EVENT_RESIZE: "resize"}
+
+# File layout: a magic header, then self-describing chunks appended one write at a time.
+# Chunk header: compressed length, raw length, event count, first and last event time
+FILE_MAGIC = b"CQTRANS1"
+CHUNK_HEADER = struct.Struct("<IIIdd")
+# Event header inside a chunk: wall-clock time, kind, payload length
+EVENT_HEADER = struct.Struct("<dBI")
+
+# Transcript files remembered as ending on a chunk boundary
+MAX_APPENDABLE_PATHS = 10000
+
+# How often expired transcript files are looked for, in seconds
+PRUNE_INTERVAL = 3600
+
+# Session ids that are safe to use as file names as they are
+_SAFE_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,127}")
+
+TRANSCRIPT_EVENTS = metrics.counter("cli_quest_transcript_events_total", "Terminal events recorded to transcripts")
+TRANSCRIPT_DROPPED = metrics.counter(
+    "cli_quest_transcript_dropped_events_total",
+    "Transcript events dropped because the writer fell behind"
+)
+TRANSCRIPT_WRITTEN_BYTES = metrics.counter(
+    "cli_quest_transcript_written_bytes_total",
+    "Compressed transcript bytes appended to disk"
+)
+
+
+class TranscriptEvent(NamedTuple):
+    """One recorded terminal event"""
+
+    time: float
+    kind: int
+    data: bytes
+
+
+class ChunkInfo(NamedTuple):
+    """Where a chunk's compressed events live in a transcript file"""
+
+    offset: int
+    compressed: int
+    events: int
+    first_time: float
+    last_time: float
+
+
+class _Recording:
+    """Events of one session waiting to be flushed"""
+
+    __slots__ = ("buffer", "events", "first_time", "last_time")
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.events = 0
+        self.first_time = 0.0
+        self.last_time = 0.0
+
+    def take(self) -> Tuple[bytes, int, float, float]:
+        chunk = (bytes(self.buffer), self.events, self.first_time, self.last_time)
+        self.buffer.clear()
+        self.events = 0
+        return chunk
+
+    def restore(self, chunk: Tuple[bytes, int, float, float]):
+        """Put back a chunk that failed to write, ahead of anything buffered since"""
+        raw, events, first_time, last_time = chunk
+        if not self.events:
+            self.last_time = last_time
+        self.buffer[:0] = raw
+        self.events += events
+        self.first_time = first_time
+
+
+def _append_chunk(path: str, chunk: Tuple[bytes, int, float, float], level: int, max_bytes: int = 0) -> int:
+    """
+    Compress and append one chunk to a transcript file (runs on a worker thread)
+
+    Returns:
+        Bytes written; 0 if the chunk would take the file past max_bytes
+    """
+    raw, events, first_time, last_time = chunk
+    compressed = zlib.compress(raw, level)
+    data = CHUNK_HEADER.pack(len(compressed), len(raw), events, first_time, last_time) + compressed
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            data = FILE_MAGIC + data
+        if max_bytes and f.tell() + len(data) > max_bytes:
+            return 0
+        # One write per chunk, so a crash can only truncate the last one
+        f.write(data)
+    return len(data)
+
+
+def _scan_chunks(f: Any, path: str) -> Tuple[List[ChunkInfo], int]:
+    """
+    Walk the chunk headers of an open transcript file
+
+    Returns:
+        The complete chunks, and the offset where the last of them ends
+    """
+    if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        raise ValueError(f"Not a transcript file: {path}")
+    size = os.fstat(f.fileno()).st_size
+    index = []
+    end = f.tell()
+    while True:
+        header = f.read(CHUNK_HEADER.size)
+        if len(header) < CHUNK_HEADER.size:
+            break
+        compressed, _, events, first_time, last_time = CHUNK_HEADER.unpack(header)
+        offset = f.tell()
+        if offset + compressed > size:
+            # Torn final write
+            break
+        index.append(ChunkInfo(offset, compressed, events, first_time, last_time))
+        end = f.seek(compressed, os.SEEK_CUR)
+    return index, end
+
+
+def _read_index(path: str) -> List[ChunkInfo]:
+    """Chunk headers of a transcript file, skipping over the compressed data"""
+    with open(path, "rb") as f:
+        return _scan_chunks(f, path)[0]
+
+
+def _truncate_torn_chunk(path: str):
+    """
+    Cut a torn final chunk (left by a crash or failed write) off a transcript file
+
+    Appending after one would misalign every later chunk header, so this
+    runs before the first append to a file that may have been torn.
+    """
+    try:
+        with open(path, "r+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < len(FILE_MAGIC) and FILE_MAGIC.startswith(f.read()):
+                end = 0
+            else:
+                f.seek(0)
+                end = _scan_chunks(f, path)[1]
+            if end < size:
+                f.truncate(end)
+                logger.warning(f"Truncated {size - end} bytes of torn transcript data from {path}")
+    except FileNotFoundError:
+        pass
+
+
+def _prune_files(directory: str, max_age: float) -> List[str]:
+    """Delete transcript files not written to for max_age seconds; returns their paths"""
+    cutoff = time.time() - max_age
+    pruned = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return pruned
+    for entry in entries:
+        if not entry.name.endswith(".transcript"):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                pruned.append(entry.path)
+        except FileNotFoundError:
+            pass
+    return pruned
+
+
+def _read_chunk(path: str, chunk: ChunkInfo) -> List[TranscriptEvent]:
+    """Decompress and decode one chunk (runs on a worker thread)"""
+    with open(path, "rb") as f:
+        f.seek(chunk.offset)
+        raw = zlib.decompress(f.read(chunk.compressed))
+    events = []
+    position = 0
+    while position < len(raw):
+        event_time, kind, length = EVENT_HEADER.unpack_from(raw, position)
+        position += EVENT_HEADER.size
+        events.append(TranscriptEvent(event_time, kind, raw[position:position + length]))
+        position += length
+    return events
+
+
+class TranscriptRecorder:
+    """
+    Per-session terminal transcripts in compressed, append-only files
+
+    Recording an event only appends a small binary record to the session's
+    in-memory buffer. A background task flushes buffers in batches (every
+    flush_interval, or sooner once a buffer reaches chunk_bytes), compressing
+    each into a self-contained chunk on a worker thread. Chunk headers carry
+    the time range they cover, so replay finds its starting point by reading
+    headers alone and then decompresses one chunk at a time.
+
+    If the disk cannot keep up, events beyond max_pending_bytes per session
+    are dropped and counted rather than held in memory. So are chunks that
+    would take a session's file past max_bytes. Files not written to for
+    retention_days are deleted by the flusher, checked hourly.
+    """
+
+    def __init__(
+        self,
+        directory: str = config.TRANSCRIPT_DIR,
+        enabled: bool = config.TRANSCRIPTS_ENABLED,
+        chunk_bytes: int = config.TRANSCRIPT_CHUNK_BYTES,
+        flush_interval: float = config.TRANSCRIPT_FLUSH_INTERVAL,
+        max_pending_bytes: int = config.TRANSCRIPT_MAX_PENDING_BYTES,
+        compression_level: int = config.TRANSCRIPT_COMPRESSION_LEVEL,
+        max_bytes: int = config.TRANSCRIPT_MAX_BYTES,
+        retention_days: float = config.TRANSCRIPT_RETENTION_DAYS
+    ):
+        self.directory = directory
+        self.enabled = enabled
+        self.chunk_bytes = chunk_bytes
+        self.flush_interval = flush_interval
+        self.max_pending_bytes = max_pending_bytes
+        self.compression_level = compression_level
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+
+        self._recordings: Dict[str, _Recording] = {}
+        self._pending_bytes = 0
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        # Files whose end is known to be a chunk boundary, so appends can skip the check
+        self._appendable: Set[str] = set()
+        self._next_prune = 0.0
+
+        # Recorder statistics
+        self.events = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.chunks_written = 0
+        self.bytes_written = 0
+        self.files_pruned = 0
+
+    def path(self, session_id: str) -> str:
+        """Transcript file of a session"""
+        if _SAFE_NAME.fullmatch(session_id):
+            name = session_id
+        else:
+            name = hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.transcript")
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    def record(self, session_id: str, kind: int, data: Union[str, bytes]):
+        """Buffer one event; never blocks or touches the disk"""
+        if not self.enabled:
+            return
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        recording = self._recordings.get(session_id)
+        if recording is None:
+            recording = self._recordings[session_id] = _Recording()
+
+        size = EVENT_HEADER.size + len(payload)
+        if len(recording.buffer) + size > self.max_pending_bytes:
+            self.dropped += 1
+            TRANSCRIPT_DROPPED.inc()
+            return
+
+        now = time.time()
+        if not recording.events:
+            recording.first_time = now
+        recording.last_time = now
+        recording.buffer += EVENT_HEADER.pack(now, kind, len(payload))
+        recording.buffer += payload
+        recording.events += 1
+        self._pending_bytes += size
+        self.events += 1
+        TRANSCRIPT_EVENTS.inc()
+        if len(recording.buffer) >= self.chunk_bytes:
+            self._full.set()
+
+    def record_resize(self, session_id: str, cols: int, rows: int):
+        self.record(session_id, EVENT_RESIZE, f"{cols}x{rows}")
+
+    def start(self):
+        """Start the background flusher"""
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Transcript flush error: {e}")
+            if self.retention_days > 0 and time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + PRUNE_INTERVAL
+                try:
+                    await self.prune()
+                except Exception as e:
+                    logger.error(f"Transcript prune error: {e}")
+
+    async def prune(self) -> int:
+        """Delete transcripts older than the retention period; returns how many"""
+        async with self._flush_lock:
+            pruned = await asyncio.to_thread(_prune_files, self.directory, self.retention_days * 86400)
+        for path in pruned:
+            self._appendable.discard(path)
+        if pruned:
+            logger.info(f"Pruned {len(pruned)} expired transcripts")
+        self.files_pruned += len(pruned)
+        return len(pruned)
+
+    async def flush(self, session_id: Optional[str] = None):
+        """Write buffered events to disk, for one session or all of them"""
+        async with self._flush_lock:
+            if session_id is not None:
+                recording = self._recordings.pop(session_id, None)
+                ready = {session_id: recording} if recording is not None and recording.events else {}
+            else:
+                # Idle sessions leave no state behind once flushed
+                ready = {sid: recording for sid, recording in self._recordings.items() if recording.events}
+                self._recordings = {}
+            if not ready:
+                return
+
+            batch = []
+            for sid, recording in ready.items():
+                chunk = recording.take()
+                self._pending_bytes -= len(chunk[0])
+                batch.append((sid, chunk))
+
+            written, failed, capped = await asyncio.to_thread(self._write_batch, batch)
+            # Sessions whose file is full lose the events rather than retrying them
+            capped_events = sum(chunk[1] for _, chunk in capped)
+            if capped_events:
+                self.dropped += capped_events
+                TRANSCRIPT_DROPPED.inc(capped_events)
+
+            # Chunks that failed to write go back in front of newer events for the next flush
+            for sid, chunk in failed:
+                recording = self._recordings.get(sid)
+                if recording is None:
+                    recording = self._recordings[sid] = _Recording()
+                if len(recording.buffer) + len(chunk[0]) > self.max_pending_bytes:
+                    self.dropped += chunk[1]
+                    TRANSCRIPT_DROPPED.inc(chunk[1])
+                    continue
+                recording.restore(chunk)
+                self._pending_bytes += len(chunk[0])
+
+            self.flushes += 1
+            self.chunks_written += len(batch) - len(failed) - len(capped)
+            self.bytes_written += written
+            TRANSCRIPT_WRITTEN_BYTES.inc(written)
+
+    def _write_batch(
+        self,
+        batch: List[Tuple[str, Tuple[bytes, int, float, float]]]
+    ) -> Tuple[int, List[Tuple[str, Tuple[bytes, int, float, float]]], List[Tuple[str, Tuple[bytes, int, float, float]]]]:
+        """
+        Append each session's chunk
+
+        Returns:
+            The bytes written, the chunks that failed, and the chunks left out for taking their file past max_bytes
+        """
+        written = 0
+        failed = []
+        capped = []
+        for sid, chunk in batch:
+            path = self.path(sid)
+            try:
+                if path not in self._appendable:
+                    _truncate_torn_chunk(path)
+                    if len(self._appendable) >= MAX_APPENDABLE_PATHS:
+                        # Forgetting only costs a header scan on the next append
+                        self._appendable.clear()
+                    self._appendable.add(path)
+                appended = _append_chunk(path, chunk, self.compression_level, self.max_bytes)
+                if not appended:
+                    capped.append((sid, chunk))
+                written += appended
+            except (OSError, ValueError) as e:
+                # A failed write may have left part of a chunk behind
+                self._appendable.discard(path)
+                failed.append((sid, chunk))
+                logger.error(f"Failed to append transcript {path}: {e}")
+        return written, failed, capped
+
+    async def index(self, session_id: str) -> Optional[List[ChunkInfo]]:
+        """
+        Chunk index of a session's transcript, or None if it has none
+
+        Raises:
+            ValueError: If the file isn't a transcript
+        """
+        path = self.path(session_id)
+        try:
+            return await asyncio.to_thread(_read_index, path)
+        except FileNotFoundError:
+            return None
+
+    async def replay(
+        self,
+        session_id: str,
+        start: float = 0.0,
+        speed: float = 1.0,
+        index: Optional[List[ChunkInfo]] = None
+    ) -> AsyncIterator[TranscriptEvent]:
+        """
+        Stream a session's events back, paced like the original session
+
+        Only one chunk is held in memory at a time. Without an index,
+        buffered events are flushed first so a live session replays up to
+        the present.
+
+        Args:
+            session_id: Session to replay
+            start: Seconds after the first event to start from (earlier events are skipped)
+            speed: Playback speed multiplier; 0 replays as fast as possible
+            index: Chunk index from index(), if already read
+        """
+        if index is None:
+            await self.flush(session_id)
+            index = await self.index(session_id) or []
+        if not index:
+            return
+
+        path = self.path(session_id)
+        origin = index[0].first_time
+        seek_to = origin + max(0.0, start)
+        clock_start = time.monotonic()
+        for chunk in index:
+            if chunk.last_time < seek_to:
+                continue
+            try:
+                events = await asyncio.to_thread(_read_chunk, path, chunk)
+            except (zlib.error, struct.error) as e:
+                # Files torn before appends started truncating them can't be read past this point
+                logger.warning(f"Corrupt transcript chunk in {path} at offset {chunk.offset}: {e}")
+                return
+            for event in events:
+                if event.time < seek_to:
+                    continue
+                if speed > 0:
+                    delay = (event.time - seek_to) / speed - (time.monotonic() - clock_start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                yield event
+
+    async def shutdown(self):
+        """Stop the flusher and write out everything still buffered"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self.enabled:
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "recording_sessions": len(self._recordings),
+            "pending_bytes": self._pending_bytes,
+            "events": self.events,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "chunks_written": self.chunks_written,
+            "bytes_written": self.bytes_written,
+            "files_pruned": self.files_pruned
+        }
+
+
+# Process-wide transcript recorder
+transcripts = TranscriptRecorder()
@@ -0,0 +1,282 @@
+import asyncio
+import codecs
+import json
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app import config
+from app.services.metrics import metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+OUTPUT_FRAMES = metrics.counter("cli_quest_terminal_output_frames_total", "Terminal output frames sent to clients")
+OUTPUT_BYTES = metrics.counter("cli_quest_terminal_output_bytes_total", "Terminal output bytes sent to clients")
+OUTPUT_DROPPED_BYTES = metrics.counter(
+    "cli_quest_terminal_output_dropped_bytes_total",
+    "Terminal output bytes discarded for slow clients"
+)
+
+# Compact binary subprotocol: one type byte followed by the raw payload
+BINARY_SUBPROTOCOL = "cli-quest.binary.v1"
+FRAME_OUTPUT = 0x01  # server -> client, UTF-8 terminal output
+FRAME_INPUT = 0x02   # client -> server, UTF-8 keystrokes
+FRAME_MUX_OUTPUT = 0x03  # server -> viewer, session id length byte, session id, then output
+
+# Close codes telling terminal clients whether reconnecting can help
+CLOSE_SESSION_NOT_FOUND = 4404  # unknown session id: sandboxes are only created by /start
+CLOSE_SESSION_ENDED = 4410  # reaped or evicted: reconnecting would start a fresh sandbox
+CLOSE_SESSION_MOVED = 1012  # replaced, or taken over by another node: reconnect to reach it
+
+OVERFLOW_PAUSE = "pause"
+OVERFLOW_DROP = "drop"
+
+TRUNCATED_NOTICE = "\r\n[output truncated: client is not keeping up]\r\n"
+
+
+class TerminalTransport:
+    """
+    Batched, flow-controlled output channel for one terminal websocket
+
+    Output is coalesced into frames by a time window and a size window. When
+    more than the high-water mark is waiting to be sent, producers are either
+    paused until the client catches up or their output is dropped, depending
+    on the overflow policy. Clients that offer the binary subprotocol get raw
+    output frames; everyone else gets the JSON messages, whose "seq" is the
+    output sequence number past the bytes the frame's text covers.
+
+    Binary frames carry nothing but output bytes, so a client can count
+    them to know its position in the stream; notices such as the
+    truncation warning are sent as messages instead.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        flush_interval: float = config.TERMINAL_FLUSH_INTERVAL_MS / 1000,
+        frame_max_bytes: int = config.TERMINAL_FRAME_MAX_BYTES,
+        high_water: int = config.TERMINAL_SEND_BUFFER_HIGH_WATER,
+        overflow_policy: str = config.TERMINAL_OVERFLOW_POLICY
+    ):
+        self.websocket = websocket
+        self.flush_interval = flush_interval
+        self.frame_max_bytes = frame_max_bytes
+        self.high_water = high_water
+        self.low_water = high_water // 2
+        self.overflow_policy = overflow_policy
+        self.binary = BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+
+        self._chunks: Deque[bytes] = deque()
+        self._buffered = 0
+        self._data_ready = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._send_lock = asyncio.Lock()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._flusher: Optional[asyncio.Task] = None
+        self._dropping = False
+        # Sequence number just past the last output queued, when it was numbered
+        self._queued_seq: Optional[int] = None
+        self.closed = False
+
+        # Transport statistics
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+
+    async def accept(self):
+        """Accept the websocket, negotiating the binary subprotocol if offered"""
+        await self.websocket.accept(subprotocol=BINARY_SUBPROTOCOL if self.binary else None)
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def send_output(self, data: Union[str, bytes], seq: Optional[int] = None):
+        """
+        Queue terminal output for the client
+
+        Under the pause policy this waits while the send buffer is above the
+        high-water mark, which in turn stops the producer reading more output.
+
+        Args:
+            data: Output to send
+            seq: Output stream sequence number just past data, if it is numbered;
+                after dropping output the client is told where the stream resumes
+        """
+        if self.closed:
+            return
+
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        if not payload:
+            return
+
+        # An oversized chunk is still accepted into an empty buffer
+        while self._buffered and self._buffered + len(payload) > self.high_water:
+            if self.overflow_policy == OVERFLOW_DROP:
+                self.bytes_dropped += len(payload)
+                OUTPUT_DROPPED_BYTES.inc(len(payload))
+                self._dropping = True
+                return
+
+            self._writable.clear()
+            await self._writable.wait()
+            if self.closed:
+                return
+
+        if self._dropping:
+            # Sent once output resumes, so the notice marks where the gap is
+            await self.send_message({"type": "error", "data": TRUNCATED_NOTICE})
+            if seq is not None:
+                await self.send_message({"type": "sync", "seq": seq - len(payload)})
+        self._dropping = False
+        self._enqueue(payload)
+        self._queued_seq = seq
+
+    def _enqueue(self, payload: bytes):
+        self._chunks.append(payload)
+        self._buffered += len(payload)
+        self._data_ready.set()
+
+    async def send_message(self, message: Dict[str, Any]):
+        """Send a control message, after any output already queued"""
+        if self.closed:
+            return
+        async with self._send_lock:
+            await self._flush_pending()
+            await self._send_text(json.dumps(message))
+
+    async def receive(self) -> Dict[str, Any]:
+        """
+        Receive the next client message
+
+        Binary input frames are turned into "input" messages without going
+        through the JSON decoder.
+        """
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            payload = message.get("bytes")
+            if payload:
+                if payload[0] == FRAME_INPUT:
+                    return {"type": "input", "data": payload[1:].decode("utf-8", errors="replace")}
+                logger.warning(f"Ignoring unknown binary frame type {payload[0]}")
+                continue
+
+            text = message.get("text")
+            if text:
+                return json.loads(text)
+
+    async def _flush_loop(self):
+        """Coalesce queued output into frames"""
+        try:
+            while not self.closed:
+                await self._data_ready.wait()
+
+                # Give chatty producers a short window to add to this frame
+                if self._buffered < self.frame_max_bytes and self.flush_interval > 0:
+                    await asyncio.sleep(self.flush_interval)
+
+                async with self._send_lock:
+                    await self._flush_pending()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"Terminal transport stopped: {e}")
+            self._close_buffers()
+
+    async def _flush_pending(self):
+        """Send everything queued, split into frames of at most frame_max_bytes"""
+        while self._chunks:
+            frame = self._take(self.frame_max_bytes)
+            if self.binary:
+                await self.websocket.send_bytes(bytes([FRAME_OUTPUT]) + frame)
+                self.bytes_sent += len(frame) + 1
+            else:
+                text = self._decoder.decode(frame)
+                if text:
+                    message: Dict[str, Any] = {"type": "output", "data": text}
+                    if self._queued_seq is not None:
+                        # Bytes of a character split across frames count with the frame that completes it
+                        message["seq"] = self._queued_seq - self._buffered - len(self._decoder.getstate()[0])
+                    await self._send_text(json.dumps(message))
+            self.frames_sent += 1
+            OUTPUT_FRAMES.inc()
+            OUTPUT_BYTES.inc(len(frame))
+
+            if self._buffered <= self.low_water:
+                self._writable.set()
+
+        self._data_ready.clear()
+        self._writable.set()
+
+    def _take(self, limit: int) -> bytes:
+        """Pop up to limit bytes off the queue"""
+        parts = []
+        size = 0
+        while self._chunks and size < limit:
+            chunk = self._chunks[0]
+            room = limit - size
+            if len(chunk) <= room:
+                parts.append(self._chunks.popleft())
+                size += len(chunk)
+            else:
+                parts.append(chunk[:room])
+                self._chunks[0] = chunk[room:]
+                size += room
+        self._buffered -= size
+        return b"".join(parts)
+
+    async def _send_text(self, text: str):
+        await self.websocket.send_text(text)
+        self.bytes_sent += len(text)
+
+    def _close_buffers(self):
+        self.closed = True
+        self._chunks.clear()
+        self._buffered = 0
+        # Release any paused producers
+        self._writable.set()
+
+    async def close(self):
+        """Flush what can still be sent and stop the flusher"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+
+        if not self.closed:
+            try:
+                async with self._send_lock:
+                    await self._flush_pending()
+            except Exception:
+                pass
+        self._close_buffers()
+
+    async def disconnect(self, code: int, reason: str, timeout: float = 2.0):
+        """Tell the client why it is being disconnected, then close the websocket with code"""
+        try:
+            await asyncio.wait_for(self.send_message({"type": "error", "data": f"\r\n{reason}\r\n"}), timeout)
+        except Exception:
+            pass
+        # Nothing more is flushed; a slow client only delays this by the timeout
+        self._close_buffers()
+        await self.close()
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Get transport statistics"""
+        return {
+            "binary": self.binary,
+            "buffered_bytes": self._buffered,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "bytes_dropped": self.bytes_dropped
+        }
@@ -0,0 +1,862 @@
+import fnmatch
+import hashlib
+import json
+import posixpath
+import re
+import sys
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from app import config
+from app.core.execution import BACKEND_VIRTUAL, ExecutionBackend, FileCheck
+from app.core.images import WORKSPACE_DIR
+from app.utils.archive import FileContent, safe_relative_path
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HOME_DIR = WORKSPACE_DIR
+USERNAME = "user"
+# Listings show a fixed timestamp; nothing in the tree has a real mtime
+LISTING_MTIME = "Jan  1 12:00"
+
+# A directory maps names to children; a file is its text
+Node = Union[Dict[str, "Node"], str]
+
+# exit status, stdout, stderr
+CommandResult = Tuple[int, str, str]
+
+
+class ShellSyntaxError(Exception):
+    pass
+
+
+class Token(NamedTuple):
+    text: str
+    quoted: bool = False
+    operator: bool = False
+
+
+# Operators that separate the commands of a list: run always, only after success, only after failure
+LIST_OPERATORS = (";", "&&", "||")
+
+
+def tokenize(command: str) -> List[Token]:
+    """
+    Split a command line into words and the | > >> ; && || operators
+
+    Single and double quotes and backslash escapes behave as in bash, minus
+    variable expansion. Words remember whether any part was quoted so glob
+    patterns inside quotes are left alone.
+    """
+    tokens: List[Token] = []
+    word: List[str] = []
+    quoted = False
+    in_word = False
+    i = 0
+
+    def flush():
+        nonlocal word, quoted, in_word
+        if in_word:
+            tokens.append(Token("".join(word), quoted))
+        word, quoted, in_word = [], False, False
+
+    while i < len(command):
+        char = command[i]
+        if char in " \t\r\n":
+            flush()
+        elif char in "'\"":
+            end = command.find(char, i + 1)
+            if char == '"':
+                # A backslash-escaped quote doesn't end a double-quoted string
+                while end > 0 and _escaped(command, end):
+                    end = command.find(char, end + 1)
+            if end < 0:
+                raise ShellSyntaxError(f"unexpected EOF while looking for matching `{char}'")
+            segment = command[i + 1:end]
+            if char == '"':
+                segment = re.sub(r'\\([\\"$`])', r"\1", segment)
+            word.append(segment)
+            quoted = in_word = True
+            i = end
+        elif char == "\\" and i + 1 < len(command):
+            word.append(command[i + 1])
+            quoted = in_word = True
+            i += 1
+        elif char in "|&;":
+            flush()
+            operator = command[i:i + 2]
+            if operator in ("&&", "||"):
+                i += 1
+            elif char == "&":
+                raise ShellSyntaxError("background jobs (&) are not supported")
+            else:
+                operator = char
+            tokens.append(Token(operator, operator=True))
+        elif char == ">":
+            flush()
+            if command.startswith(">>", i):
+                tokens.append(Token(">>", operator=True))
+                i += 1
+            else:
+                tokens.append(Token(">", operator=True))
+        else:
+            word.append(char)
+            in_word = True
+        i += 1
+
+    flush()
+    return tokens
+
+
+def _escaped(command: str, index: int) -> bool:
+    """Whether the character at index follows an odd number of backslashes"""
+    backslashes = 0
+    while index - backslashes - 1 >= 0 and command[index - backslashes - 1] == "\\":
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+class FilesystemSnapshot:
+    """
+    A frozen directory tree that sessions layer their writes over
+
+    Nothing may modify the tree once the snapshot exists; filesystems built
+    on it copy a directory before changing it.
+    """
+
+    __slots__ = ("root",)
+
+    def __init__(self, root: Dict[str, Node]):
+        self.root = root
+
+
+class VirtualFilesystem:
+    """
+    Copy-on-write in-memory directory tree
+
+    A filesystem starts from a baseline snapshot (or empty) and shares all
+    of it. The first write under a directory copies just the directories on
+    the path from the root down to it, so a session's private layer is the
+    few dicts it touched plus what it wrote. File text is never copied.
+    Resetting drops the layer and points back at the baseline in O(1).
+    Writes are capped at max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = config.VIRTUAL_SHELL_MAX_BYTES, base: Optional[FilesystemSnapshot] = None):
+        self.max_bytes = max_bytes
+        self.written_bytes = 0
+        # Directories this filesystem may modify in place, by id (values keep them alive)
+        self._owned: Dict[int, Dict[str, Node]] = {}
+        if base is not None:
+            self.root: Dict[str, Node] = base.root
+        else:
+            self.root = self._own({})
+            self.mkdirs(HOME_DIR)
+
+    def _own(self, directory: Dict[str, Node]) -> Dict[str, Node]:
+        self._owned[id(directory)] = directory
+        return directory
+
+    def _writable(self, directory: Dict[str, Node]) -> Dict[str, Node]:
+        return directory if id(directory) in self._owned else self._own(dict(directory))
+
+    def lookup(self, path: str) -> Optional[Node]:
+        """Node at an absolute, normalized path"""
+        node: Node = self.root
+        for part in path.split("/"):
+            if not part:
+                continue
+            if not isinstance(node, dict):
+                return None
+            node = node.get(part)
+            if node is None:
+                return None
+        return node
+
+    def mkdirs(self, path: str) -> Dict[str, Node]:
+        """Writable directory at path, creating it and copying shared parents as needed"""
+        self.root = node = self._writable(self.root)
+        for part in path.split("/"):
+            if part:
+                child = node.get(part)
+                if child is None:
+                    child = self._own({})
+                elif not isinstance(child, dict):
+                    raise NotADirectoryError(path)
+                else:
+                    child = self._writable(child)
+                node[part] = child
+                node = child
+        return node
+
+    def seed(self, files: Dict[str, FileContent], base: str = HOME_DIR):
+        """Add challenge files under base"""
+        for filename, content in files.items():
+            relative = safe_relative_path(filename)
+            directory, name = posixpath.split(posixpath.join(base, relative))
+            text = content.decode("utf-8", errors="replace") if isinstance(content, bytes) else content
+            self.mkdirs(directory)[name] = text
+
+    def write(self, path: str, text: str, append: bool = False):
+        """
+        Create or overwrite (or append to) a file
+
+        Raises:
+            FileNotFoundError: If the parent directory doesn't exist
+            IsADirectoryError: If path is a directory
+            OSError: If the session's write budget is exhausted
+        """
+        directory, name = posixpath.split(path)
+        if not name:
+            # The root directory
+            raise IsADirectoryError(path)
+        parent = self.lookup(directory)
+        if not isinstance(parent, dict):
+            raise FileNotFoundError(path)
+        current = parent.get(name)
+        if isinstance(current, dict):
+            raise IsADirectoryError(path)
+
+        if self.written_bytes + len(text) > self.max_bytes:
+            raise OSError("No space left on device")
+        self.written_bytes += len(text)
+        self.mkdirs(directory)[name] = (current or "") + text if append else text
+
+    def snapshot(self) -> FilesystemSnapshot:
+        """Freeze the current tree; later writes copy what they change"""
+        self._owned = {}
+        return FilesystemSnapshot(self.root)
+
+    def reset(self, base: FilesystemSnapshot):
+        """Discard everything written since base and share it again"""
+        self.root = base.root
+        self._owned = {}
+        self.written_bytes = 0
+
+    def walk(self, path: str, node: Node) -> Iterator[Tuple[str, Node]]:
+        """Yield path and node for node and everything below it, depth first"""
+        yield path, node
+        if isinstance(node, dict):
+            for name in sorted(node):
+                yield from self.walk(posixpath.join(path, name), node[name])
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the session's private layer"""
+        return self.written_bytes + sum(sys.getsizeof(directory) for directory in self._owned.values())
+
+
+def check_files(fs: VirtualFilesystem, checks: List[FileCheck]) -> List[bool]:
+    """Evaluate file predicates against a filesystem, paths relative to the workspace"""
+    results = []
+    for check in checks:
+        node = fs.lookup(posixpath.normpath(posixpath.join(HOME_DIR, check.path)))
+        if check.text is None:
+            results.append(node is not None)
+        else:
+            results.append(isinstance(node, str) and check.text in node)
+    return results
+
+
+class SnapshotCache:
+    """
+    Baseline snapshot per challenge, built once and shared by every session
+
+    Keyed by challenge id and a hash of its setup files, so an edited
+    challenge gets a fresh baseline while running sessions keep theirs.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[Tuple[str, str], FilesystemSnapshot] = {}
+
+    def get(self, challenge_id: str, files: Dict[str, FileContent]) -> FilesystemSnapshot:
+        digest = hashlib.sha256(
+            json.dumps(
+                {name: content if isinstance(content, str) else content.hex() for name, content in files.items()},
+                sort_keys=True
+            ).encode("utf-8")
+        ).hexdigest()
+        key = (challenge_id, digest)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            # Drop baselines of earlier versions of this challenge
+            for stale in [k for k in self._snapshots if k[0] == challenge_id]:
+                del self._snapshots[stale]
+            fs = VirtualFilesystem()
+            fs.seed(files)
+            snapshot = fs.snapshot()
+            self._snapshots[key] = snapshot
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+
+# Process-wide challenge baselines
+filesystem_snapshots = SnapshotCache()
+
+
+def _file_size(node: Node) -> int:
+    return 4096 if isinstance(node, dict) else len(node.encode("utf-8"))
+
+
+def _lines(text: str) -> List[str]:
+    """Lines with their terminators kept"""
+    return text.splitlines(keepends=True)
+
+
+def _split_options(args: List[str], with_value: str = "") -> Tuple[Dict[str, str], List[str]]:
+    """
+    Parse short options (-la, -n 5, -n5) anywhere in the arguments, up to --
+
+    Args:
+        args: Command arguments
+        with_value: Option letters that take a value
+    """
+    options: Dict[str, str] = {}
+    operands: List[str] = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--":
+            operands.extend(args[i + 1:])
+            break
+        if len(arg) > 1 and arg.startswith("-"):
+            letters = arg[1:]
+            j = 0
+            while j < len(letters):
+                letter = letters[j]
+                if letter in with_value:
+                    value = letters[j + 1:]
+                    if not value and i + 1 < len(args):
+                        i += 1
+                        value = args[i]
+                    options[letter] = value
+                    break
+                if letter.isdigit() and "n" in with_value:
+                    # head -5 / tail -5
+                    options["n"] = letters[j:]
+                    break
+                options[letter] = ""
+                j += 1
+        else:
+            operands.append(arg)
+        i += 1
+    return options, operands
+
+
+class VirtualShell(ExecutionBackend):
+    """
+    Pure-Python shell over an in-memory filesystem
+
+    Enough of bash for the beginner challenges (ls, cat, pwd, cd, grep,
+    head, tail, wc, find, echo, pipes, > / >> redirection and ; && ||
+    lists) without a container. A session costs a few kilobytes and commands run in-process
+    in microseconds.
+
+    Given a challenge's baseline snapshot, the session's filesystem is a
+    copy-on-write layer over it; otherwise the challenge files are seeded
+    and snapshotted on initialize. Either way reset() is O(1).
+    """
+
+    kind = BACKEND_VIRTUAL
+
+    def __init__(
+        self,
+        session_id: str,
+        challenge_files: Optional[Dict[str, FileContent]] = None,
+        snapshot: Optional[FilesystemSnapshot] = None
+    ):
+        super().__init__(session_id)
+        self.fs = VirtualFilesystem(base=snapshot)
+        self.cwd = HOME_DIR
+        self._challenge_files = challenge_files or {}
+        self._baseline = snapshot
+        self._commands: Dict[str, Callable[[List[str], Optional[str]], CommandResult]] = {
+            "cat": self._cat,
+            "cd": self._cd,
+            "echo": self._echo,
+            "find": self._find,
+            "grep": self._grep,
+            "head": self._head,
+            "ls": self._ls,
+            "pwd": self._pwd,
+            "tail": self._tail,
+            "wc": self._wc,
+            "whoami": self._whoami
+        }
+        # ls prints one name per line when its output is piped
+        self._piped = False
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.fs.memory_bytes()
+
+    async def initialize(self):
+        if self._baseline is None:
+            self.fs.seed(self._challenge_files)
+            self._baseline = self.fs.snapshot()
+        logger.debug(f"Virtual shell initialized: {self.session_id}")
+
+    async def reset(self):
+        self.fs.reset(self._baseline)
+        self.cwd = HOME_DIR
+
+    async def setup_challenge(self, challenge_files: Dict[str, FileContent]):
+        self.fs.seed(challenge_files)
+        self._baseline = self.fs.snapshot()
+
+    async def execute_command(self, command: str) -> str:
+        status, output = self.run(command)
+        if status != 0:
+            output += f"\n[Exit code: {status}]"
+        return output
+
+    async def check_files(self, checks: List[FileCheck]) -> List[bool]:
+        return check_files(self.fs, checks)
+
+    async def cleanup(self, grace_period: int = 5):
+        self.fs = VirtualFilesystem()
+
+    def run(self, command: str) -> Tuple[int, str]:
+        """
+        Run a command line
+
+        The whole line is checked for syntax errors before anything runs.
+        Each command of a list is expanded only when its turn comes, so
+        globs after `cd dir;` match inside dir.
+
+        Returns:
+            Exit status of the last pipeline that ran and the combined output
+        """
+        try:
+            pipelines = self._parse(tokenize(command))
+        except ShellSyntaxError as e:
+            return 2, f"bash: syntax error: {e}"
+
+        outputs: List[str] = []
+        status = 0
+        for operator, stages in pipelines:
+            if operator == "&&" and status != 0 or operator == "||" and status == 0:
+                continue
+            status, output = self._run_pipeline(stages)
+            outputs.append(output)
+
+        output = "".join(outputs)
+        if len(output) > config.VIRTUAL_SHELL_MAX_OUTPUT:
+            output = output[:config.VIRTUAL_SHELL_MAX_OUTPUT] + "\n[output truncated]\n"
+        return status, output
+
+    def _run_pipeline(self, stages: List[List[Token]]) -> Tuple[int, str]:
+        """Run one pipeline; returns the last stage's status and stderr followed by stdout"""
+        errors: List[str] = []
+        stdin: Optional[str] = None
+        status = 0
+        for index, tokens in enumerate(stages):
+            args, redirect = self._expand_stage(tokens)
+            self._piped = index < len(stages) - 1 or redirect is not None
+            status, stdout, stderr = self._run_stage(args, stdin)
+            if stderr:
+                errors.append(stderr)
+            if redirect is not None:
+                stdout, redirect_error = self._redirect(stdout, *redirect)
+                if redirect_error:
+                    errors.append(redirect_error)
+                    status = 1
+            stdin = stdout
+        return status, "".join(errors) + (stdin or "")
+
+    def _parse(self, tokens: List[Token]) -> List[Tuple[str, List[List[Token]]]]:
+        """
+        Split tokens into a list of pipelines, each a list of stage tokens
+
+        Returns:
+            (operator before the pipeline, stages) pairs; the first operator is ";"
+        """
+        pipelines: List[Tuple[str, List[List[Token]]]] = []
+        operator = ";"
+        stages: List[List[Token]] = []
+        current: List[Token] = []
+        for token in tokens:
+            if not token.operator or token.text in (">", ">>"):
+                current.append(token)
+                continue
+            if not current:
+                raise ShellSyntaxError(f"near unexpected token `{token.text}'")
+            stages.append(self._check_stage(current))
+            current = []
+            if token.text in LIST_OPERATORS:
+                pipelines.append((operator, stages))
+                operator, stages = token.text, []
+
+        if current:
+            stages.append(self._check_stage(current))
+        elif stages or operator != ";":
+            # A trailing | && or || needs another command
+            raise ShellSyntaxError("unexpected end of file")
+        if stages:
+            pipelines.append((operator, stages))
+        return pipelines
+
+    @staticmethod
+    def _check_stage(tokens: List[Token]) -> List[Token]:
+        """Make sure every redirection in a stage has a target"""
+        for index, token in enumerate(tokens):
+            if token.operator and (index + 1 >= len(tokens) or tokens[index + 1].operator):
+                raise ShellSyntaxError("near unexpected token `newline'")
+        return tokens
+
+    def _expand_stage(self, tokens: List[Token]) -> Tuple[List[str], Optional[Tuple[str, bool]]]:
+        """Expanded args and (redirect target, append) of a checked stage"""
+        args: List[str] = []
+        redirect = None
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.operator:
+                redirect = (self._expand_tilde(tokens[i + 1]), token.text == ">>")
+                i += 2
+                continue
+            args.extend(self._expand(token))
+            i += 1
+        return args, redirect
+
+    def _expand_tilde(self, token: Token) -> str:
+        if not token.quoted and (token.text == "~" or token.text.startswith("~/")):
+            return HOME_DIR + token.text[1:]
+        return token.text
+
+    def _expand(self, token: Token) -> List[str]:
+        """Tilde and glob expansion; unmatched globs stay literal like in bash"""
+        text = self._expand_tilde(token)
+        if token.quoted or not any(char in text for char in "*?["):
+            return [text]
+
+        directory, pattern = posixpath.split(text)
+        node = self.fs.lookup(self.resolve(directory or "."))
+        if not isinstance(node, dict):
+            return [text]
+        matches = [
+            posixpath.join(directory, name) if directory else name
+            for name in sorted(node)
+            if fnmatch.fnmatchcase(name, pattern) and (pattern.startswith(".") or not name.startswith("."))
+        ]
+        return matches or [text]
+
+    def resolve(self, path: str) -> str:
+        """Absolute, normalized form of a path relative to the working directory"""
+        resolved = posixpath.normpath(posixpath.join(self.cwd, path))
+        # normpath keeps a leading double slash (POSIX allows it to mean something else)
+        return "/" + resolved.lstrip("/")
+
+    def _run_stage(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        if not args:
+            # A bare redirection just creates or truncates the file
+            return 0, "", ""
+        handler = self._commands.get(args[0])
+        if handler is None:
+            return 127, "", f"bash: {args[0]}: command not found\n"
+        return handler(args[1:], stdin)
+
+    def _redirect(self, stdout: str, target: str, append: bool) -> Tuple[str, str]:
+        try:
+            if target.endswith("/"):
+                # Names a directory even if there is none; normalizing would drop the slash
+                raise IsADirectoryError(target)
+            self.fs.write(self.resolve(target), stdout, append)
+        except IsADirectoryError:
+            return "", f"bash: {target}: Is a directory\n"
+        except FileNotFoundError:
+            return "", f"bash: {target}: No such file or directory\n"
+        except OSError as e:
+            return "", f"bash: {target}: {e}\n"
+        return "", ""
+
+    def _read_inputs(self, name: str, operands: List[str], stdin: Optional[str]) -> Iterator[Tuple[str, Optional[str], str]]:
+        """Yield (label, text or None, error) for each operand, or stdin when there are none"""
+        if not operands:
+            yield "-", stdin or "", ""
+            return
+        for operand in operands:
+            if operand == "-":
+                yield "-", stdin or "", ""
+                continue
+            node = self.fs.lookup(self.resolve(operand))
+            if node is None:
+                yield operand, None, f"{name}: {operand}: No such file or directory\n"
+            elif isinstance(node, dict):
+                yield operand, None, f"{name}: {operand}: Is a directory\n"
+            else:
+                yield operand, node, ""
+
+    # Commands
+
+    def _pwd(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        return 0, self.cwd + "\n", ""
+
+    def _whoami(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        return 0, USERNAME + "\n", ""
+
+    def _echo(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        newline = True
+        if args and args[0] == "-n":
+            newline = False
+            args = args[1:]
+        return 0, " ".join(args) + ("\n" if newline else ""), ""
+
+    def _cd(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        if len(args) > 1:
+            return 1, "", "bash: cd: too many arguments\n"
+        target = args[0] if args else HOME_DIR
+        path = self.resolve(target)
+        node = self.fs.lookup(path)
+        if node is None:
+            return 1, "", f"bash: cd: {target}: No such file or directory\n"
+        if not isinstance(node, dict):
+            return 1, "", f"bash: cd: {target}: Not a directory\n"
+        self.cwd = path
+        return 0, "", ""
+
+    def _cat(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        options, operands = _split_options(args)
+        status, out, err = 0, [], []
+        for _, text, error in self._read_inputs("cat", operands, stdin):
+            if error:
+                status = 1
+                err.append(error)
+            else:
+                out.append(text)
+        output = "".join(out)
+        if "n" in options:
+            output = "".join(f"{number:>6}\t{line}" for number, line in enumerate(_lines(output), start=1))
+        return status, output, "".join(err)
+
+    def _ls(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        options, operands = _split_options(args)
+        show_all = "a" in options
+        long = "l" in options
+        targets = operands or ["."]
+
+        status, err = 0, []
+        files: List[Tuple[str, Node]] = []
+        directories: List[Tuple[str, str, Dict[str, Node]]] = []
+        for target in targets:
+            path = self.resolve(target)
+            node = self.fs.lookup(path)
+            if node is None:
+                status = 2
+                err.append(f"ls: cannot access '{target}': No such file or directory\n")
+            elif isinstance(node, dict):
+                directories.append((target, path, node))
+            else:
+                files.append((target, node))
+
+        sections = []
+        if files:
+            sections.append(self._format_entries(files, long, total=False))
+        for target, path, node in directories:
+            entries: List[Tuple[str, Node]] = [
+                (name, node[name])
+                for name in sorted(node, key=lambda name: name.lstrip(".").lower())
+                if show_all or not name.startswith(".")
+            ]
+            if show_all:
+                parent = self.fs.lookup(posixpath.dirname(path)) or node
+                entries = [(".", node), ("..", parent)] + entries
+            listing = self._format_entries(entries, long, total=True)
+            if len(targets) > 1:
+                listing = f"{target}:\n{listing}"
+            sections.append(listing)
+
+        return status, "\n".join(sections), "".join(err)
+
+    def _format_entries(self, entries: List[Tuple[str, Node]], long: bool, total: bool) -> str:
+        if not entries:
+            return "total 0\n" if long and total else ""
+        if not long:
+            names = [name for name, _ in entries]
+            return "\n".join(names) + "\n" if self._piped else "  ".join(names) + "\n"
+
+        sizes = [_file_size(node) for _, node in entries]
+        width = max(len(str(size)) for size in sizes)
+        lines = []
+        if total:
+            lines.append(f"total {sum(-(-size // 4096) * 4 for size in sizes)}")
+        for (name, node), size in zip(entries, sizes):
+            if isinstance(node, dict):
+                mode, links = "drwxr-xr-x", 2 + sum(1 for child in node.values() if isinstance(child, dict))
+            else:
+                mode, links = "-rw-r--r--", 1
+            lines.append(f"{mode} {links} {USERNAME} {USERNAME} {size:>{width}} {LISTING_MTIME} {name}")
+        return "\n".join(lines) + "\n"
+
+    def _grep(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        options, operands = _split_options(args, with_value="e")
+        pattern = options.get("e")
+        if pattern is None:
+            if not operands:
+                return 2, "", "Usage: grep [OPTION]... PATTERNS [FILE]...\n"
+            pattern, operands = operands[0], operands[1:]
+
+        flags = re.IGNORECASE if "i" in options else 0
+        try:
+            regex = re.compile(pattern, flags)
+        except re.error:
+            regex = re.compile(re.escape(pattern), flags)
+
+        recursive = "r" in options or "R" in options
+        if recursive:
+            inputs = self._grep_tree(operands or ["."])
+        else:
+            inputs = self._read_inputs("grep", operands, stdin)
+        inputs = list(inputs)
+        show_names = recursive or len(inputs) > 1
+
+        invert = "v" in options
+        status, out, err = 1, [], []
+        for label, text, error in inputs:
+            if error:
+                err.append(error)
+                continue
+            count = 0
+            for number, line in enumerate(_lines(text), start=1):
+                if bool(regex.search(line)) == invert:
+                    continue
+                count += 1
+                if "c" in options or "l" in options:
+                    continue
+                prefix = f"{label}:" if show_names else ""
+                if "n" in options:
+                    prefix += f"{number}:"
+                out.append(prefix + (line if line.endswith("\n") else line + "\n"))
+            if count:
+                status = 0
+            if "l" in options and count:
+                out.append(f"{label}\n")
+            elif "c" in options:
+                out.append(f"{label}:{count}\n" if show_names else f"{count}\n")
+
+        if err and status == 1:
+            status = 2
+        return status, "".join(out), "".join(err)
+
+    def _grep_tree(self, operands: List[str]) -> Iterator[Tuple[str, Optional[str], str]]:
+        for operand in operands:
+            node = self.fs.lookup(self.resolve(operand))
+            if node is None:
+                yield operand, None, f"grep: {operand}: No such file or directory\n"
+                continue
+            for path, child in self.fs.walk(operand, node):
+                if not isinstance(child, dict):
+                    yield path, child, ""
+
+    def _head(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        # -n -K prints all but the last K lines
+        return self._head_tail("head", args, stdin, lambda lines, count, plus: lines[:count])
+
+    def _tail(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        # -n +K starts at line K; -n -K is the same as -n K
+        def select(lines: List[str], count: int, plus: bool) -> List[str]:
+            if plus:
+                return lines[max(0, count - 1):]
+            return lines[-abs(count):] if count else []
+        return self._head_tail("tail", args, stdin, select)
+
+    def _head_tail(
+        self,
+        name: str,
+        args: List[str],
+        stdin: Optional[str],
+        select: Callable[[List[str], int, bool], List[str]]
+    ) -> CommandResult:
+        options, operands = _split_options(args, with_value="n")
+        value = options.get("n", "10")
+        try:
+            count = int(value)
+        except ValueError:
+            return 1, "", f"{name}: invalid number of lines: '{value}'\n"
+
+        inputs = list(self._read_inputs(name, operands, stdin))
+        status, out, err = 0, [], []
+        for index, (label, text, error) in enumerate(inputs):
+            if error:
+                status = 1
+                err.append(error)
+                continue
+            if len(inputs) > 1:
+                out.append(f"{'' if index == 0 else chr(10)}==> {label} <==\n")
+            out.extend(select(_lines(text), count, value.startswith("+")))
+        return status, "".join(out), "".join(err)
+
+    def _wc(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        options, operands = _split_options(args)
+        selected = [letter for letter in "lwc" if letter in options] or ["l", "w", "c"]
+
+        status, rows, err = 0, [], []
+        totals = {"l": 0, "w": 0, "c": 0}
+        for label, text, error in self._read_inputs("wc", operands, stdin):
+            if error:
+                status = 1
+                err.append(error)
+                continue
+            counts = {"l": text.count("\n"), "w": len(text.split()), "c": len(text.encode("utf-8"))}
+            for letter in totals:
+                totals[letter] += counts[letter]
+            rows.append(([counts[letter] for letter in selected], "" if label == "-" else label))
+        if len(rows) > 1:
+            rows.append(([totals[letter] for letter in selected], "total"))
+
+        if not rows:
+            return status, "", "".join(err)
+        width = max(len(str(value)) for values, _ in rows for value in values)
+        if len(selected) == 1 and len(rows) == 1:
+            width = 0
+        lines = [
+            " ".join(f"{value:>{width}}" for value in values) + (f" {label}" if label else "")
+            for values, label in rows
+        ]
+        return status, "\n".join(lines) + "\n", "".join(err)
+
+    def _find(self, args: List[str], stdin: Optional[str]) -> CommandResult:
+        roots: List[str] = []
+        while args and not args[0].startswith("-"):
+            roots.append(args.pop(0))
+
+        name_pattern: Optional[str] = None
+        ignore_case = False
+        kind: Optional[str] = None
+        i = 0
+        while i < len(args):
+            option = args[i]
+            if option in ("-name", "-iname", "-type") and i + 1 < len(args):
+                value = args[i + 1]
+                if option == "-type":
+                    if value not in ("f", "d"):
+                        return 1, "", f"find: Unknown argument to -type: {value}\n"
+                    kind = value
+                else:
+                    name_pattern = value
+                    ignore_case = option == "-iname"
+                i += 2
+            else:
+                return 1, "", f"find: unknown predicate `{option}'\n"
+
+        status, out, err = 0, [], []
+        for root in roots or ["."]:
+            node = self.fs.lookup(self.resolve(root))
+            if node is None:
+                status = 1
+                err.append(f"find: '{root}': No such file or directory\n")
+                continue
+            for path, child in self.fs.walk(root, node):
+                if kind == "f" and isinstance(child, dict) or kind == "d" and not isinstance(child, dict):
+                    continue
+                if name_pattern is not None:
+                    name = posixpath.basename(path.rstrip("/")) or path
+                    if ignore_case:
+                        matched = fnmatch.fnmatchcase(name.lower(), name_pattern.lower())
+                    else:
+                        matched = fnmatch.fnmatchcase(name, name_pattern)
+                    if not matched:
+                        continue
+                out.append(path + "\n")
+        return status, "".join(out), "".join(err)
@@ -0,0 +1,19 @@
+from typing import Tuple
+
+from app.database.connection import Database
+
+
+class Repository:
+    """
+    Base for data access classes
+
+    Subclasses list their hot queries in STATEMENTS; those are registered with
+    the database so warm-up prepares them on every pooled connection, and
+    each connection keeps its prepared copy for later calls.
+    """
+
+    STATEMENTS: Tuple[str, ...] = ()
+
+    def __init__(self, db: Database):
+        self.db = db
+        db.register_statements(self.STATEMENTS)
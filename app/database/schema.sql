@@ -0,0 +1,50 @@
+-- Backend tables. The "user" and "session" tables belong to the frontend auth schema.
+
+CREATE TABLE IF NOT EXISTS flag_submissions (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    challenge_id TEXT NOT NULL,
+    correct BOOLEAN NOT NULL,
+    submitted_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS flag_submissions_user_challenge_idx
+    ON flag_submissions (user_id, challenge_id);
+
+-- points is what the solve awarded at the time. Challenge values decay as solves come in,
+-- so it is provisional: the scoring engine rescores every solve at startup from solved_at order.
+CREATE TABLE IF NOT EXISTS challenge_solves (
+    user_id TEXT NOT NULL,
+    challenge_id TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    solved_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (user_id, challenge_id)
+);
+
+CREATE INDEX IF NOT EXISTS challenge_solves_challenge_idx
+    ON challenge_solves (challenge_id, solved_at);
+
+-- Challenge definitions, synced from the challenge directory by app/database/seed_data.py.
+-- Setup files live in challenge_files, their contents deduplicated in challenge_blobs.
+CREATE TABLE IF NOT EXISTS challenges (
+    id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    definition JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS challenge_blobs (
+    hash TEXT PRIMARY KEY,
+    content BYTEA NOT NULL,
+    size INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS challenge_files (
+    challenge_id TEXT NOT NULL REFERENCES challenges (id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    blob_hash TEXT NOT NULL REFERENCES challenge_blobs (hash),
+    PRIMARY KEY (challenge_id, path)
+);
+
+CREATE INDEX IF NOT EXISTS challenge_files_blob_idx
+    ON challenge_files (blob_hash);
@@ -0,0 +1,276 @@
+"""
+Challenge definitions: load them from a directory and sync them into the database
+
+A challenge directory holds either <name>.json files (one challenge, or a
+list of them) or per-challenge directories with a challenge.json and an
+optional files/ tree, whose files are added to the challenge's setup_files
+(as text when they are valid UTF-8, otherwise as bytes).
+
+Run as a module to seed the database by hand:
+
+    python -m app.database.seed_data challenges/
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.database.connection import Database, database
+from app.database.repository import Repository
+from app.utils.archive import FileContent
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CHALLENGE_FILE = "challenge.json"
+FILES_DIR = "files"
+
+# Serializes seeders (e.g. several nodes deploying at once)
+SEED_LOCK = "SELECT pg_advisory_xact_lock(hashtext('cli-quest-challenge-seed'))"
+
+GET_CHALLENGE_HASHES = "SELECT id, content_hash FROM challenges"
+
+GET_EXISTING_BLOBS = "SELECT hash FROM challenge_blobs WHERE hash = ANY($1::text[])"
+
+CREATE_STAGING_TABLES = """
+CREATE TEMP TABLE challenge_staging (id TEXT, content_hash TEXT, definition JSONB) ON COMMIT DROP;
+CREATE TEMP TABLE challenge_file_staging (challenge_id TEXT, path TEXT, blob_hash TEXT) ON COMMIT DROP;
+CREATE TEMP TABLE challenge_blob_staging (hash TEXT, content BYTEA) ON COMMIT DROP;
+"""
+
+# Applied in one round trip once the staging tables are filled
+MERGE_STAGED_CHALLENGES = """
+INSERT INTO challenge_blobs (hash, content, size)
+SELECT hash, content, length(content) FROM challenge_blob_staging
+ON CONFLICT (hash) DO NOTHING;
+
+INSERT INTO challenges (id, content_hash, definition, updated_at)
+SELECT id, content_hash, definition, now() FROM challenge_staging
+ON CONFLICT (id) DO UPDATE
+SET content_hash = EXCLUDED.content_hash, definition = EXCLUDED.definition, updated_at = EXCLUDED.updated_at;
+
+DELETE FROM challenge_files f USING challenge_staging s WHERE f.challenge_id = s.id;
+
+INSERT INTO challenge_files (challenge_id, path, blob_hash)
+SELECT challenge_id, path, blob_hash FROM challenge_file_staging;
+"""
+
+DELETE_MISSING_CHALLENGES = "DELETE FROM challenges WHERE id <> ALL($1::text[])"
+
+DELETE_UNUSED_BLOBS = """
+DELETE FROM challenge_blobs b
+WHERE NOT EXISTS (SELECT 1 FROM challenge_files f WHERE f.blob_hash = b.hash)
+"""
+
+
+class PreparedChallenge(NamedTuple):
+    """A challenge split into its definition row, file rows and file contents"""
+
+    id: str
+    content_hash: str
+    # Definition without setup_files, as JSON
+    definition: str
+    # Setup file path -> content hash
+    files: Dict[str, str]
+    # Content hash -> content
+    blobs: Dict[str, bytes]
+
+
+class SeedResult(NamedTuple):
+    total: int
+    changed: int
+    removed: int
+    blobs_written: int
+    seconds: float
+
+
+def _read_json(path: Path) -> Any:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError as e:
+        raise ValueError(f"{path}: invalid JSON: {e}") from e
+
+
+def _read_setup_files(root: Path) -> Dict[str, FileContent]:
+    files: Dict[str, FileContent] = {}
+    for path in sorted(root.rglob("*")):
+        if not path.is_file():
+            continue
+        data = path.read_bytes()
+        try:
+            files[path.relative_to(root).as_posix()] = data.decode("utf-8")
+        except UnicodeDecodeError:
+            # Binary files are provisioned byte for byte
+            files[path.relative_to(root).as_posix()] = data
+    return files
+
+
+def load_challenge_directory(directory: str) -> List[Dict[str, Any]]:
+    """
+    Read every challenge definition in a directory
+
+    Raises:
+        ValueError: On malformed definitions, or ids defined twice
+        OSError: If the directory can't be read
+    """
+    root = Path(directory)
+    challenges: List[Dict[str, Any]] = []
+    sources: Dict[str, Path] = {}
+
+    for entry in sorted(root.iterdir()):
+        if entry.is_dir():
+            definition_path = entry / CHALLENGE_FILE
+            if not definition_path.is_file():
+                continue
+            definition = _read_json(definition_path)
+            if not isinstance(definition, dict):
+                raise ValueError(f"{definition_path}: expected a single challenge object")
+            files_dir = entry / FILES_DIR
+            if files_dir.is_dir():
+                definition["setup_files"] = {**definition.get("setup_files", {}), **_read_setup_files(files_dir)}
+            found = [(definition_path, definition)]
+        elif entry.suffix == ".json":
+            loaded = _read_json(entry)
+            found = [(entry, definition) for definition in (loaded if isinstance(loaded, list) else [loaded])]
+        else:
+            continue
+
+        for path, definition in found:
+            if not isinstance(definition, dict) or not isinstance(definition.get("id"), str):
+                raise ValueError(f"{path}: every challenge needs a string id")
+            if definition["id"] in sources:
+                raise ValueError(f"{path}: challenge {definition['id']} is already defined in {sources[definition['id']]}")
+            sources[definition["id"]] = path
+            challenges.append(definition)
+
+    return challenges
+
+
+def prepare_challenge(challenge: Dict[str, Any]) -> PreparedChallenge:
+    """
+    Hash a challenge and its setup files
+
+    Files are hashed individually and the challenge hash covers its
+    definition plus those file hashes, so unchanged files are never
+    re-sent and identical files across challenges are stored once.
+    """
+    definition = {key: value for key, value in challenge.items() if key != "setup_files"}
+    files: Dict[str, str] = {}
+    blobs: Dict[str, bytes] = {}
+    for path, content in challenge.get("setup_files", {}).items():
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        files[path] = digest
+        blobs[digest] = data
+
+    encoded = json.dumps(definition, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    content_hash = hashlib.sha256(
+        json.dumps([encoded, sorted(files.items())], separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+    return PreparedChallenge(challenge["id"], content_hash, encoded, files, blobs)
+
+
+class ChallengeSeeder(Repository):
+    """
+    Incremental, bulk sync of challenge definitions into the database
+
+    A sync compares content hashes and writes only the challenges that
+    changed: their rows, file lists and any file contents the database
+    doesn't already have are COPYed into staging tables and merged in a
+    single round trip. A no-op sync is one query for the stored hashes.
+    """
+
+    STATEMENTS = (GET_CHALLENGE_HASHES,)
+
+    def __init__(self, db: Database = database):
+        super().__init__(db)
+
+    async def sync(self, challenges: List[Dict[str, Any]], prune: bool = True) -> SeedResult:
+        """
+        Bring the database in line with a set of challenge definitions
+
+        Args:
+            challenges: Every challenge definition
+            prune: Delete stored challenges that aren't in the set
+        """
+        started = time.perf_counter()
+        prepared = await asyncio.to_thread(lambda: [prepare_challenge(challenge) for challenge in challenges])
+
+        async with self.db.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(SEED_LOCK)
+                statement = await connection.prepared(GET_CHALLENGE_HASHES)
+                stored = {record["id"]: record["content_hash"] for record in await statement.fetch()}
+
+                changed = [challenge for challenge in prepared if stored.get(challenge.id) != challenge.content_hash]
+                ids = {challenge.id for challenge in prepared}
+                removed = [challenge_id for challenge_id in stored if challenge_id not in ids] if prune else []
+
+                blobs_written = 0
+                if changed:
+                    blobs_written = await self._merge(connection, changed)
+                if removed:
+                    await connection.execute(DELETE_MISSING_CHALLENGES, list(ids))
+                if changed or removed:
+                    await connection.execute(DELETE_UNUSED_BLOBS)
+
+        result = SeedResult(len(prepared), len(changed), len(removed), blobs_written, time.perf_counter() - started)
+        logger.info(
+            f"Challenge sync: {result.changed} of {result.total} changed, {result.removed} removed, "
+            f"{result.blobs_written} files written in {result.seconds * 1000:.1f}ms"
+        )
+        return result
+
+    async def _merge(self, connection: Any, changed: List[PreparedChallenge]) -> int:
+        """Stage changed challenges with COPY and merge them; returns how many file contents were sent"""
+        blobs: Dict[str, bytes] = {}
+        for challenge in changed:
+            blobs.update(challenge.blobs)
+        existing = {record["hash"] for record in await connection.fetch(GET_EXISTING_BLOBS, list(blobs))}
+        missing: List[Tuple[str, bytes]] = [(digest, data) for digest, data in blobs.items() if digest not in existing]
+
+        await connection.execute(CREATE_STAGING_TABLES)
+        await connection.copy_records_to_table(
+            "challenge_staging",
+            records=[(challenge.id, challenge.content_hash, challenge.definition) for challenge in changed],
+            columns=("id", "content_hash", "definition")
+        )
+        await connection.copy_records_to_table(
+            "challenge_file_staging",
+            records=[(challenge.id, path, digest) for challenge in changed for path, digest in challenge.files.items()],
+            columns=("challenge_id", "path", "blob_hash")
+        )
+        if missing:
+            await connection.copy_records_to_table(
+                "challenge_blob_staging",
+                records=missing,
+                columns=("hash", "content")
+            )
+        await connection.execute(MERGE_STAGED_CHALLENGES)
+        return len(missing)
+
+
+# Process-wide challenge seeder
+challenge_seeder = ChallengeSeeder()
+
+
+async def _main(directory: str, prune: bool) -> SeedResult:
+    challenges = await asyncio.to_thread(load_challenge_directory, directory)
+    db = Database(min_size=1, max_size=1)
+    await db.connect()
+    try:
+        await db.apply_schema()
+        return await ChallengeSeeder(db).sync(challenges, prune=prune)
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync a directory of challenge definitions into the database")
+    parser.add_argument("directory", help="Directory of challenge definitions")
+    parser.add_argument("--keep-missing", action="store_true", help="Keep stored challenges missing from the directory")
+    arguments = parser.parse_args()
+    asyncio.run(_main(arguments.directory, prune=not arguments.keep_missing))
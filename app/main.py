@@ -1,19 +1,105 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.requests import HTTPConnection
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import asyncio
+import codecs
+import hmac
 import json
 import logging
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional
 import uuid
 
+from app import config
 from app.api import auth, challenges, users, websocket, leaderboard
+from app.api.websocket import (
+    active_connections,
+    record_local_echo,
+    resume_terminal_output,
+    send_terminal_output,
+    serve_viewer,
+    stream_terminal_output,
+    track_objectives,
+    wait_for_admission
+)
+from app.core.admission import admission
+from app.core.challenge_engine import challenge_catalog
+from app.core.execution import BACKEND_DOCKER, challenge_backend
+from app.core.fanout import Subscriber, session_fanout
+from app.core.images import build_challenge_images
+from app.core.reaper import orphan_reaper
 from app.core.sandbox import DockerSandbox
-from app.database.connection import get_database
-from app.utils.logger import setup_logger
+from app.core.sandbox_pool import sandbox_pools
+from app.core.session_manager import session_manager
+from app.core.transport import CLOSE_SESSION_NOT_FOUND, TerminalTransport
+from app.core.virtual_shell import VirtualShell, filesystem_snapshots
+from app.core.scoring import scoring_engine
+from app.core.submissions import submission_pipeline
+from app.core.transcripts import EVENT_INPUT, EVENT_NAMES, transcripts
+from app.database.connection import close_database, database, get_database
+from app.database.seed_data import challenge_seeder, load_challenge_directory
+from app.models.leaderboard import leaderboard as player_leaderboard
+from app.models.submission import submissions
+from app.services.docker_client import docker_service
+from app.services.metrics import loop_lag_monitor, metrics
+from app.utils.exceptions import NodeConfigurationError
+from app.utils.logger import log_pipeline, setup_logger
 
 # Setup logging
 logger = setup_logger(__name__)
+# Per-command and resize records; rate limited via LOG_RATE_LIMITS
+command_logger = setup_logger(f"{__name__}.commands")
+
+# Terminal websocket metrics; label children are created once up front
+WEBSOCKET_CONNECTIONS = metrics.gauge("cli_quest_websocket_connections", "Open terminal websockets")
+WEBSOCKET_MESSAGES = metrics.counter("cli_quest_websocket_messages_total", "Terminal websocket messages received", ["type"])
+WEBSOCKET_MESSAGE_SECONDS = metrics.histogram("cli_quest_websocket_message_seconds", "Time to handle one terminal websocket message")
+MESSAGE_COUNTERS = {
+    message_type: WEBSOCKET_MESSAGES.labels(message_type)
+    for message_type in ("input", "interrupt", "command", "resize")
+}
+OTHER_MESSAGES = WEBSOCKET_MESSAGES.labels("other")
+
+# Point-in-time values read when metrics are scraped
+metrics.gauge("cli_quest_sessions_live", "Live sandbox sessions").set_function(lambda: len(session_manager))
+metrics.gauge("cli_quest_sessions_connected", "Sandbox sessions with a websocket attached").set_function(
+    lambda: session_manager.stats()["connected"]
+)
+metrics.gauge("cli_quest_sandbox_pool_ready", "Warm sandboxes waiting to be claimed").set_function(
+    lambda: sum(pool["ready"] for pool in sandbox_pools.stats()["pools"])
+)
+metrics.gauge("cli_quest_db_pool_size", "Open database connections").set_function(lambda: database.stats()["size"])
+metrics.gauge("cli_quest_db_pool_in_use", "Database connections checked out").set_function(lambda: database.in_use)
+metrics.gauge("cli_quest_db_pool_waiting", "Callers waiting for a database connection").set_function(lambda: database.waiting)
+metrics.gauge("cli_quest_submissions_queued", "Flag attempts waiting to be written").set_function(
+    lambda: submission_pipeline.stats()["queued"]
+)
+metrics.gauge("cli_quest_admission_queued", "Session requests waiting for host capacity").set_function(lambda: len(admission))
+metrics.gauge("cli_quest_admission_committed_memory_bytes", "Memory committed to sandbox containers").set_function(
+    lambda: admission.committed_memory
+)
+metrics.gauge("cli_quest_admission_committed_cpu", "CPU cores committed to sandbox containers").set_function(
+    lambda: admission.committed_cpu
+)
+metrics.gauge("cli_quest_session_viewers", "Read-only viewers watching sessions").set_function(lambda: len(session_fanout))
+metrics.gauge("cli_quest_transcript_pending_bytes", "Transcript bytes waiting to be flushed").set_function(
+    lambda: transcripts.pending_bytes
+)
+metrics.gauge("cli_quest_log_records_queued", "Log records waiting for the writer thread").set_function(
+    lambda: log_pipeline.stats()["queued"]
+)
+metrics.gauge("cli_quest_log_records_dropped", "Log records dropped because the queue was under pressure").set_function(
+    lambda: log_pipeline.stats()["dropped"]
+)
+
+# Demo workspace for terminals opened without Docker (development mode)
+DEV_WORKSPACE_FILES = {
+    "file1.txt": "This is file 1\n",
+    "file2.txt": "This is file 2\n",
+    "secret.txt": "The flag is: CLI_QUEST_CAT_READER\nCongratulations on reading this file!\n",
+    "README.txt": "Welcome to CLI Quest!\n"
+}
 
 # Create FastAPI application
 app = FastAPI(
@@ -33,30 +119,117 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active WebSocket connections
-active_connections: Dict[str, WebSocket] = {}
-sandbox_sessions: Dict[str, DockerSandbox] = {}
-
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
     logger.info("Starting CLI Quest API server...")
 
-    # Skip database connection for now - will be implemented later
-    logger.info("Skipping database connection (development mode)")
+    # Blocking calls on the event loop show up as probe lag
+    loop_lag_monitor.start()
+
+    # Challenges from the content directory replace the built-in samples
+    loaded_challenges = None
+    if config.CHALLENGE_DIR:
+        try:
+            loaded_challenges = await asyncio.to_thread(load_challenge_directory, config.CHALLENGE_DIR)
+            challenge_catalog.load(loaded_challenges)
+            scoring_engine.configure(loaded_challenges)
+            logger.info(f"Loaded {len(loaded_challenges)} challenges from {config.CHALLENGE_DIR}")
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load challenges from {config.CHALLENGE_DIR}: {e}")
+
+    if config.DATABASE_ENABLED:
+        # Each step fails on its own, so e.g. a failed warm-up can't stop flag attempts being saved
+        db = None
+        try:
+            db = await get_database()
+            await db.apply_schema()
+        except Exception as e:
+            logger.error(f"Database startup failed: {e}")
+
+        if db is not None and db.connected:
+            if loaded_challenges is not None:
+                try:
+                    # Write only the challenges whose content hash changed
+                    await challenge_seeder.sync(loaded_challenges)
+                except Exception as e:
+                    logger.error(f"Challenge sync failed; the database keeps its previous challenges: {e}")
+
+            try:
+                # Catch up pooled connections on any statements registered late
+                await db.warm()
+            except Exception as e:
+                logger.error(f"Database warm-up failed: {e}")
+
+            try:
+                # Rebuild the in-memory leaderboard with one aggregate query
+                await player_leaderboard.load_from_database(db)
+                # Rescore every player under the current dynamic challenge values
+                player_leaderboard.apply_scores(await scoring_engine.load_from_database(db))
+            except Exception as e:
+                logger.error(f"Leaderboard load failed: {e}")
+
+            try:
+                # Flag attempts are written behind in batches
+                submission_pipeline.start(submissions)
+            except Exception as e:
+                logger.error(f"Submission pipeline failed to start; flag attempts will not be saved: {e}")
+        else:
+            logger.error("Database unavailable; flag attempts will not be saved")
+    else:
+        logger.info("Skipping database connection (development mode)")
+
+    if config.SANDBOX_ENABLED:
+        await docker_service.connect()
+
+        # Containers left behind by a crashed or abandoned previous run
+        try:
+            await orphan_reaper.reap()
+        except Exception as e:
+            logger.error(f"Startup orphan reap failed: {e}")
+        orphan_reaper.start()
+
+        # Virtual shell challenges need neither an image nor warm containers
+        container_challenges = [c for c in challenge_catalog.all() if challenge_backend(c) == BACKEND_DOCKER]
+
+        # Rebuild only the challenge images whose content hash changed
+        await build_challenge_images(container_challenges)
+
+        # Pre-provision containers for every challenge image
+        sandbox_pools.warm(challenges.get_challenge_image(c) for c in container_challenges)
+        logger.info("Sandbox pool warm-up started")
+
+    transcripts.start()
+
+    # Announce this node before taking sessions: a NODE_URL another live node
+    # already uses would misroute redirects, so that stops startup
+    try:
+        await session_manager.directory.heartbeat(session_manager.lease_ttl)
+    except NodeConfigurationError:
+        raise
+    except Exception as e:
+        logger.error(f"Node heartbeat error: {e}")
+
+    # Virtual shell sessions exist even without Docker, so the reaper always runs
+    session_manager.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on application shutdown"""
     logger.info("Shutting down CLI Quest API server...")
 
-    # Clean up active sandbox sessions
-    for session_id, sandbox in sandbox_sessions.items():
-        try:
-            await sandbox.cleanup()
-            logger.info(f"Cleaned up sandbox session: {session_id}")
-        except Exception as e:
-            logger.error(f"Error cleaning up sandbox {session_id}: {e}")
+    # Write out queued flag attempts before the pool goes away
+    await submission_pipeline.shutdown()
+    await admission.shutdown()
+    await orphan_reaper.stop()
+    await transcripts.shutdown()
+    await close_database()
+
+    # Tear down sessions and warm containers in parallel, within the shutdown budget
+    deadline = time.monotonic() + config.SHUTDOWN_TIMEOUT
+    await asyncio.gather(session_manager.shutdown(deadline), sandbox_pools.shutdown(deadline))
+    docker_service.shutdown()
+    await loop_lag_monitor.stop()
 
 # Health check endpoint
 @app.get("/api/health")
@@ -68,76 +241,243 @@ async def health_check():
         "version": "0.1.0"
     })
 
+@app.get("/api/metrics")
+async def prometheus_metrics():
+    """All metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/database/pool")
+async def database_pool_stats():
+    """Database pool size, saturation and wait times"""
+    return JSONResponse(database.stats())
+
+@app.get("/api/sandbox/pool")
+async def sandbox_pool_stats():
+    """Warm sandbox pool statistics"""
+    return JSONResponse(sandbox_pools.stats())
+
+@app.get("/api/sandbox/admission")
+async def sandbox_admission_stats():
+    """Committed host capacity and the admission queue"""
+    return JSONResponse(admission.stats())
+
+@app.get("/api/sandbox/reaper")
+async def sandbox_reaper_stats():
+    """Orphaned containers and volumes reclaimed so far"""
+    return JSONResponse(orphan_reaper.stats())
+
+@app.get("/api/sessions/{session_id}/owner")
+async def session_owner(session_id: str):
+    """Node that owns a session, for routing reconnects"""
+    owner = await session_manager.directory.lookup(session_id)
+    if owner is None:
+        return JSONResponse({"detail": "Session not found"}, status_code=404)
+    return JSONResponse(owner.to_dict())
+
+def _token_valid(connection: HTTPConnection) -> bool:
+    token = connection.query_params.get("token", "")
+    return hmac.compare_digest(token.encode("utf-8"), config.WATCH_TOKEN.encode("utf-8"))
+
+def _watch_allowed(connection: HTTPConnection) -> bool:
+    return not config.WATCH_TOKEN or _token_valid(connection)
+
+@app.get("/api/sessions/{session_id}/transcript")
+async def session_transcript(request: Request, session_id: str, start: float = 0.0, speed: float = 0.0):
+    """
+    Replay a session's terminal transcript as newline-delimited JSON
+
+    Each line is {"t": seconds since the first event, "type", "data"}. With
+    speed > 0 lines are paced like the original session (2 = twice as fast);
+    start skips to that many seconds in. Transcripts include every
+    keystroke, so this needs the WATCH_TOKEN as ?token= and is disabled
+    while no token is configured.
+    """
+    if not config.WATCH_TOKEN:
+        return JSONResponse({"detail": "Transcript replay is disabled (no WATCH_TOKEN set)"}, status_code=403)
+    if not _token_valid(request):
+        return JSONResponse({"detail": "Forbidden"}, status_code=403)
+
+    await transcripts.flush(session_id)
+    try:
+        index = await transcripts.index(session_id)
+    except ValueError as e:
+        logger.error(f"Unreadable transcript for session {session_id}: {e}")
+        return JSONResponse({"detail": "Transcript is unreadable"}, status_code=422)
+    if not index:
+        return JSONResponse({"detail": "Transcript not found"}, status_code=404)
+
+    async def events():
+        origin = index[0].first_time
+        decoders = {kind: codecs.getincrementaldecoder("utf-8")(errors="replace") for kind in EVENT_NAMES}
+        async for event in transcripts.replay(session_id, start=start, speed=speed, index=index):
+            line = {
+                "t": round(event.time - origin, 3),
+                "type": EVENT_NAMES.get(event.kind, "unknown"),
+                "data": decoders[event.kind].decode(event.data) if event.kind in decoders else ""
+            }
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/api/sessions/viewers")
+async def session_viewer_stats():
+    """Spectator and instructor fan-out statistics"""
+    return JSONResponse(session_fanout.stats())
+
+@app.get("/api/sandbox/sessions")
+async def sandbox_session_stats():
+    """Live sandbox counts and memory commitment"""
+    stats = session_manager.stats()
+    pooled = sum(pool["ready"] + pool["provisioning"] for pool in sandbox_pools.stats()["pools"])
+    stats["pooled_sandboxes"] = pooled
+    stats["pooled_memory_bytes"] = pooled * session_manager.sandbox_memory
+    return JSONResponse(stats)
+
 # Include API routers
 app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
 app.include_router(challenges.router, prefix="/api/challenges", tags=["challenges"])
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(leaderboard.router, prefix="/api/leaderboard", tags=["leaderboard"])
 
+def _resume_seq(websocket: WebSocket) -> Optional[int]:
+    """Output sequence number a reconnecting client has seen up to, if it sent one"""
+    try:
+        return max(0, int(websocket.query_params["resume"]))
+    except (KeyError, ValueError):
+        return None
+
 # WebSocket endpoint for terminal interaction
 @app.websocket("/api/terminal/{session_id}")
 async def websocket_terminal(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for real-time terminal interaction"""
-    await websocket.accept()
-    active_connections[session_id] = websocket
+    """
+    WebSocket endpoint for real-time terminal interaction
+
+    Clients reconnecting to a live session pass ?resume=<seq>, the output
+    sequence number they have seen up to, and are sent only what they missed.
+    """
+    transport = TerminalTransport(websocket)
+    await transport.accept()
+    active_connections[session_id] = transport
+    WEBSOCKET_CONNECTIONS.inc()
+    output_task = None
+    sandbox = None
 
     try:
-        # Initialize sandbox for this session (disabled for development)
-        # if session_id not in sandbox_sessions:
-        #     sandbox = DockerSandbox(session_id)
-        #     await sandbox.initialize()
-        #     sandbox_sessions[session_id] = sandbox
-        #     logger.info(f"Created new sandbox session: {session_id}")
+        sandbox = session_manager.get(session_id)
+        if sandbox is None and admission.pending(session_id) is not None:
+            if not await wait_for_admission(transport, session_id):
+                await websocket.close(code=1013)
+                return
+            sandbox = session_manager.get(session_id)
+        if sandbox is None:
+            # Reconnects that land on another worker or node are sent to the owner
+            owner = await session_manager.directory.lookup(session_id)
+            if owner is not None and not session_manager.directory.is_local(owner):
+                logger.info(f"Redirecting session {session_id} to node {owner.node_id}")
+                await transport.send_message({
+                    "type": "redirect",
+                    "url": f"{owner.node_url}/api/terminal/{session_id}"
+                })
+                await websocket.close(code=4307)
+                return
+
+            if config.SANDBOX_ENABLED:
+                # Containers are only created by /start, which goes through admission control
+                await transport.send_message({"type": "error", "data": "Session not found\r\n"})
+                await websocket.close(code=CLOSE_SESSION_NOT_FOUND)
+                return
+
+            # Sandboxes are disabled by default for development; use a virtual shell
+            sandbox = VirtualShell(session_id, snapshot=filesystem_snapshots.get("dev-workspace", DEV_WORKSPACE_FILES))
+            await sandbox.initialize()
+            await session_manager.register(session_id, sandbox)
+            logger.info(f"Created new {sandbox.kind} session: {session_id}")
+        session_manager.attach(session_id, transport)
+        session = session_manager.get_session(session_id)
+        scrollback = session.scrollback
+        progress = track_objectives(session)
+        fresh = scrollback.end == 0
 
-        # sandbox = sandbox_sessions[session_id]
+        # Streaming mode: one long-lived shell, keystrokes in and output chunks out
+        terminal = None
+        if sandbox.supports_streaming and config.TERMINAL_STREAMING:
+            terminal = await sandbox.open_terminal()
+            await transport.send_message({"type": "mode", "mode": "stream"})
+        await resume_terminal_output(transport, scrollback, _resume_seq(websocket))
+        if progress is not None:
+            await transport.send_message(progress.event())
 
-        # Send welcome message
-        await websocket.send_text(json.dumps({
-            "type": "output",
-            "data": "Welcome to CLI Quest Terminal!\n$ "
-        }))
+        if terminal is not None:
+            if fresh:
+                await send_terminal_output(transport, session_id, scrollback, "Welcome to CLI Quest Terminal!\r\n")
+            output_task = asyncio.create_task(
+                stream_terminal_output(transport, terminal, session_id, scrollback, progress)
+            )
+            if fresh:
+                # Ask the shell for a fresh prompt after the banner
+                await terminal.write("\n")
+        elif fresh:
+            # Send welcome message
+            await send_terminal_output(transport, session_id, scrollback, "Welcome to CLI Quest Terminal!\n$ ")
 
         # Handle incoming messages
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await transport.receive()
+            started = time.perf_counter()
+            MESSAGE_COUNTERS.get(message["type"], OTHER_MESSAGES).inc()
+            session_manager.touch(session_id)
+
+            if message["type"] in ("input", "command"):
+                data = message["data"] if message["type"] == "input" else message["data"] + "\n"
+                transcripts.record(session_id, EVENT_INPUT, data)
+                if progress is not None:
+                    await progress.report(progress.feed_input(data))
+
+            if message["type"] == "input" and terminal is not None:
+                if not await sandbox.send_input(message["data"]):
+                    await transport.send_message({
+                        "type": "error",
+                        "data": "\r\nError: Command not allowed for security reasons\r\n"
+                    })
+
+            elif message["type"] == "interrupt" and terminal is not None:
+                await sandbox.send_input("\x03")
 
-            if message["type"] == "command":
+            elif message["type"] == "command" and terminal is not None:
+                command_logger.info(f"Executing command in session {session_id}: {message['data']}")
+                if not await sandbox.send_input(message["data"] + "\n"):
+                    await transport.send_message({
+                        "type": "error",
+                        "data": "Error: Command not allowed for security reasons\r\n"
+                    })
+
+            elif message["type"] == "command":
                 command = message["data"]
-                logger.info(f"Executing command in session {session_id}: {command}")
+                command_logger.info(f"Executing command in session {session_id}: {command}")
+
+                # The client echoed the command itself; keep it for replay and viewers
+                await record_local_echo(transport, session_id, scrollback, command)
 
-                # Mock command execution for development
                 try:
-                    # Simple mock responses for testing
-                    if command.strip() == "ls":
-                        output = "file1.txt  file2.txt  secret.txt  README.txt"
-                    elif command.strip() == "ls -la":
-                        output = "total 4\ndrwxr-xr-x 2 user user 4096 Dec 20 12:00 .\ndrwxr-xr-x 3 user user 4096 Dec 20 12:00 ..\n-rw-r--r-- 1 user user   20 Dec 20 12:00 file1.txt\n-rw-r--r-- 1 user user   20 Dec 20 12:00 file2.txt\n-rw-r--r-- 1 user user   50 Dec 20 12:00 secret.txt\n-rw-r--r-- 1 user user   30 Dec 20 12:00 README.txt"
-                    elif "cat secret.txt" in command:
-                        output = "The flag is: CLI_QUEST_CAT_READER\nCongratulations on reading this file!"
-                    elif command.strip() == "pwd":
-                        output = "/workspace"
-                    elif command.strip() == "whoami":
-                        output = "user"
-                    else:
-                        output = f"bash: {command}: command not found"
-
-                    await websocket.send_text(json.dumps({
-                        "type": "output",
-                        "data": output + "\n$ "
-                    }))
+                    output = (await sandbox.execute_command(command)).rstrip("\n")
+                    await send_terminal_output(
+                        transport, session_id, scrollback, output + "\n$ " if output else "$ ", progress
+                    )
                 except Exception as e:
                     logger.error(f"Command execution error: {e}")
-                    await websocket.send_text(json.dumps({
+                    await transport.send_message({
                         "type": "error",
                         "data": f"Error: {str(e)}\n$ "
-                    }))
+                    })
 
             elif message["type"] == "resize":
-                # Handle terminal resize (mock for development)
                 cols = message.get("cols", 80)
                 rows = message.get("rows", 24)
-                logger.info(f"Terminal resized to {cols}x{rows}")
+                await sandbox.resize_terminal(cols, rows)
+                transcripts.record_resize(session_id, cols, rows)
+                command_logger.info(f"Terminal resized to {cols}x{rows}")
+
+            WEBSOCKET_MESSAGE_SECONDS.observe(time.perf_counter() - started)
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for session: {session_id}")
@@ -145,11 +485,48 @@ async def websocket_terminal(websocket: WebSocket, session_id: str):
         logger.error(f"WebSocket error for session {session_id}: {e}")
     finally:
         # Cleanup
-        if session_id in active_connections:
+        WEBSOCKET_CONNECTIONS.dec()
+        if output_task is not None:
+            output_task.cancel()
+        await transport.close()
+
+        if active_connections.get(session_id) is transport:
             del active_connections[session_id]
 
-        # Keep sandbox alive for a short time in case of reconnection
-        # In production, implement proper session management
+        # The sandbox stays alive for the reconnect grace window, unless learners are queued for capacity
+        if sandbox is not None:
+            session_manager.detach(session_id, transport)
+            if len(admission) and sandbox.kind == BACKEND_DOCKER:
+                await session_manager.evict_detached(BACKEND_DOCKER)
+
+# Read-only view of one session, in the learner's wire format
+@app.websocket("/api/terminal/{session_id}/watch")
+async def websocket_watch_session(websocket: WebSocket, session_id: str):
+    """WebSocket endpoint for spectators of a single session"""
+    if not _watch_allowed(websocket):
+        await websocket.close(code=4403)
+        return
+
+    subscriber = Subscriber(websocket)
+    await subscriber.accept()
+    if not session_fanout.subscribe(subscriber, session_id):
+        await websocket.send_json({"type": "error", "data": "Session not found\r\n"})
+        await subscriber.close()
+        await websocket.close(code=CLOSE_SESSION_NOT_FOUND)
+        return
+    await serve_viewer(subscriber)
+
+# Instructor dashboard: many sessions multiplexed over one socket
+@app.websocket("/api/sessions/watch")
+async def websocket_watch_sessions(websocket: WebSocket):
+    """WebSocket endpoint for instructors watching many sessions at once"""
+    if not _watch_allowed(websocket):
+        await websocket.close(code=4403)
+        return
+
+    subscriber = Subscriber(websocket, multiplexed=True)
+    await subscriber.accept()
+    await serve_viewer(subscriber)
 
 if __name__ == "__main__":
     import uvicorn
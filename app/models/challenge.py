@@ -0,0 +1,45 @@
+import base64
+from typing import Any, Dict, List, Union
+
+from app.utils.archive import FileContent
+
+# Fields shown in the challenge list
+SUMMARY_FIELDS = ("id", "title", "description", "difficulty", "category")
+
+# Fields never sent to clients
+PRIVATE_FIELDS = ("flag",)
+
+
+def challenge_summary(challenge: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a challenge onto the fields used by the challenge list"""
+    return {field: challenge[field] for field in SUMMARY_FIELDS}
+
+
+def objective_id(index: int, objective: Dict[str, Any]) -> str:
+    """Id of a challenge objective, numbered from 1 among the valid ones when the definition has none"""
+    return str(objective.get("id", f"objective-{index + 1}"))
+
+
+def public_files(files: Dict[str, FileContent]) -> Dict[str, Union[str, Dict[str, str]]]:
+    """Setup files for a JSON response: binary contents become {"base64": ...}"""
+    return {
+        path: content if isinstance(content, str) else {"base64": base64.b64encode(content).decode("ascii")}
+        for path, content in files.items()
+    }
+
+
+def challenge_detail(challenge: Dict[str, Any], objectives: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Public view of a challenge (no flag, and objectives without their answers)
+
+    Args:
+        challenge: Challenge definition
+        objectives: Its compiled objectives (ObjectiveSet.public()), which leave out
+            definitions that failed to compile, so ids match progress events
+    """
+    detail = {key: value for key, value in challenge.items() if key not in PRIVATE_FIELDS}
+    if "objectives" in detail:
+        detail["objectives"] = objectives
+    if "setup_files" in detail:
+        detail["setup_files"] = public_files(detail["setup_files"])
+    return detail
@@ -0,0 +1,351 @@
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app import config
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Sort key: higher score first, then whoever reached that score first
+RankKey = Tuple[float, float, str]
+
+
+class RankIndex:
+    """
+    Sorted multiset with O(log n) rank and positional lookups
+
+    Keys live in fixed-size sorted blocks; a Fenwick tree over block lengths
+    turns "how many keys come before this one" and "which key is at position
+    k" into logarithmic searches. Inserts and removals only shift one block.
+    """
+
+    BLOCK_SIZE = 256
+
+    def __init__(self, keys: Optional[Iterable[RankKey]] = None):
+        self._blocks: List[List[RankKey]] = []
+        self._maxes: List[RankKey] = []
+        self._tree: List[int] = [0]
+        self._len = 0
+        if keys is not None:
+            self.load(keys)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def load(self, keys: Iterable[RankKey]):
+        """Replace the contents with the given keys in one pass"""
+        ordered = sorted(keys)
+        size = self.BLOCK_SIZE
+        self._blocks = [ordered[i:i + size] for i in range(0, len(ordered), size)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(ordered)
+        self._rebuild_tree()
+
+    def _rebuild_tree(self):
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, start=1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, block_index: int, delta: int):
+        i = block_index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, block_index: int) -> int:
+        """Number of keys in blocks before block_index"""
+        total = 0
+        i = block_index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """Block index and offset of the key at a position"""
+        block_index = 0
+        step = 1 << (len(self._tree).bit_length() - 1)
+        while step:
+            nxt = block_index + step
+            if nxt < len(self._tree) and self._tree[nxt] <= position:
+                block_index = nxt
+                position -= self._tree[nxt]
+            step >>= 1
+        return block_index, position
+
+    def add(self, key: RankKey):
+        """Insert a key"""
+        if not self._blocks:
+            self._blocks = [[key]]
+            self._maxes = [key]
+            self._len = 1
+            self._rebuild_tree()
+            return
+
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            i -= 1
+        block = self._blocks[i]
+        insort(block, key)
+        self._maxes[i] = block[-1]
+        self._len += 1
+
+        if len(block) > 2 * self.BLOCK_SIZE:
+            half = len(block) // 2
+            self._blocks[i:i + 1] = [block[:half], block[half:]]
+            self._maxes[i:i + 1] = [block[half - 1], block[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def discard(self, key: RankKey) -> bool:
+        """Remove a key if present"""
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return False
+        block = self._blocks[i]
+        j = bisect_left(block, key)
+        if j == len(block) or block[j] != key:
+            return False
+
+        del block[j]
+        self._len -= 1
+        if block:
+            self._maxes[i] = block[-1]
+            self._tree_add(i, -1)
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+            self._rebuild_tree()
+        return True
+
+    def index(self, key: RankKey) -> int:
+        """Zero-based position of a key"""
+        i = bisect_left(self._maxes, key)
+        if i < len(self._blocks):
+            block = self._blocks[i]
+            j = bisect_left(block, key)
+            if j < len(block) and block[j] == key:
+                return self._prefix(i) + j
+        raise KeyError(key)
+
+    def __getitem__(self, position: int) -> RankKey:
+        if not 0 <= position < self._len:
+            raise IndexError(position)
+        block_index, offset = self._locate(position)
+        return self._blocks[block_index][offset]
+
+    def islice(self, start: int, stop: int) -> Iterator[RankKey]:
+        """Iterate keys in positions [start, stop)"""
+        start = max(0, start)
+        stop = min(stop, self._len)
+        if start >= stop:
+            return
+
+        block_index, offset = self._locate(start)
+        remaining = stop - start
+        while remaining > 0:
+            block = self._blocks[block_index]
+            chunk = block[offset:offset + remaining]
+            yield from chunk
+            remaining -= len(chunk)
+            block_index += 1
+            offset = 0
+
+
+class LeaderboardEntry:
+    """A player's standing"""
+
+    __slots__ = ("user_id", "username", "score", "challenges_completed", "last_solve_at", "solved")
+
+    def __init__(self, user_id: str, username: str):
+        self.user_id = user_id
+        self.username = username
+        self.score = 0
+        self.challenges_completed = 0
+        self.last_solve_at = 0.0
+        self.solved: Set[str] = set()
+
+    @property
+    def key(self) -> RankKey:
+        return (-self.score, self.last_solve_at, self.user_id)
+
+
+class Leaderboard:
+    """
+    Incrementally maintained leaderboard
+
+    Every solve moves one player in the rank index, so rank lookups and page
+    queries are O(log n) regardless of how many players there are. The top of
+    the board is served from a snapshot rebuilt only after it changes.
+    """
+
+    def __init__(self, top_k: int = config.LEADERBOARD_TOP_K):
+        self.top_k = top_k
+        self._entries: Dict[str, LeaderboardEntry] = {}
+        self._index = RankIndex()
+        self._top_snapshot: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def record_solve(
+        self,
+        user_id: str,
+        username: str,
+        challenge_id: str,
+        points: int,
+        solved_at: Optional[float] = None
+    ) -> bool:
+        """
+        Credit a player for solving a challenge
+
+        Returns:
+            False if the player had already solved the challenge
+        """
+        was_top = False
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = LeaderboardEntry(user_id, username)
+            self._entries[user_id] = entry
+        elif challenge_id in entry.solved:
+            return False
+        else:
+            was_top = self._index.index(entry.key) < self.top_k
+            self._index.discard(entry.key)
+
+        entry.username = username or entry.username
+        entry.score += points
+        entry.challenges_completed += 1
+        entry.last_solve_at = solved_at if solved_at is not None else time.time()
+        entry.solved.add(challenge_id)
+        self._index.add(entry.key)
+
+        if was_top or self._index.index(entry.key) < self.top_k:
+            self._top_snapshot = None
+        return True
+
+    def adjust_score(self, user_id: str, score: int):
+        """Set a player's total directly (e.g. after rescoring)"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry.score == score:
+            return
+
+        was_top = self._index.index(entry.key) < self.top_k
+        self._index.discard(entry.key)
+        entry.score = score
+        self._index.add(entry.key)
+        if was_top or self._index.index(entry.key) < self.top_k:
+            self._top_snapshot = None
+
+    def apply_scores(self, scores: Dict[str, int]):
+        """Set many players' totals at once (e.g. after a challenge's value changed)"""
+        for user_id, score in scores.items():
+            self.adjust_score(user_id, score)
+
+    def has_solved(self, user_id: str, challenge_id: str) -> bool:
+        entry = self._entries.get(user_id)
+        return entry is not None and challenge_id in entry.solved
+
+    def _row(self, position: int, key: RankKey) -> Dict[str, Any]:
+        entry = self._entries[key[2]]
+        return {
+            "rank": position + 1,
+            "user_id": entry.user_id,
+            "username": entry.username,
+            "score": entry.score,
+            "challenges_completed": entry.challenges_completed
+        }
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Players ranked offset+1 .. offset+limit"""
+        if offset + limit <= self.top_k:
+            return self.top()[offset:offset + limit]
+        return [
+            self._row(position, key)
+            for position, key in enumerate(self._index.islice(offset, offset + limit), start=max(0, offset))
+        ]
+
+    def top(self) -> List[Dict[str, Any]]:
+        """Cached snapshot of the top K players"""
+        if self._top_snapshot is None:
+            self._top_snapshot = [
+                self._row(position, key)
+                for position, key in enumerate(self._index.islice(0, self.top_k))
+            ]
+        return self._top_snapshot
+
+    def rank(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """A player's rank and stats, or None if they have no solves"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        row = self._row(self._index.index(entry.key), entry.key)
+        row["total_players"] = len(self._index)
+        return row
+
+    def rebuild(self, rows: Iterable[Dict[str, Any]]):
+        """
+        Replace the board from aggregated rows in one pass
+
+        Args:
+            rows: Dicts with user_id, username, score, challenges_completed,
+                last_solve_at (epoch seconds) and solved (challenge ids)
+        """
+        entries: Dict[str, LeaderboardEntry] = {}
+        for row in rows:
+            entry = LeaderboardEntry(row["user_id"], row["username"])
+            entry.score = row["score"]
+            entry.challenges_completed = row["challenges_completed"]
+            entry.last_solve_at = row["last_solve_at"]
+            entry.solved = set(row.get("solved") or ())
+            entries[entry.user_id] = entry
+
+        self._entries = entries
+        self._index.load(entry.key for entry in entries.values())
+        self._top_snapshot = None
+        logger.info(f"Leaderboard rebuilt with {len(entries)} players")
+
+    async def load_from_database(self, db: Any):
+        """
+        Rebuild the board from the solves table with one aggregate query
+
+        Scores are the provisional points stored with each solve; apply the
+        scoring engine's rebuilt totals afterwards to correct them.
+        """
+        records = await db.fetch(LEADERBOARD_QUERY)
+        self.rebuild(
+            {
+                "user_id": record["user_id"],
+                "username": record["username"],
+                "score": record["score"],
+                "challenges_completed": record["challenges_completed"],
+                "last_solve_at": record["last_solve_at"].timestamp(),
+                "solved": record["solved"]
+            }
+            for record in records
+        )
+
+
+# score sums the points recorded at solve time, which go stale as challenge values
+# decay; callers overwrite it with the scoring engine's totals (see apply_scores)
+LEADERBOARD_QUERY = """
+SELECT s.user_id,
+       COALESCE(u.username, s.user_id) AS username,
+       SUM(s.points)::bigint AS score,
+       COUNT(*)::int AS challenges_completed,
+       MAX(s.solved_at) AS last_solve_at,
+       ARRAY_AGG(s.challenge_id) AS solved
+FROM challenge_solves s
+LEFT JOIN "user" u ON u.id = s.user_id
+GROUP BY s.user_id, u.username
+"""
+
+
+# Process-wide leaderboard
+leaderboard = Leaderboard()
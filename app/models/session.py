@@ -0,0 +1,35 @@
+from typing import Any, Dict, Optional
+
+from app.database.connection import Database, database
+from app.database.repository import Repository
+
+# Sessions are issued by the frontend; the backend only validates them
+VALIDATE_SESSION = """
+SELECT s.id, s.user_id, s.expires_at, u.username
+FROM session s
+JOIN "user" u ON u.id = s.user_id
+WHERE s.id = $1 AND s.expires_at > now()
+"""
+
+
+class SessionRepository(Repository):
+    """Read access to the frontend's login sessions"""
+
+    STATEMENTS = (VALIDATE_SESSION,)
+
+    def __init__(self, db: Database = database):
+        super().__init__(db)
+
+    async def validate(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an unexpired login session
+
+        Returns:
+            Session id, user_id, username and expires_at, or None if unknown or expired
+        """
+        record = await self.db.fetchrow(VALIDATE_SESSION, session_id)
+        return dict(record) if record is not None else None
+
+
+# Process-wide session repository
+sessions = SessionRepository()
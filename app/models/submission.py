@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import List, Tuple
+
+from app.database.connection import Database, database
+from app.database.repository import Repository
+
+SUBMISSION_COLUMNS = ("user_id", "challenge_id", "correct", "submitted_at")
+
+INSERT_SOLVES = """
+INSERT INTO challenge_solves (user_id, challenge_id, points, solved_at)
+VALUES ($1, $2, $3, $4)
+ON CONFLICT (user_id, challenge_id) DO NOTHING
+"""
+
+# (user_id, challenge_id, correct, submitted_at)
+AttemptRecord = Tuple[str, str, bool, datetime]
+# (user_id, challenge_id, points, solved_at)
+SolveRecord = Tuple[str, str, int, datetime]
+
+
+class SubmissionRepository(Repository):
+    """Write access to flag attempts and solves"""
+
+    STATEMENTS = (INSERT_SOLVES,)
+
+    def __init__(self, db: Database = database):
+        super().__init__(db)
+
+    async def record_batch(self, attempts: List[AttemptRecord], solves: List[SolveRecord]):
+        """Write attempts with COPY and solves with one prepared executemany, in one transaction"""
+        async with self.db.acquire() as connection:
+            async with connection.transaction():
+                await connection.copy_records_to_table(
+                    "flag_submissions",
+                    records=attempts,
+                    columns=SUBMISSION_COLUMNS
+                )
+                if solves:
+                    statement = await connection.prepared(INSERT_SOLVES)
+                    await statement.executemany(solves)
+
+
+# Process-wide submission repository
+submissions = SubmissionRepository()
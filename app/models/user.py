@@ -0,0 +1,38 @@
+from typing import Any, Dict, Iterable, Optional
+
+from app.database.connection import Database, database
+from app.database.repository import Repository
+
+# The "user" table belongs to the frontend auth schema
+GET_USER = 'SELECT id, username FROM "user" WHERE id = $1'
+
+GET_USER_BY_USERNAME = 'SELECT id, username FROM "user" WHERE username = $1'
+
+GET_USERNAMES = 'SELECT id, username FROM "user" WHERE id = ANY($1::text[])'
+
+
+class UserRepository(Repository):
+    """Read access to player accounts"""
+
+    STATEMENTS = (GET_USER, GET_USER_BY_USERNAME, GET_USERNAMES)
+
+    def __init__(self, db: Database = database):
+        super().__init__(db)
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Public fields of a user, or None"""
+        record = await self.db.fetchrow(GET_USER, user_id)
+        return dict(record) if record is not None else None
+
+    async def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        record = await self.db.fetchrow(GET_USER_BY_USERNAME, username)
+        return dict(record) if record is not None else None
+
+    async def usernames(self, user_ids: Iterable[str]) -> Dict[str, str]:
+        """Usernames for many users in one round trip"""
+        records = await self.db.fetch(GET_USERNAMES, list(user_ids))
+        return {record["id"]: record["username"] for record in records}
+
+
+# Process-wide user repository
+users = UserRepository()
@@ -0,0 +1,197 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import docker
+
+from app import config
+from app.utils.exceptions import DockerOperationTimeout
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Operation kinds with their own concurrency limit and timeout (seconds)
+OPERATION_LIMITS: Dict[str, int] = {
+    "create": config.DOCKER_CREATE_CONCURRENCY,
+    "exec": config.DOCKER_EXEC_CONCURRENCY,
+    "stop": config.DOCKER_STOP_CONCURRENCY,
+    "build": config.DOCKER_BUILD_CONCURRENCY
+}
+
+OPERATION_TIMEOUTS: Dict[str, Optional[float]] = {
+    "create": config.DOCKER_CREATE_TIMEOUT,
+    "exec": config.DOCKER_EXEC_TIMEOUT,
+    "stop": config.DOCKER_STOP_TIMEOUT,
+    "build": config.DOCKER_BUILD_TIMEOUT,
+    "copy": config.DOCKER_COPY_TIMEOUT
+}
+
+
+class DockerService:
+    """
+    Process-wide async facade over the synchronous docker SDK
+
+    All sandboxes share one client (and so one HTTP connection pool). Blocking
+    SDK calls run on a bounded thread pool, each operation kind has its own
+    concurrency limit, and every call has a deadline so a stuck daemon request
+    never ties up the event loop.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = config.DOCKER_MAX_WORKERS,
+        limits: Optional[Dict[str, int]] = None,
+        timeouts: Optional[Dict[str, Optional[float]]] = None
+    ):
+        self.max_workers = max_workers
+        self.limits = limits or OPERATION_LIMITS
+        self.timeouts = timeouts or OPERATION_TIMEOUTS
+        self._client: Optional[docker.DockerClient] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> docker.DockerClient:
+        """Shared docker client, created on first use"""
+        if self._client is None:
+            if config.DOCKER_BACKEND == "fake":
+                # Imported lazily: the fake builds on the sandbox modules, which import this one
+                from app.services.fake_docker import FakeDockerClient
+                self._client = FakeDockerClient()
+            else:
+                self._client = docker.from_env(max_pool_size=config.DOCKER_CONNECTION_POOL_SIZE)
+        return self._client
+
+    async def connect(self):
+        """Create the shared client on a worker thread (API version negotiation blocks)"""
+        await self.run("inspect", lambda: self.client)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="docker"
+            )
+        return self._executor
+
+    def _get_semaphore(self, kind: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(kind)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits.get(kind, self.max_workers))
+            self._semaphores[kind] = semaphore
+        return semaphore
+
+    async def run(
+        self,
+        kind: str,
+        func: Callable[..., Any],
+        *args: Any,
+        deadline: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Run a blocking docker SDK call off the event loop
+
+        Args:
+            kind: Operation kind used for concurrency limiting and default timeout
+            func: Blocking callable
+            deadline: Override for the operation's default timeout in seconds
+
+        Returns:
+            Whatever func returns
+
+        Raises:
+            DockerOperationTimeout: If the call did not finish in time
+        """
+        if deadline is None:
+            # An explicit None in the timeout table means no deadline
+            deadline = self.timeouts.get(kind, config.DOCKER_DEFAULT_TIMEOUT)
+        loop = asyncio.get_running_loop()
+
+        async with self._get_semaphore(kind):
+            future = loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+            try:
+                return await asyncio.wait_for(future, timeout=deadline)
+            except asyncio.TimeoutError:
+                # The worker thread keeps running until the SDK call returns
+                logger.warning(f"Docker {kind} operation timed out after {deadline}s")
+                raise DockerOperationTimeout(kind, deadline)
+
+    async def run_container(self, image: str, **kwargs: Any) -> Any:
+        """Start a detached container"""
+        return await self.run("create", self.client.containers.run, image, **kwargs)
+
+    async def get_container(self, container_id: str) -> Any:
+        """Look up a container by id or name"""
+        return await self.run("inspect", self.client.containers.get, container_id)
+
+    async def exec_run(self, container: Any, cmd: Any, deadline: Optional[float] = None, **kwargs: Any) -> Any:
+        """Run a command in a container and wait for its output"""
+        return await self.run("exec", container.exec_run, cmd, deadline=deadline, **kwargs)
+
+    async def exec_create(self, container: Any, cmd: Any, **kwargs: Any) -> str:
+        """Create an exec instance and return its id"""
+        result = await self.run("exec", self.client.api.exec_create, container.id, cmd, **kwargs)
+        return result["Id"]
+
+    async def exec_attach(self, exec_id: str, tty: bool = True) -> Any:
+        """Start an exec instance and return the hijacked socket attached to it"""
+        return await self.run("exec", self.client.api.exec_start, exec_id, socket=True, tty=tty)
+
+    async def exec_resize(self, exec_id: str, height: int, width: int):
+        """Resize the PTY of an exec instance"""
+        await self.run("resize", self.client.api.exec_resize, exec_id, height=height, width=width)
+
+    async def put_archive(self, container: Any, path: str, data: Any) -> bool:
+        """Extract a tar stream into a directory of a container in one request"""
+        return await self.run("copy", container.put_archive, path, data)
+
+    async def resize(self, container: Any, height: int, width: int):
+        """Resize a container's TTY"""
+        await self.run("resize", container.resize, height=height, width=width)
+
+    async def stop(self, container: Any, grace_period: int = 5):
+        """Stop a container, allowing the grace period plus the operation timeout"""
+        await self.run(
+            "stop",
+            container.stop,
+            deadline=self.timeouts["stop"] + grace_period,
+            timeout=grace_period
+        )
+
+    async def kill(self, container: Any):
+        """Kill a container"""
+        await self.run("stop", container.kill)
+
+    async def list_containers(self, filters: Dict[str, Any]) -> List[Any]:
+        """Containers (running or not) matching docker filters"""
+        return await self.run("inspect", self.client.containers.list, all=True, filters=filters)
+
+    async def remove_container(self, container: Any):
+        """Force-remove a container and its anonymous volumes"""
+        await self.run("stop", container.remove, force=True, v=True)
+
+    async def list_volumes(self, filters: Dict[str, Any]) -> List[Any]:
+        """Volumes matching docker filters"""
+        return await self.run("inspect", self.client.volumes.list, filters=filters)
+
+    async def remove_volume(self, name: str):
+        """Remove a named volume; fails while a container still uses it"""
+        def remove():
+            self.client.volumes.get(name).remove()
+        await self.run("stop", remove)
+
+    def shutdown(self):
+        """Release the thread pool and the client's connections"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        self._semaphores.clear()
+
+
+# Process-wide docker service
+docker_service = DockerService()
@@ -0,0 +1,377 @@
+import io
+import itertools
+import socket
+import tarfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+from docker.errors import APIError, ImageNotFound, NotFound
+
+from app import config
+from app.core.execution import FileCheck
+from app.core.images import FILE_CHECK_SCRIPT, RESTORE_WORKSPACE_COMMAND
+from app.core.virtual_shell import FilesystemSnapshot, VirtualFilesystem, VirtualShell, check_files
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROMPT = b"$ "
+
+
+class ExecResult(NamedTuple):
+    exit_code: int
+    output: bytes
+
+
+def _simulate(latency: float):
+    """Stand in for a blocking daemon round trip (runs on a docker worker thread)"""
+    if latency > 0:
+        time.sleep(latency)
+
+
+def _unwrap_command(cmd: Union[str, List[str]]) -> str:
+    """Recover the shell command from the /bin/bash -c '...' wrapper"""
+    if isinstance(cmd, list):
+        if len(cmd) == 3 and cmd[1] == "-c":
+            return cmd[2]
+        cmd = " ".join(cmd)
+    prefix = "/bin/bash -c '"
+    if cmd.startswith(prefix) and cmd.endswith("'"):
+        return cmd[len(prefix):-1]
+    return cmd
+
+
+class FakeContainer:
+    """A container whose shell is a VirtualShell layered over its image's files"""
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        client: "FakeDockerClient",
+        image: str,
+        name: Optional[str],
+        baseline: FilesystemSnapshot,
+        labels: Optional[Dict[str, str]] = None,
+        volumes: Optional[List[str]] = None,
+        auto_remove: bool = False
+    ):
+        self.client = client
+        self.image = image
+        self.id = f"{next(self._ids):012x}"
+        self.name = name or f"fake-{self.id}"
+        self.labels = dict(labels or {})
+        self.volumes = list(volumes or [])
+        self.auto_remove = auto_remove
+        self.status = "running"
+        self.baseline = baseline
+        self.shell = VirtualShell(self.name, snapshot=baseline)
+
+    def exec_run(self, cmd: Union[str, List[str]], **kwargs: Any) -> ExecResult:
+        _simulate(self.client.exec_latency)
+        if isinstance(cmd, list) and len(cmd) > 3 and cmd[2] == FILE_CHECK_SCRIPT:
+            args = cmd[4:]
+            checks = [
+                FileCheck(args[i + 1], None if args[i] == "exists" else args[i + 2])
+                for i in range(0, len(args) - 2, 3)
+            ]
+            answers = check_files(self.shell.fs, checks)
+            return ExecResult(0, "".join("1\n" if answer else "0\n" for answer in answers).encode())
+        command = _unwrap_command(cmd)
+        if command == RESTORE_WORKSPACE_COMMAND:
+            self.shell.fs.reset(self.baseline)
+            return ExecResult(0, b"")
+        status, output = self.shell.run(command)
+        return ExecResult(status, output.encode("utf-8"))
+
+    def put_archive(self, path: str, data: Any) -> bool:
+        _simulate(self.client.exec_latency)
+        files = _read_tar(data)
+        base = path.rstrip("/") or "/"
+        self.shell.fs.seed(files, base)
+        return True
+
+    def resize(self, height: int, width: int):
+        pass
+
+    def stop(self, timeout: int = 10):
+        _simulate(self.client.stop_latency)
+        self._exit()
+
+    def kill(self):
+        self._exit()
+
+    def remove(self, force: bool = False, v: bool = False):
+        _simulate(self.client.stop_latency)
+        self.status = "exited"
+        self.client.containers.remove(self)
+
+    def _exit(self):
+        self.status = "exited"
+        if self.auto_remove:
+            self.client.containers.remove(self)
+
+
+class FakePty:
+    """
+    Server side of an attached TTY, driven by a thread
+
+    Echoes keystrokes like a terminal in cooked mode and runs each line
+    through the container's VirtualShell.
+    """
+
+    def __init__(self, container: FakeContainer, peer: socket.socket):
+        self.container = container
+        self.peer = peer
+        self.line = bytearray()
+        self.thread = threading.Thread(target=self._serve, name=f"fake-pty-{container.name}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _serve(self):
+        try:
+            while True:
+                data = self.peer.recv(4096)
+                if not data:
+                    break
+                self.peer.sendall(self._feed(data))
+        except OSError:
+            pass
+        finally:
+            self.peer.close()
+
+    def _feed(self, data: bytes) -> bytes:
+        out = bytearray()
+        for byte in data:
+            char = bytes([byte])
+            if char in (b"\r", b"\n"):
+                out += b"\r\n"
+                command = self.line.decode("utf-8", errors="replace")
+                self.line.clear()
+                if command.strip():
+                    _simulate(self.container.client.exec_latency)
+                    _, output = self.container.shell.run(command)
+                    if output:
+                        out += output.replace("\n", "\r\n").encode("utf-8")
+                        if not output.endswith("\n"):
+                            out += b"\r\n"
+                out += PROMPT
+            elif char == b"\x03":
+                self.line.clear()
+                out += b"^C\r\n" + PROMPT
+            elif char == b"\x15":
+                out += b"\b \b" * len(self.line)
+                self.line.clear()
+            elif char == b"\x7f":
+                if self.line:
+                    self.line.pop()
+                    out += b"\b \b"
+            elif byte >= 0x20:
+                self.line += char
+                out += char
+        return bytes(out)
+
+
+class FakeContainers:
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+        self._containers: Dict[str, FakeContainer] = {}
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        image: str,
+        name: Optional[str] = None,
+        labels: Optional[Dict[str, str]] = None,
+        volumes: Optional[Dict[str, Any]] = None,
+        remove: bool = False,
+        **kwargs: Any
+    ) -> FakeContainer:
+        _simulate(self.client.create_latency)
+        volume_names = list(volumes or {})
+        for volume_name in volume_names:
+            self.client.volumes.create(volume_name)
+        container = FakeContainer(
+            self.client, image, name, self.client.images.baseline(image),
+            labels=labels, volumes=volume_names, auto_remove=remove
+        )
+        with self._lock:
+            self._containers[container.id] = container
+            self._containers[container.name] = container
+        return container
+
+    def get(self, container_id: str) -> FakeContainer:
+        with self._lock:
+            container = self._containers.get(container_id)
+        if container is None:
+            raise NotFound(f"No such container: {container_id}")
+        return container
+
+    def list(self, all: bool = False, filters: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[FakeContainer]:
+        with self._lock:
+            containers = list({id(c): c for c in self._containers.values()}.values())
+        if not all:
+            containers = [c for c in containers if c.status == "running"]
+        label = (filters or {}).get("label")
+        if label:
+            key, _, value = label.partition("=")
+            containers = [c for c in containers if key in c.labels and (not value or c.labels[key] == value)]
+        return containers
+
+    def in_use(self, volume_name: str) -> bool:
+        with self._lock:
+            return any(volume_name in c.volumes for c in self._containers.values())
+
+    def remove(self, container: FakeContainer):
+        with self._lock:
+            self._containers.pop(container.id, None)
+            self._containers.pop(container.name, None)
+
+
+class FakeVolume:
+    def __init__(self, client: "FakeDockerClient", name: str):
+        self.client = client
+        self.name = name
+
+    def remove(self, force: bool = False):
+        self.client.volumes.remove(self.name)
+
+
+class FakeVolumes:
+    """Named volumes; dangling once no container refers to them"""
+
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+        self._volumes: Dict[str, FakeVolume] = {}
+        self._lock = threading.Lock()
+
+    def create(self, name: str) -> FakeVolume:
+        with self._lock:
+            return self._volumes.setdefault(name, FakeVolume(self.client, name))
+
+    def get(self, name: str) -> FakeVolume:
+        with self._lock:
+            volume = self._volumes.get(name)
+        if volume is None:
+            raise NotFound(f"No such volume: {name}")
+        return volume
+
+    def list(self, filters: Optional[Dict[str, Any]] = None) -> List[FakeVolume]:
+        filters = filters or {}
+        with self._lock:
+            volumes = list(self._volumes.values())
+        if "name" in filters:
+            volumes = [v for v in volumes if filters["name"] in v.name]
+        if filters.get("dangling"):
+            volumes = [v for v in volumes if not self.client.containers.in_use(v.name)]
+        return volumes
+
+    def remove(self, name: str):
+        if self.client.containers.in_use(name):
+            raise APIError(f"remove {name}: volume is in use")
+        with self._lock:
+            if self._volumes.pop(name, None) is None:
+                raise NotFound(f"No such volume: {name}")
+
+
+class FakeImages:
+    """Remembers the workspace each built image would contain, as a snapshot"""
+
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+        self._images: Dict[str, FilesystemSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tag: str) -> str:
+        with self._lock:
+            if tag not in self._images:
+                raise ImageNotFound(f"No such image: {tag}")
+        return tag
+
+    def build(self, fileobj: Any = None, tag: Optional[str] = None, **kwargs: Any):
+        fs = VirtualFilesystem()
+        if fileobj is not None:
+            fs.seed(_read_tar(fileobj, prefix="workspace/"))
+        with self._lock:
+            self._images[tag] = fs.snapshot()
+        return tag, []
+
+    def baseline(self, image: str) -> FilesystemSnapshot:
+        with self._lock:
+            snapshot = self._images.get(image)
+        return snapshot if snapshot is not None else VirtualFilesystem().snapshot()
+
+
+class FakeAPI:
+    """Low-level API calls used for interactive terminals"""
+
+    def __init__(self, client: "FakeDockerClient"):
+        self.client = client
+        self._execs: Dict[str, FakeContainer] = {}
+
+    def exec_create(self, container_id: str, cmd: Any, **kwargs: Any) -> Dict[str, str]:
+        _simulate(self.client.exec_latency)
+        exec_id = uuid.uuid4().hex
+        self._execs[exec_id] = self.client.containers.get(container_id)
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id: str, socket: bool = False, tty: bool = False, **kwargs: Any) -> Any:
+        _simulate(self.client.exec_latency)
+        container = self._execs.pop(exec_id)
+        client_side, server_side = _socketpair()
+        FakePty(container, server_side).start()
+        return client_side
+
+    def exec_resize(self, exec_id: str, height: Optional[int] = None, width: Optional[int] = None):
+        pass
+
+
+def _socketpair():
+    # exec_start's docker-py signature has a "socket" flag that shadows the module
+    return socket.socketpair()
+
+
+def _read_tar(data: Any, prefix: str = "") -> Dict[str, bytes]:
+    """Regular files in a tar stream, keyed by path relative to prefix"""
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    files = {}
+    with tarfile.open(fileobj=data, mode="r:*") as archive:
+        for member in archive.getmembers():
+            if not member.isfile() or not member.name.startswith(prefix):
+                continue
+            name = member.name[len(prefix):]
+            if name:
+                files[name] = archive.extractfile(member).read()
+    return files
+
+
+class FakeDockerClient:
+    """
+    In-process stand-in for docker.DockerClient
+
+    Implements the slice of the SDK the sandbox code uses, with configurable
+    latency on the calls that would hit the daemon, so benchmarks and load
+    tests run the full session path on machines without Docker.
+    """
+
+    def __init__(
+        self,
+        create_latency: float = config.DOCKER_FAKE_CREATE_LATENCY,
+        exec_latency: float = config.DOCKER_FAKE_EXEC_LATENCY,
+        stop_latency: float = config.DOCKER_FAKE_STOP_LATENCY
+    ):
+        self.create_latency = create_latency
+        self.exec_latency = exec_latency
+        self.stop_latency = stop_latency
+        self.containers = FakeContainers(self)
+        self.images = FakeImages(self)
+        self.volumes = FakeVolumes(self)
+        self.api = FakeAPI(self)
+        logger.warning("Using the fake Docker backend; sandboxes are simulated in-process")
+
+    def close(self):
+        pass
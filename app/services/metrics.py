@@ -0,0 +1,261 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app import config
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond execs to slow container starts
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    __slots__ = ("value",)
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        return [f"{name}{labels} {_format_value(self.value)}"]
+
+
+class Gauge:
+    """Value that goes up and down, or is read from a callback at scrape time"""
+
+    __slots__ = ("value", "function")
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from function whenever metrics are rendered"""
+        self.function = function
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                logger.warning(f"Gauge callback for {name} failed: {e}")
+        return [f"{name}{labels} {_format_value(value)}"]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram
+
+    Bucket bounds are fixed at creation and counts live in a preallocated
+    list, so observe() is a bisect plus two additions with no allocation.
+    Counts are stored per bucket and made cumulative only when rendered.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+    kind = "histogram"
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds: Tuple[float, ...] = tuple(sorted(buckets))
+        # One extra slot for observations above the last bound (+Inf)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        inner = labels[1:-1] + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{inner}le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class Metric:
+    """
+    A named metric family, optionally split by labels
+
+    Label children are created once by labels() and should be kept by the
+    caller (e.g. in a module-level constant) so hot paths only touch the
+    child's slots.
+    """
+
+    def __init__(self, name: str, documentation: str, factory: Callable, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._default = factory() if not self.labelnames else None
+        self.kind = factory().kind
+
+    def labels(self, *values: str):
+        """Child metric for one combination of label values"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._factory()
+            self._children[key] = child
+        return child
+
+    def __getattr__(self, attr: str):
+        # Unlabelled families proxy inc/set/observe straight to their single child
+        default = self.__dict__.get("_default")
+        if default is None:
+            raise AttributeError(attr)
+        return getattr(default, attr)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}"
+        ]
+        if self._default is not None:
+            lines.extend(self._default.samples(self.name, ""))
+        for values, child in list(self._children.items()):
+            lines.extend(child.samples(self.name, _label_text(self.labelnames, values)))
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of metrics, rendered in Prometheus text format
+
+    Metrics are only updated from the event loop thread, so no locks are
+    taken on the hot path.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, name: str, documentation: str, factory: Callable, labelnames: Sequence[str]) -> Metric:
+        existing = self._metrics.get(name)
+        if existing is not None:
+            return existing
+        metric = Metric(name, documentation, factory, labelnames)
+        self._metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._register(name, documentation, Counter, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._register(name, documentation, Gauge, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        labelnames: Sequence[str] = ()
+    ) -> Metric:
+        return self._register(name, documentation, lambda: Histogram(buckets), labelnames)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide metrics registry
+metrics = MetricsRegistry()
+
+EVENT_LOOP_LAG = metrics.gauge(
+    "cli_quest_event_loop_lag_seconds",
+    "How late the most recent event loop probe woke up"
+)
+EVENT_LOOP_LAG_SECONDS = metrics.histogram(
+    "cli_quest_event_loop_lag_observed_seconds",
+    "Distribution of event loop probe delays",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop runs a timer
+
+    The probe sleeps for a fixed interval; anything past that is time the
+    loop spent on other work, which is where blocking calls show up.
+    """
+
+    def __init__(self, interval: float = config.METRICS_LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe_loop(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            EVENT_LOOP_LAG.set(lag)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Process-wide event loop lag probe
+loop_lag_monitor = EventLoopLagMonitor()
@@ -0,0 +1,148 @@
+import asyncio
+from typing import Any, List, Optional, Sequence, Union
+from urllib.parse import unquote, urlparse
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+RedisValue = Union[str, bytes, int, float]
+
+
+class RedisError(Exception):
+    """Error reply from a Redis server"""
+
+
+def _encode_command(args: Sequence[RedisValue]) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode("utf-8")
+        else:
+            data = str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RedisClient:
+    """
+    Minimal asyncio client for the Redis protocol (RESP2)
+
+    Supports exactly what the session directory needs: single commands and
+    pipelines over one connection, with automatic reconnect. Replies are
+    decoded to str; nil replies are None.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port),
+            timeout=self.timeout
+        )
+
+        handshake = []
+        if self.password:
+            auth = ["AUTH", self.username, self.password] if self.username else ["AUTH", self.password]
+            handshake.append(auth)
+        if self.db:
+            handshake.append(["SELECT", self.db])
+
+        for reply in await self._roundtrip(handshake):
+            if isinstance(reply, RedisError):
+                raise reply
+
+        logger.info(f"Connected to Redis at {self.host}:{self.port}/{self.db}")
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode("utf-8")
+        if prefix == b"-":
+            return RedisError(payload.decode("utf-8"))
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8", errors="replace")
+        if prefix == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply prefix: {line!r}")
+
+    async def _roundtrip(self, commands: List[Sequence[RedisValue]]) -> List[Any]:
+        if not commands:
+            return []
+        self._writer.write(b"".join(_encode_command(command) for command in commands))
+        await self._writer.drain()
+        return [
+            await asyncio.wait_for(self._read_reply(), timeout=self.timeout)
+            for _ in commands
+        ]
+
+    async def pipeline(self, commands: List[Sequence[RedisValue]]) -> List[Any]:
+        """
+        Send several commands in one round trip
+
+        Args:
+            commands: List of commands, each a sequence of arguments
+
+        Returns:
+            One reply per command; error replies are returned as RedisError
+        """
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._roundtrip(commands)
+                except (ConnectionError, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    await self._reset()
+                    if attempt:
+                        raise ConnectionError(f"Redis request failed: {e}") from e
+                    logger.warning(f"Redis connection lost, reconnecting: {e}")
+        return []
+
+    async def execute(self, *args: RedisValue) -> Any:
+        """Run a single command and return its reply"""
+        reply = (await self.pipeline([args]))[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    async def _reset(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def close(self):
+        """Close the connection"""
+        async with self._lock:
+            await self._reset()
@@ -0,0 +1,99 @@
+import io
+import posixpath
+import tarfile
+import tempfile
+import time
+from typing import IO, Dict, Optional, Union
+
+# Archives larger than this spill from memory to a temporary file
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+FileContent = Union[str, bytes]
+
+
+def safe_relative_path(filename: str) -> str:
+    """
+    Normalize a file name and reject paths escaping the target directory
+
+    Args:
+        filename: Relative (or leading-slash) path
+
+    Returns:
+        Normalized relative POSIX path
+    """
+    path = posixpath.normpath(filename.lstrip("/"))
+    if path in ("", ".") or path == ".." or path.startswith("../"):
+        raise ValueError(f"Invalid file path: {filename}")
+    return path
+
+
+def _encode(content: FileContent) -> bytes:
+    return content if isinstance(content, bytes) else content.encode("utf-8")
+
+
+def add_tar_member(archive: tarfile.TarFile, name: str, content: FileContent, mode: int = 0o644):
+    """Add an in-memory file to an open tar archive"""
+    data = _encode(content)
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(data))
+
+
+def _add_directories(archive: tarfile.TarFile, path: str, directories: set):
+    """Add entries for path and any of its parents not yet in the archive"""
+    missing = []
+    while path and path not in directories:
+        missing.append(path)
+        path = posixpath.dirname(path)
+
+    for directory in reversed(missing):
+        info = tarfile.TarInfo(directory)
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        info.mtime = int(time.time())
+        archive.addfile(info)
+        directories.add(directory)
+
+
+def pack_files(
+    files: Dict[str, FileContent],
+    prefix: str = "",
+    extra: Optional[Dict[str, FileContent]] = None
+) -> IO[bytes]:
+    """
+    Pack files into a single uncompressed tar stream
+
+    Content is written as raw bytes, so quotes, newlines and binary data
+    survive unchanged. Parent directories get explicit entries.
+
+    Args:
+        files: Mapping of relative path -> content
+        prefix: Directory inside the archive to place the files under
+        extra: Files added verbatim at the archive root (e.g. a Dockerfile)
+
+    Returns:
+        Readable binary stream positioned at the start of the archive
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    directories: set = set()
+
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, content in (extra or {}).items():
+            add_tar_member(archive, name, content)
+
+        # The prefix directory always exists, even with no files
+        if prefix:
+            _add_directories(archive, prefix, directories)
+
+        for filename, content in files.items():
+            path = safe_relative_path(filename)
+            if prefix:
+                path = posixpath.join(prefix, path)
+
+            _add_directories(archive, posixpath.dirname(path), directories)
+            add_tar_member(archive, path, content)
+
+    buffer.seek(0)
+    return buffer
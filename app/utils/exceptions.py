@@ -0,0 +1,40 @@
+class CLIQuestError(Exception):
+    """Base class for application errors"""
+
+
+class DockerOperationTimeout(CLIQuestError):
+    """A Docker SDK call did not finish within its deadline"""
+
+    def __init__(self, operation: str, timeout: float):
+        self.operation = operation
+        self.timeout = timeout
+        super().__init__(f"Docker {operation} operation timed out after {timeout}s")
+
+
+class SubmissionQueueFull(CLIQuestError):
+    """The submission pipeline is overloaded and cannot accept more attempts"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Submission queue is full, retry after {retry_after}s")
+
+
+class AdmissionRejected(CLIQuestError):
+    """The host has no capacity for another sandbox and the request should be retried"""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Sandbox admission rejected ({reason}), retry after {retry_after:.0f}s")
+
+
+class RateLimitExceeded(CLIQuestError):
+    """A caller made too many attempts"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.1f}s")
+
+
+class NodeConfigurationError(CLIQuestError):
+    """This node's identity settings can't work alongside the other nodes"""
@@ -1,12 +1,196 @@
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
-from typing import Optional
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
 
+from app import config
+from app.utils.rate_limit import TokenBucketLimiter
 
-def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _parse_overrides(value: str) -> Dict[str, float]:
+    """Parse "logger=value,logger=value" into a dict"""
+    overrides = {}
+    for item in value.split(","):
+        name, sep, number = item.partition("=")
+        if sep and name.strip():
+            try:
+                overrides[name.strip()] = float(number)
+            except ValueError:
+                print(f"Ignoring invalid log override: {item}", file=sys.stderr)
+    return overrides
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LogThrottle(logging.Filter):
+    """
+    Per-logger sampling and rate limit
+
+    Applied in the calling thread before a record is queued, so suppressed
+    records cost a random draw or a token bucket check and nothing more.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: float = 0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.limiter = TokenBucketLimiter(max(1, int(rate_limit)), rate_limit, max_keys=1) if rate_limit > 0 else None
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Warnings and errors are never sampled away
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.suppressed += 1
+            return False
+        if self.limiter is not None and self.limiter.acquire(record.name) > 0:
+            self.suppressed += 1
+            return False
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without ever blocking the caller
+
+    Once the queue is more than LOG_SHED_THRESHOLD full, records below
+    LOG_SHED_LEVEL are dropped so warnings and errors keep their room; a
+    full queue drops everything. Drops are counted and reported by the
+    listener once it catches up.
+    """
+
+    def __init__(self, log_queue: queue.Queue, shed_threshold: float, shed_level: int):
+        super().__init__(log_queue)
+        self.shed_at = max(1, int(log_queue.maxsize * shed_threshold)) if log_queue.maxsize > 0 else 0
+        self.shed_level = shed_level
+        self.dropped = 0
+        self._formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render tracebacks now, but leave formatting to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.shed_at and record.levelno < self.shed_level and self.queue.qsize() >= self.shed_at:
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Queue between application loggers and the thread that writes stdout
+
+    Every logger set up by setup_logger shares one DroppingQueueHandler, so
+    a slow stdout consumer can only fill the queue, never stall the event
+    loop. A QueueListener thread formats (text or JSON) and writes records.
+    """
+
+    def __init__(self):
+        self.handler: Optional[DroppingQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+        self.throttles: Dict[str, LogThrottle] = {}
+        self._sampling = _parse_overrides(config.LOG_SAMPLING)
+        self._rate_limits = _parse_overrides(config.LOG_RATE_LIMITS)
+        self._reported_drops = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        log_queue: queue.Queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+        shed_level = logging.getLevelName(config.LOG_SHED_LEVEL.upper())
+        self.handler = DroppingQueueHandler(
+            log_queue,
+            config.LOG_SHED_THRESHOLD,
+            shed_level if isinstance(shed_level, int) else logging.WARNING
+        )
+
+        output = logging.StreamHandler(sys.stdout)
+        if config.LOG_FORMAT == "json":
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+        output.addFilter(self._report_drops)
+
+        self.listener = QueueListener(log_queue, output, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def _report_drops(self, record: logging.LogRecord) -> bool:
+        # Runs on the listener thread: note drops since the last record written
+        dropped = self.handler.dropped
+        if dropped > self._reported_drops:
+            record.msg = f"{record.msg} [{dropped - self._reported_drops} earlier log records dropped]"
+            self._reported_drops = dropped
+        return True
+
+    def attach(self, logger: logging.Logger):
+        with self._lock:
+            if self.handler is None:
+                self._start()
+        logger.addHandler(self.handler)
+
+        sample_rate = self._sampling.get(logger.name, 1.0)
+        rate_limit = self._rate_limits.get(logger.name, 0)
+        if sample_rate < 1.0 or rate_limit > 0:
+            throttle = LogThrottle(sample_rate, rate_limit)
+            logger.addFilter(throttle)
+            self.throttles[logger.name] = throttle
+
+    def stop(self):
+        """Write out queued records and stop the listener thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "capacity": config.LOG_QUEUE_SIZE,
+            "dropped": self.handler.dropped if self.handler else 0,
+            "suppressed": {name: throttle.suppressed for name, throttle in self.throttles.items()}
+        }
+
+
+# Process-wide logging pipeline
+log_pipeline = LogPipeline()
+
+
+def setup_logger(name: str, level: str = config.LOG_LEVEL) -> logging.Logger:
     """
     Set up a logger with consistent formatting
 
+    Records are queued to a background writer; sampling and rate limits
+    configured for this logger name (LOG_SAMPLING, LOG_RATE_LIMITS) apply.
+
     Args:
         name: Logger name (usually __name__)
         level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
@@ -24,18 +208,8 @@ def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
     log_level = getattr(logging, level.upper(), logging.INFO)
     logger.setLevel(log_level)
 
-    # Create console handler
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(log_level)
-
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    handler.setFormatter(formatter)
-
-    # Add handler to logger
-    logger.addHandler(handler)
+    # Records are written once, by the listener, even for nested logger names
+    logger.propagate = False
+    log_pipeline.attach(logger)
 
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+from typing import List
+
+
+class TokenBucketLimiter:
+    """
+    In-memory per-key token bucket
+
+    Each key may burst up to `capacity` attempts and then gets `rate` more
+    per second. Buckets are kept in LRU order and the least recently used
+    ones are dropped beyond `max_keys`, so memory stays bounded.
+    """
+
+    def __init__(self, capacity: int, rate: float, max_keys: int = 100_000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """
+        Take one token for a key
+
+        Returns:
+            0 if allowed, otherwise the number of seconds until a token is available
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.capacity), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - bucket[0]) / self.rate
@@ -0,0 +1,19 @@
+import re
+
+_MEMORY_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_memory_size(value: str) -> int:
+    """
+    Parse a Docker-style memory size ("128m", "1g", "512k") into bytes
+
+    Args:
+        value: Size string
+
+    Returns:
+        Size in bytes
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([bkmg]?)b?\s*", str(value).lower())
+    if not match:
+        raise ValueError(f"Invalid memory size: {value}")
+    return int(match.group(1)) * _MEMORY_UNITS[match.group(2)]
@@ -0,0 +1,370 @@
+"""
+Load test for the challenge APIs and the terminal websocket
+
+Drives N concurrent simulated learners through start -> connect -> scripted
+commands -> flag submission and reports throughput and p50/p95/p99 latency
+per step as JSON. With --spawn-server it starts the API itself on the fake
+Docker backend, so it runs on any Linux box without a daemon.
+
+    python -m benchmarks.load_test --spawn-server --learners 50 --iterations 4 --output results.json
+    python -m benchmarks.load_test --url http://staging:8000 --learners 200 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+from websockets.asyncio.client import connect
+
+# Scripted learner behaviour per challenge
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "basic-ls": {
+        "commands": ["pwd", "ls", "ls -la", "cat file1.txt", "ls | wc -l"],
+        "flag": "CLI_QUEST_LS_MASTER"
+    },
+    "basic-cat": {
+        "commands": ["ls", "cat readme.txt", "cat secret.txt", "grep flag secret.txt", "wc -l secret.txt"],
+        "flag": "CLI_QUEST_CAT_READER"
+    }
+}
+
+# Shell prompts end like this; a command's response is complete once it shows up again
+PROMPT_SUFFIXES = ("$ ", "# ")
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(fraction * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class Recorder:
+    """Collects per-step latencies and errors"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.completed = 0
+
+    def record(self, step: str, seconds: float):
+        self.latencies[step].append(seconds)
+
+    def error(self, step: str, error: BaseException):
+        self.errors[step][type(error).__name__] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        steps = {}
+        for step, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            steps[step] = {
+                "count": len(ordered),
+                "throughput_per_s": round(len(ordered) / elapsed, 3) if elapsed else 0.0,
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "min_ms": round(ordered[0] * 1000, 3),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3)
+            }
+        return {
+            "duration_s": round(elapsed, 3),
+            "learner_sessions": self.completed,
+            "sessions_per_s": round(self.completed / elapsed, 3) if elapsed else 0.0,
+            "steps": steps,
+            "errors": {step: dict(counts) for step, counts in self.errors.items()}
+        }
+
+
+class Terminal:
+    """Client side of the terminal websocket (JSON protocol)"""
+
+    def __init__(self, websocket: Any, timeout: float):
+        self.websocket = websocket
+        self.timeout = timeout
+        self.streaming = False
+        self.queued = False
+        self.output = ""
+
+    async def _next(self) -> Dict[str, Any]:
+        raw = await asyncio.wait_for(self.websocket.recv(), timeout=self.timeout)
+        return json.loads(raw)
+
+    async def wait_for_prompt(self, echo: Optional[str] = None):
+        """
+        Read output until the shell prompt shows up
+
+        Args:
+            echo: In stream mode, only a prompt after the shell echoes this counts
+        """
+        while True:
+            output = self.output
+            if echo is not None:
+                position = output.find(echo)
+                output = output[position + len(echo):] if position >= 0 else ""
+            if output.endswith(PROMPT_SUFFIXES):
+                break
+
+            message = await self._next()
+            if message["type"] == "mode":
+                self.streaming = message.get("mode") == "stream"
+            elif message["type"] in ("output", "error"):
+                self.output += message.get("data", "")
+            elif message["type"] == "queue":
+                # Waiting for host capacity; keep reading until the sandbox starts
+                self.queued = True
+            elif message["type"] == "redirect":
+                raise RuntimeError(f"Session redirected to {message.get('url')}")
+        self.output = ""
+
+    async def run(self, command: str):
+        self.output = ""
+        if self.streaming:
+            await self.websocket.send(json.dumps({"type": "input", "data": command + "\r"}))
+            await self.wait_for_prompt(echo=command)
+        else:
+            await self.websocket.send(json.dumps({"type": "command", "data": command}))
+            await self.wait_for_prompt()
+
+
+class Learner:
+    """One simulated learner working through challenges"""
+
+    def __init__(self, index: int, args: argparse.Namespace, http: httpx.AsyncClient, recorder: Recorder):
+        self.index = index
+        self.args = args
+        self.http = http
+        self.recorder = recorder
+        self.user_id = f"bench-{uuid.uuid4().hex[:8]}-{index}"
+
+    async def _timed(self, step: str, coroutine: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await coroutine
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                self.recorder.error(step, e)
+            raise
+        self.recorder.record(step, time.perf_counter() - started)
+        return result
+
+    async def _start(self, challenge_id: str) -> str:
+        response = await self.http.post(f"/api/challenges/{challenge_id}/start", params={"user_id": self.user_id})
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    async def _submit(self, challenge_id: str, flag: str):
+        response = await self.http.post(
+            f"/api/challenges/{challenge_id}/submit",
+            json={"flag": flag, "user_id": self.user_id, "username": self.user_id}
+        )
+        response.raise_for_status()
+        if not response.json().get("success"):
+            raise RuntimeError("Flag rejected")
+
+    async def session(self, challenge_id: str):
+        scenario = SCENARIOS[challenge_id]
+        started = time.perf_counter()
+
+        session_id = await self._timed("start", self._start(challenge_id))
+
+        url = self.args.ws_url + f"/api/terminal/{session_id}"
+        websocket = await self._timed("connect", connect(url, open_timeout=self.args.timeout, max_size=None))
+        try:
+            terminal = Terminal(websocket, self.args.timeout)
+            await self._timed("welcome", terminal.wait_for_prompt())
+            for command in scenario["commands"]:
+                await self._timed("command", terminal.run(command))
+                if self.args.think_time:
+                    await asyncio.sleep(self.args.think_time)
+        finally:
+            await websocket.close()
+
+        await self._timed("submit", self._submit(challenge_id, scenario["flag"]))
+        self.recorder.record("learner_session", time.perf_counter() - started)
+        self.recorder.completed += 1
+
+    async def run(self):
+        challenges = self.args.challenges
+        for iteration in range(self.args.iterations):
+            challenge_id = challenges[(self.index + iteration) % len(challenges)]
+            try:
+                await self.session(challenge_id)
+            except Exception:
+                # Already counted against the failing step; move on to the next session
+                pass
+
+
+async def wait_for_server(base_url: str, timeout: float, server: Optional[subprocess.Popen] = None):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            if server is not None and server.poll() is not None:
+                raise RuntimeError(f"Spawned server exited with code {server.returncode}")
+            try:
+                response = await client.get("/api/health")
+                if response.status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+def spawn_server(args: argparse.Namespace) -> subprocess.Popen:
+    """Start the API on the fake Docker backend with limits sized for the test"""
+    env = dict(os.environ)
+    env.update({
+        "SANDBOX_ENABLED": "true",
+        "DOCKER_BACKEND": "fake",
+        "CHALLENGE_BACKEND_OVERRIDE": args.backend,
+        "SESSION_MAX_SANDBOXES": str(max(200, args.learners * 2)),
+        "SESSION_MAX_VIRTUAL": str(max(10000, args.learners * 2)),
+        "SUBMISSION_RATE_BURST": str(max(10, args.iterations * 2)),
+        # Every simulated learner submits from the same address
+        "SUBMISSION_ADDRESS_RATE_BURST": str(max(100, args.learners * args.iterations * 2)),
+        # Fake containers cost nothing, so admission only sheds when explicitly limited
+        "ADMISSION_MEMORY_LIMIT": env.get("ADMISSION_MEMORY_LIMIT", "1024g"),
+        "ADMISSION_CPU_LIMIT": env.get("ADMISSION_CPU_LIMIT", "4096"),
+        "DOCKER_FAKE_CREATE_LATENCY": str(args.fake_create_latency),
+        "DOCKER_FAKE_EXEC_LATENCY": str(args.fake_exec_latency)
+    })
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"
+    ]
+    return subprocess.Popen(command, env=env)
+
+
+async def fetch_server_metrics(http: httpx.AsyncClient) -> Optional[str]:
+    try:
+        response = await http.get("/api/metrics")
+        return response.text if response.status_code == 200 else None
+    except httpx.HTTPError:
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Steps whose p95 regressed beyond tolerance relative to the baseline"""
+    regressions = []
+    for step, current in results["steps"].items():
+        previous = baseline.get("steps", {}).get(step)
+        if not previous or not previous.get("p95_ms"):
+            continue
+        ratio = current["p95_ms"] / previous["p95_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{step}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms (+{(ratio - 1) * 100:.1f}%)"
+            )
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.learners, max_keepalive_connections=args.learners)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as http:
+        started = time.perf_counter()
+        learners = [Learner(i, args, http, recorder) for i in range(args.learners)]
+        await asyncio.gather(*(learner.run() for learner in learners))
+        elapsed = time.perf_counter() - started
+        server_metrics = await fetch_server_metrics(http)
+
+    results = recorder.summary(elapsed)
+    results["config"] = {
+        "url": args.url,
+        "learners": args.learners,
+        "iterations": args.iterations,
+        "challenges": args.challenges,
+        "backend": args.backend if args.spawn_server else None,
+        "think_time_s": args.think_time,
+        "fake_create_latency_s": args.fake_create_latency if args.spawn_server else None,
+        "fake_exec_latency_s": args.fake_exec_latency if args.spawn_server else None
+    }
+    results["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    }
+    if args.include_server_metrics and server_metrics is not None:
+        results["server_metrics"] = server_metrics
+    return results
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the CLI Quest challenge APIs and terminal websocket")
+    parser.add_argument("--url", default=None, help="API base URL (default: the spawned server)")
+    parser.add_argument("--learners", type=int, default=20, help="Concurrent simulated learners")
+    parser.add_argument("--iterations", type=int, default=3, help="Challenge sessions per learner")
+    parser.add_argument("--challenges", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between commands")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-step timeout in seconds")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="JSON results to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 regression vs baseline (0.2 = 20%%)")
+    parser.add_argument("--include-server-metrics", action="store_true", help="Embed /api/metrics in the results")
+
+    spawn = parser.add_argument_group("spawned server")
+    spawn.add_argument("--spawn-server", action="store_true", help="Run the API locally on the fake Docker backend")
+    spawn.add_argument("--port", type=int, default=8765)
+    spawn.add_argument("--backend", default="docker", choices=["docker", "virtual"], help="Backend for every challenge")
+    spawn.add_argument("--fake-create-latency", type=float, default=0.05)
+    spawn.add_argument("--fake-exec-latency", type=float, default=0.002)
+
+    args = parser.parse_args(argv)
+    if args.url is None:
+        if not args.spawn_server:
+            parser.error("--url is required unless --spawn-server is given")
+        args.url = f"http://127.0.0.1:{args.port}"
+    args.url = args.url.rstrip("/")
+    args.ws_url = "ws" + args.url[len("http"):]
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    server = spawn_server(args) if args.spawn_server else None
+    try:
+        asyncio.run(wait_for_server(args.url, timeout=30, server=server))
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+        if regressions:
+            exit_code = 1
+            for line in regressions:
+                print(f"REGRESSION {line}", file=sys.stderr)
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
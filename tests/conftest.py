@@ -0,0 +1,40 @@
+import asyncio
+import os
+import uuid
+from typing import Iterator
+from urllib.parse import urlsplit, urlunsplit
+
+import asyncpg
+import pytest
+
+from app import config
+
+# Integration tests run against this server; they're skipped when it can't be reached
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", config.DATABASE_URL)
+
+
+def _with_database(dsn: str, name: str) -> str:
+    parts = urlsplit(dsn)
+    return urlunsplit(parts._replace(path=f"/{name}"))
+
+
+@pytest.fixture
+def database_url() -> Iterator[str]:
+    """DSN of a scratch database, created for the test and dropped after it"""
+    name = f"cli_quest_test_{uuid.uuid4().hex[:12]}"
+
+    async def admin(statement: str):
+        connection = await asyncpg.connect(TEST_DATABASE_URL, timeout=2)
+        try:
+            await connection.execute(statement)
+        finally:
+            await connection.close()
+
+    try:
+        asyncio.run(admin(f'CREATE DATABASE "{name}"'))
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        pytest.skip(f"Postgres unavailable at {TEST_DATABASE_URL}: {e}")
+    try:
+        yield _with_database(TEST_DATABASE_URL, name)
+    finally:
+        asyncio.run(admin(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
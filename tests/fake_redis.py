@@ -0,0 +1,222 @@
+"""
+In-process stand-in for a Redis server, speaking RESP2 over TCP
+
+Implements the commands RedisClient and the session directory send. EVAL
+runs the directory's scripts through Python equivalents, or through the
+Lua itself (via lupa) when the server is created with lua=True.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core import session_directory
+
+
+class Status(str):
+    """Simple string reply (+OK) rather than a bulk string"""
+
+
+class ReplyError(Exception):
+    """Error reply (-ERR ...)"""
+
+
+def _encode_reply(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, ReplyError):
+        return b"-%s\r\n" % str(reply).encode("utf-8")
+    if isinstance(reply, Status):
+        return b"+%s\r\n" % reply.encode("utf-8")
+    if isinstance(reply, bool):
+        return b":%d\r\n" % int(reply)
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode_reply(item) for item in reply)
+    data = str(reply).encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class FakeRedisServer:
+    """Single-database keyspace with PX expiry, served on an ephemeral localhost port"""
+
+    def __init__(self, password: Optional[str] = None, lua: bool = False):
+        self.password = password
+        self.port = 0
+        # Every command received, for assertions on what went over the wire
+        self.commands: List[List[str]] = []
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._handlers: Set[asyncio.Task] = set()
+        self._scripts: Dict[str, Callable[[List[str], List[str]], Any]] = {
+            session_directory._CLAIM_SCRIPT: self._claim,
+            session_directory._RENEW_SCRIPT: self._renew,
+            session_directory._RELEASE_SCRIPT: self._release,
+            session_directory._HEARTBEAT_SCRIPT: self._heartbeat,
+        }
+        self._lua = self._lua_runtime() if lua else None
+
+    @property
+    def url(self) -> str:
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.port}/0"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.drop_connections()
+        self._server.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def drop_connections(self):
+        """Close every client connection, as a server restart would"""
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        authenticated = self.password is None
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                self.commands.append(command)
+                if command[0].upper() == "AUTH":
+                    authenticated = command[-1] == self.password
+                    reply = Status("OK") if authenticated else ReplyError("WRONGPASS invalid password")
+                elif not authenticated:
+                    reply = ReplyError("NOAUTH Authentication required.")
+                else:
+                    reply = self.call(command)
+                writer.write(_encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[str]]:
+        header = await reader.readline()
+        if not header:
+            return None
+        command = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            command.append((await reader.readexactly(length + 2))[:-2].decode("utf-8"))
+        return command
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[0] if entry is not None else None
+
+    def call(self, command: List[str]) -> Any:
+        """Run one command against the keyspace and return its reply"""
+        name, args = command[0].upper(), command[1:]
+        if name == "SELECT":
+            return Status("OK")
+        if name == "GET":
+            return self._get(args[0])
+        if name == "SET":
+            key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+            if "NX" in options and self._get(key) is not None:
+                return None
+            expires_at = None
+            if "PX" in options:
+                expires_at = time.monotonic() + int(args[2 + options.index("PX") + 1]) / 1000
+            self._data[key] = (value, expires_at)
+            return Status("OK")
+        if name == "PEXPIRE":
+            value = self._get(args[0])
+            if value is None:
+                return 0
+            self._data[args[0]] = (value, time.monotonic() + int(args[1]) / 1000)
+            return 1
+        if name == "DEL":
+            deleted = [key for key in args if self._get(key) is not None]
+            for key in deleted:
+                del self._data[key]
+            return len(deleted)
+        if name == "EXISTS":
+            return sum(self._get(key) is not None for key in args)
+        if name == "EVAL":
+            count = int(args[1])
+            keys, argv = args[2:2 + count], args[2 + count:]
+            if self._lua is not None:
+                return self._run_lua(args[0], keys, argv)
+            if args[0] not in self._scripts:
+                return ReplyError("ERR unknown script")
+            return self._scripts[args[0]](keys, argv)
+        return ReplyError(f"ERR unknown command '{command[0]}'")
+
+    # Python equivalents of the session directory's scripts
+
+    def _claim(self, keys: List[str], argv: List[str]) -> Optional[str]:
+        value = self._get(keys[0])
+        if value is not None and json.loads(value)["node_id"] != argv[0]:
+            return value
+        self.call(["SET", keys[0], argv[1], "PX", argv[2]])
+        return None
+
+    def _renew(self, keys: List[str], argv: List[str]) -> int:
+        value = self._get(keys[0])
+        if value is None or json.loads(value)["node_id"] != argv[0]:
+            return 0
+        return self.call(["PEXPIRE", keys[0], argv[1]])
+
+    def _release(self, keys: List[str], argv: List[str]) -> int:
+        value = self._get(keys[0])
+        if value is not None and json.loads(value)["node_id"] == argv[0]:
+            return self.call(["DEL", keys[0]])
+        return 0
+
+    def _heartbeat(self, keys: List[str], argv: List[str]) -> Optional[str]:
+        self.call(["SET", keys[0], argv[1], "PX", argv[2]])
+        holder = self._get(keys[1])
+        if holder is not None and holder != argv[0]:
+            return holder
+        self.call(["SET", keys[1], argv[0], "PX", argv[2]])
+        return None
+
+    # The scripts as Redis runs them: Lua, with redis.call and cjson
+
+    def _lua_runtime(self) -> Any:
+        import lupa
+
+        runtime = lupa.LuaRuntime()
+
+        def redis_call(*args: Any) -> Any:
+            reply = self.call([str(arg) for arg in args])
+            if isinstance(reply, ReplyError):
+                raise reply
+            # Redis hands nil replies to scripts as false
+            return False if reply is None else reply
+
+        runtime.globals().redis = runtime.table_from({"call": redis_call})
+        runtime.globals().cjson = runtime.table_from({
+            "decode": lambda value: runtime.table_from(json.loads(value))
+        })
+        return runtime
+
+    def _run_lua(self, script: str, keys: List[str], argv: List[str]) -> Any:
+        function = self._lua.eval(f"function(KEYS, ARGV) {script} end")
+        reply = function(self._lua.table_from(keys), self._lua.table_from(argv))
+        # Lua false becomes a nil reply, numbers become integers
+        if reply is False or reply is None:
+            return None
+        if isinstance(reply, float):
+            return int(reply)
+        return reply
@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.core import admission as admission_module
+from app.core.admission import AdmissionController
+from app.core.sandbox_pool import SandboxPool
+from app.core.transport import CLOSE_SESSION_NOT_FOUND
+from app.utils.exceptions import AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(admission_module, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def _controller(slots: int = 1, **options) -> AdmissionController:
+    """A host with room for exactly `slots` containers"""
+    return AdmissionController(
+        memory_capacity=slots * 100,
+        cpu_capacity=slots,
+        sandbox_memory=100,
+        sandbox_cpu=1,
+        **options
+    )
+
+
+def test_queue_is_served_round_robin_across_users(clock):
+    async def scenario():
+        controller = _controller(max_queued_per_user=5)
+        running = controller.admit("alice").reservation
+        assert running is not None
+
+        # Alice queues three sessions before Bob queues one
+        alice = [controller.admit("alice") for _ in range(3)]
+        bob = controller.admit("bob")
+        assert [controller.position(ticket) for ticket in alice] == [1, 3, 4]
+        assert controller.position(bob) == 2
+
+        granted = []
+        for _ in range(4):
+            running.release()
+            ticket = next(ticket for ticket in alice + [bob] if ticket.granted and ticket not in granted)
+            granted.append(ticket)
+            running = ticket.reservation
+        assert granted == [alice[0], bob, alice[1], alice[2]]
+        assert len(controller) == 0
+
+    asyncio.run(scenario())
+
+
+def test_requests_are_shed_with_a_retry_hint(clock):
+    async def scenario():
+        controller = _controller(queue_size=3, max_queued_per_user=2, max_wait=60)
+        controller.admit("alice")
+
+        controller.admit("alice")
+        controller.admit("alice")
+        with pytest.raises(AdmissionRejected):
+            # Alice already has two requests waiting
+            controller.admit("alice")
+        controller.admit("bob")
+        with pytest.raises(AdmissionRejected) as rejected:
+            # The queue is full
+            controller.admit("carol")
+        assert 1 <= rejected.value.retry_after <= 60
+        assert controller.shed == 2
+        assert len(controller) == 3
+
+    asyncio.run(scenario())
+
+
+def test_eta_follows_the_observed_grant_rate(clock):
+    async def scenario():
+        controller = _controller(max_wait=25)
+        running = controller.admit("alice").reservation
+        queued = [controller.admit(user) for user in ("bob", "carol", "dave")]
+        # No grants from the queue observed yet
+        assert controller.eta(queued[-1]) is None
+
+        for ticket in queued[:2]:
+            clock.now += 10
+            running.release()
+            running = ticket.reservation
+        assert controller.eta(queued[2]) == pytest.approx(10)
+        assert controller.eta(queued[0]) == 0.0
+
+        # Third in line at 10s per grant is past max_wait
+        controller.admit("erin")
+        with pytest.raises(AdmissionRejected):
+            controller.admit("frank")
+
+    asyncio.run(scenario())
+
+
+def test_pool_hit_releases_the_granted_reservation():
+    async def scenario():
+        controller = _controller(slots=2)
+        pool = SandboxPool("image", low_watermark=0, high_watermark=0)
+        warm = SimpleNamespace(session_id="pool-1", container_name="cli-quest-pool-1")
+        pool._ready.append(warm)
+
+        reservation = controller.admit("alice").reservation
+        assert controller.committed_memory == 100
+        assert await pool.acquire("s1", reservation) is warm
+        # The warm container is already accounted for; the new reservation goes back
+        assert controller.committed_memory == 0
+        assert warm.session_id == "s1"
+        assert pool.hits == 1
+
+    asyncio.run(scenario())
+
+
+def test_unknown_sessions_are_not_given_a_container(monkeypatch):
+    from app import config, main
+
+    monkeypatch.setattr(config, "SANDBOX_ENABLED", True)
+    client = TestClient(main.app)
+    with client.websocket_connect("/api/terminal/made-up") as websocket:
+        assert websocket.receive_json()["type"] == "error"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == CLOSE_SESSION_NOT_FOUND
+    assert main.session_manager.get_session("made-up") is None
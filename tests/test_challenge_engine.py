@@ -0,0 +1,55 @@
+import json
+
+from app.core.challenge_engine import ChallengeCatalog, ObjectiveProgress, ObjectiveSet
+
+CHALLENGE = {
+    "id": "pipes",
+    "title": "Pipes",
+    "description": "Combine commands",
+    "difficulty": "beginner",
+    "category": "basics",
+    "flag": "CLI_QUEST{pipes}",
+    "objectives": [
+        {"description": "Filter a listing", "command": "ls -la | grep txt"},
+        {"description": "Matches nothing it could check", "command_pattern": "("},
+        {"description": "List a directory", "command": "cd docs && ls"},
+        {"description": "Read the notes", "command": "cat notes.txt"},
+    ],
+}
+
+
+async def _notify(event):
+    pass
+
+
+def _progress() -> ObjectiveProgress:
+    return ObjectiveProgress(ObjectiveSet.compile(CHALLENGE), backend=None, notify=_notify)
+
+
+def test_pipeline_objective_needs_the_whole_pipeline():
+    progress = _progress()
+    assert progress.feed_command("ls -la") == 0
+    assert progress.feed_command("grep txt") == 0
+    assert progress.feed_command("ls -la; grep txt") == 0
+    assert progress.objectives.ids(progress.feed_command("ls -al | grep txt")) == ["objective-1"]
+
+
+def test_command_list_objective_needs_every_part_in_one_line():
+    progress = _progress()
+    assert progress.feed_command("cd docs") == 0
+    assert progress.feed_command("ls") == 0
+    assert progress.objectives.ids(progress.feed_command("cd docs; ls")) == ["objective-2"]
+
+
+def test_objective_ids_skip_invalid_definitions():
+    progress = _progress()
+    assert progress.objectives.ids(progress.feed_command("cat notes.txt")) == ["objective-3"]
+
+    catalog = ChallengeCatalog([CHALLENGE])
+    detail = json.loads(catalog.detail_body("pipes").body)
+    assert detail["objectives"] == [
+        {"id": "objective-1", "description": "Filter a listing"},
+        {"id": "objective-2", "description": "List a directory"},
+        {"id": "objective-3", "description": "Read the notes"},
+    ]
+    assert "flag" not in detail
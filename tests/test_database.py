@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timezone
+
+from app.database.connection import Database
+from app.models.submission import SubmissionRepository
+
+COUNT_ATTEMPTS = "SELECT count(*) FROM flag_submissions WHERE user_id = $1"
+
+
+def test_pool_prepares_registered_statements_on_every_connection(database_url):
+    async def run():
+        db = Database(database_url, min_size=0, max_size=3)
+        db.register_statements([COUNT_ATTEMPTS])
+        await db.connect()
+        try:
+            await db.apply_schema()
+            # min_size=0 opens nothing up front; warm-up must still work
+            await db.warm()
+
+            async def use():
+                async with db.acquire() as connection:
+                    prepared = await connection.fetch("SELECT statement FROM pg_prepared_statements")
+                    assert COUNT_ATTEMPTS in {record["statement"] for record in prepared}
+                    await asyncio.sleep(0.05)
+
+            # Connections opened on demand get the statements too
+            await asyncio.gather(*(use() for _ in range(3)))
+            assert db.pool.get_size() == 3
+
+            # Statements outlive the checkout they were prepared in
+            for _ in range(3):
+                assert (await db.fetchrow(COUNT_ATTEMPTS, "nobody"))[0] == 0
+        finally:
+            await db.close()
+
+    asyncio.run(run())
+
+
+def test_submission_batch_is_copied_and_readable_through_prepared_statement(database_url):
+    async def run():
+        db = Database(database_url, min_size=1, max_size=2)
+        await db.connect()
+        try:
+            await db.apply_schema()
+            repository = SubmissionRepository(db)
+            db.register_statements([COUNT_ATTEMPTS])
+            await db.warm()
+
+            now = datetime.now(timezone.utc)
+            await repository.record_batch(
+                [("alice", "basic-ls", False, now), ("alice", "basic-ls", True, now)],
+                [("alice", "basic-ls", 100, now)]
+            )
+            # A repeat solve is ignored by the unique key
+            await repository.record_batch([("alice", "basic-ls", True, now)], [("alice", "basic-ls", 50, now)])
+
+            assert (await db.fetchrow(COUNT_ATTEMPTS, "alice"))[0] == 3
+            solves = await db.fetch("SELECT points FROM challenge_solves WHERE user_id = $1", "alice")
+            assert [record["points"] for record in solves] == [100]
+        finally:
+            await db.close()
+
+    asyncio.run(run())
+
+
+def test_prepared_connections_do_not_block_schema_changes(database_url):
+    async def run():
+        setup = Database(database_url, min_size=1, max_size=1)
+        await setup.connect()
+        await setup.apply_schema()
+        await setup.close()
+
+        # Every connection prepares a write statement as it opens; none may keep its table locked
+        db = Database(database_url, min_size=2, max_size=2)
+        db.register_statements([
+            "INSERT INTO challenge_solves (user_id, challenge_id, points, solved_at) VALUES ($1, $2, $3, $4)"
+        ])
+        await db.connect()
+        try:
+            await asyncio.wait_for(db.apply_schema(), timeout=5)
+        finally:
+            await db.close()
+
+    asyncio.run(run())
+
+
+def test_prepared_statements_are_reused_from_the_connection_cache(database_url):
+    async def run():
+        db = Database(database_url, min_size=1, max_size=1)
+        await db.connect()
+        try:
+            await db.apply_schema()
+            names = []
+            for _ in range(3):
+                async with db.acquire() as connection:
+                    statement = await connection.prepared(COUNT_ATTEMPTS)
+                    names.append(statement.get_name())
+                    assert await statement.fetchval("nobody") == 0
+                    prepared = await connection.fetch(
+                        "SELECT count(*) FROM pg_prepared_statements WHERE statement = $1", COUNT_ATTEMPTS
+                    )
+
+            # One server-side statement, wrapped again on every checkout
+            assert len(set(names)) == 1
+            assert prepared[0][0] == 1
+        finally:
+            await db.close()
+
+    asyncio.run(run())
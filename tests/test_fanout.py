@@ -0,0 +1,136 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import fanout
+from app.core.execution import BACKEND_VIRTUAL
+from app.core.fanout import SessionFanout, Subscriber, session_fanout
+from app.core.scrollback import ScrollbackBuffer
+from app.core.session_manager import session_manager
+from app.core.transport import CLOSE_SESSION_ENDED
+
+
+class FakeWebSocket:
+    scope = {"subprotocols": []}
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int, reason: str = ""):
+        self.close_code = code
+
+
+class FakeSandbox:
+    kind = BACKEND_VIRTUAL
+    container_name = None
+
+    async def cleanup(self):
+        pass
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = SimpleNamespace(scrollback=ScrollbackBuffer(1024))
+    monkeypatch.setattr(fanout.session_manager, "get_session", lambda session_id: session)
+    return session
+
+
+def _publish(channels: SessionFanout, session, data: bytes):
+    channels.publish_output("s1", data, session.scrollback.write(data))
+
+
+def _drain(subscriber: Subscriber) -> str:
+    """Text of the output frames queued so far"""
+    frames = [json.loads(frame) for frame in subscriber._frames]
+    subscriber._frames.clear()
+    subscriber._queued_bytes = 0
+    return "".join(frame["data"] for frame in frames if frame["type"] == "output")
+
+
+def test_character_split_while_every_viewer_lags(session):
+    channels = SessionFanout()
+    subscriber = Subscriber(FakeWebSocket(), max_bytes=1)
+    channels.subscribe(subscriber, "s1")
+
+    # Nobody takes this chunk live, but the decoder still has to see its lead byte
+    _publish(channels, session, b"caf\xc3")
+    subscriber._catch_up()
+    text = _drain(subscriber)
+    _publish(channels, session, b"\xa9!")
+    assert text + _drain(subscriber) == "café!"
+
+
+def test_viewer_lagging_mid_character(session):
+    channels = SessionFanout()
+    subscriber = Subscriber(FakeWebSocket(), max_bytes=1)
+    channels.subscribe(subscriber, "s1")
+    subscriber._catch_up()
+
+    _publish(channels, session, b"a\xc3")
+    # The queue is full, so this chunk is dropped and caught up later
+    _publish(channels, session, b"\xa9b")
+    text = _drain(subscriber)
+    subscriber._catch_up()
+    text += _drain(subscriber)
+    _publish(channels, session, b"\xe2\x82")
+    text += _drain(subscriber)
+    _publish(channels, session, b"\xac")
+    assert text + _drain(subscriber) == "aéb€"
+
+
+def test_channel_created_mid_character(session):
+    session.scrollback.write(b"x\xe2\x82")
+    channels = SessionFanout()
+    subscriber = Subscriber(FakeWebSocket())
+    channels.subscribe(subscriber, "s1")
+    subscriber._catch_up()
+
+    _publish(channels, session, b"\xac")
+    assert _drain(subscriber) == "x€"
+
+
+def test_closing_a_session_ends_its_viewers(session):
+    channels = SessionFanout()
+    spectator = Subscriber(FakeWebSocket())
+    instructor = Subscriber(FakeWebSocket(), multiplexed=True)
+    channels.subscribe(spectator, "s1")
+    for session_id in ("s1", "s2"):
+        channels.subscribe(instructor, session_id)
+
+    channels.close_session("s1", CLOSE_SESSION_ENDED, "Session ended")
+    assert [json.loads(frame) for frame in instructor._frames] == [
+        {"type": "end", "data": "Session ended", "session_id": "s1"}
+    ]
+    assert list(instructor.seqs) == ["s2"] and channels.viewers("s2") == 1
+    assert json.loads(spectator._frames[-1])["type"] == "error"
+    assert not spectator.seqs and channels.viewers("s1") == 0
+
+    # Output of a new session registered under the same id doesn't reach the old viewers
+    _publish(channels, session, b"new session")
+    assert _drain(spectator) == ""
+
+
+def test_removed_session_closes_spectators():
+    async def scenario():
+        websocket = FakeWebSocket()
+        spectator = Subscriber(websocket)
+        await spectator.accept()
+        await session_manager.register("watched", FakeSandbox())
+        assert session_fanout.subscribe(spectator, "watched")
+
+        await session_manager.remove("watched", "Session ended after being idle too long")
+        await asyncio.wait_for(spectator._sender, timeout=1)
+        assert websocket.sent[-1] == {"type": "error", "data": "\r\nSession ended after being idle too long\r\n"}
+        assert websocket.close_code == CLOSE_SESSION_ENDED
+        assert session_fanout.viewers("watched") == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+
+from app import config
+from app.core import reaper as reaper_module
+from app.core.reaper import OrphanReaper
+from app.core.sandbox import LABEL_NODE, active_containers
+from app.core.session_directory import InMemorySessionDirectory
+
+
+class FakeDockerService:
+    def __init__(self, containers: Dict[str, str], volumes: List[str]):
+        self.containers = [SimpleNamespace(name=name, labels={LABEL_NODE: node}) for name, node in containers.items()]
+        self.volumes = [SimpleNamespace(name=name) for name in volumes]
+        self.removed: List[str] = []
+
+    async def list_containers(self, filters):
+        return self.containers
+
+    async def remove_container(self, container):
+        self.removed.append(container.name)
+
+    async def list_volumes(self, filters):
+        return self.volumes
+
+    async def remove_volume(self, name: str):
+        self.removed.append(name)
+
+
+class SharedDirectory(InMemorySessionDirectory):
+    """Stands in for the redis directory: knows which nodes heartbeat"""
+
+    shared = True
+
+    def __init__(self, alive: Dict[str, bool]):
+        super().__init__("self", "ws://self:8000")
+        self.alive = alive
+
+    async def is_node_alive(self, node_id: str) -> bool:
+        if node_id == "unreachable":
+            raise ConnectionError("redis is down")
+        return self.alive.get(node_id, False)
+
+
+CONTAINERS = {
+    "cli-quest-live": "self",
+    "cli-quest-leftover": "self",
+    "cli-quest-other-worker": "other",
+    "cli-quest-dead-node": "dead",
+    "cli-quest-unknown": "unreachable",
+}
+
+
+@pytest.fixture
+def docker(monkeypatch) -> FakeDockerService:
+    docker = FakeDockerService(CONTAINERS, ["cli-quest-live", "cli-quest-gone", "someone-elses"])
+    monkeypatch.setattr(reaper_module, "docker_service", docker)
+    monkeypatch.setattr(config, "NODE_ID", "self")
+    monkeypatch.setattr(reaper_module, "active_containers", active_containers | {"cli-quest-live"})
+    return docker
+
+
+def test_unshared_directory_leaves_other_nodes_alone(docker, monkeypatch):
+    monkeypatch.setattr(reaper_module.session_manager, "directory", InMemorySessionDirectory("self", "ws://self:8000"))
+
+    removed = asyncio.run(OrphanReaper().reap())
+    # Another worker on this host looks just like a dead node here
+    assert docker.removed == ["cli-quest-leftover", "cli-quest-gone"]
+    assert removed == {"containers": 1, "volumes": 1}
+
+
+def test_shared_directory_reaps_dead_nodes(docker, monkeypatch):
+    monkeypatch.setattr(reaper_module.session_manager, "directory", SharedDirectory({"other": True}))
+
+    reaper = OrphanReaper()
+    asyncio.run(reaper.reap())
+    # Nodes whose liveness can't be checked keep their containers this round
+    assert docker.removed == ["cli-quest-leftover", "cli-quest-dead-node", "cli-quest-gone"]
+    assert reaper.stats()["containers_reclaimed"] == 2
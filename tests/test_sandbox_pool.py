@@ -0,0 +1,41 @@
+import asyncio
+
+from app import config
+from app.core import sandbox_pool
+from app.core.sandbox_pool import SandboxPoolManager
+
+
+class FakeSandbox:
+    def __init__(self, session_id: str, image: str, reservation=None):
+        self.session_id = session_id
+        self.image = image
+        self.container_name = f"cli-quest-{session_id}"
+
+    async def initialize(self):
+        pass
+
+    async def cleanup(self, grace_period: int = 5):
+        pass
+
+
+def test_only_warmed_images_get_a_pool(monkeypatch):
+    monkeypatch.setattr(sandbox_pool, "DockerSandbox", FakeSandbox)
+    monkeypatch.setattr(config, "SANDBOX_POOL_ENABLED", True)
+
+    async def scenario():
+        pools = SandboxPoolManager()
+        pools.warm(["challenge-image"])
+
+        # An image nobody warmed is provisioned on demand and never refilled
+        sandbox = await pools.acquire("other-image", "s1")
+        assert sandbox.image == "other-image" and sandbox.session_id == "s1"
+        assert [pool["image"] for pool in pools.stats()["pools"]] == ["challenge-image"]
+
+        sandbox = await pools.acquire("challenge-image", "s2")
+        assert sandbox.session_id == "s2"
+        stats = pools.stats()["pools"][0]
+        assert stats["hits"] + stats["misses"] == 1
+
+        await pools.shutdown()
+
+    asyncio.run(scenario())
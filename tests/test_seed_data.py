@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from app.database.connection import Database
+from app.core.images import challenge_image_tag
+from app.database.seed_data import ChallengeSeeder, load_challenge_directory, prepare_challenge
+from app.models.challenge import challenge_detail
+
+SHARED = "same file in every challenge\n" * 100
+
+
+def _write_challenges(root, count):
+    for index in range(count):
+        challenge = {"id": f"c{index}", "title": f"Challenge {index}", "flag": "F", "expected_commands": ["ls"]}
+        if index % 2:
+            challenge["setup_files"] = {"own.txt": f"file {index}"}
+            (root / f"c{index}.json").write_text(json.dumps(challenge))
+        else:
+            directory = root / f"c{index}"
+            (directory / "files" / "docs").mkdir(parents=True)
+            (directory / "challenge.json").write_text(json.dumps(challenge))
+            (directory / "files" / "docs" / "shared.txt").write_text(SHARED)
+
+
+def test_sync_writes_only_changed_challenges(database_url, tmp_path):
+    _write_challenges(tmp_path, 20)
+
+    async def run():
+        db = Database(database_url, min_size=1, max_size=2)
+        await db.connect()
+        try:
+            await db.apply_schema()
+            seeder = ChallengeSeeder(db)
+            challenges = load_challenge_directory(str(tmp_path))
+
+            first = await seeder.sync(challenges)
+            assert (first.total, first.changed, first.removed) == (20, 20, 0)
+            # Ten distinct small files plus the shared one, stored once
+            assert first.blobs_written == 11
+
+            again = await seeder.sync(challenges)
+            assert (again.changed, again.removed, again.blobs_written) == (0, 0, 0)
+
+            by_id = {challenge["id"]: challenge for challenge in challenges}
+            by_id["c3"]["title"] = "Renamed"
+            by_id["c4"]["setup_files"]["docs/shared.txt"] = "edited"
+            challenges.remove(by_id["c5"])
+            changed = await seeder.sync(challenges)
+            assert (changed.total, changed.changed, changed.removed, changed.blobs_written) == (19, 2, 1, 1)
+
+            rows = await db.fetch("SELECT id, definition FROM challenges ORDER BY id")
+            assert len(rows) == 19
+            definitions = {row["id"]: json.loads(row["definition"]) for row in rows}
+            assert definitions["c3"]["title"] == "Renamed"
+            assert "setup_files" not in definitions["c3"]
+
+            files = await db.fetch(
+                "SELECT f.path, b.content FROM challenge_files f JOIN challenge_blobs b ON b.hash = f.blob_hash "
+                "WHERE f.challenge_id = $1",
+                "c4"
+            )
+            assert [(row["path"], bytes(row["content"])) for row in files] == [("docs/shared.txt", b"edited")]
+            # c5's own file is garbage collected with it
+            assert await db.fetchrow("SELECT 1 FROM challenge_blobs WHERE content = $1", b"file 5") is None
+        finally:
+            await db.close()
+
+    asyncio.run(run())
+
+
+def test_binary_setup_files_are_kept_as_bytes(tmp_path):
+    directory = tmp_path / "binary"
+    (directory / "files").mkdir(parents=True)
+    (directory / "challenge.json").write_text(json.dumps({"id": "binary", "title": "Binary", "flag": "F"}))
+    (directory / "files" / "notes.txt").write_text("héllo\n", encoding="utf-8")
+    (directory / "files" / "image.bin").write_bytes(b"\x89PNG\r\n\x1a\n\xff")
+
+    [challenge] = load_challenge_directory(str(tmp_path))
+    assert challenge["setup_files"] == {"image.bin": b"\x89PNG\r\n\x1a\n\xff", "notes.txt": "héllo\n"}
+
+    prepared = prepare_challenge(challenge)
+    assert prepared.blobs[prepared.files["image.bin"]] == b"\x89PNG\r\n\x1a\n\xff"
+    # Public views stay JSON: binary contents are base64-encoded
+    detail = json.loads(json.dumps(challenge_detail(challenge, [])))
+    assert detail["setup_files"] == {"image.bin": {"base64": "iVBORw0KGgr/"}, "notes.txt": "héllo\n"}
+    assert challenge_image_tag(challenge) != challenge_image_tag(dict(challenge, setup_files={"notes.txt": "héllo\n"}))
@@ -0,0 +1,148 @@
+import asyncio
+from typing import Awaitable, Callable
+
+import pytest
+
+from app.core.session_directory import RedisSessionDirectory
+from app.services.redis_client import RedisClient, RedisError
+from app.utils.exceptions import NodeConfigurationError
+from tests.fake_redis import FakeRedisServer
+
+
+@pytest.fixture(params=["python", "lua"])
+def scripts(request) -> str:
+    """Run directory tests with the fake's Python scripts, and with the real Lua when lupa is installed"""
+    if request.param == "lua":
+        pytest.importorskip("lupa")
+    return request.param
+
+
+def _run(scenario: Callable[[FakeRedisServer], Awaitable[None]], **server_options):
+    async def main():
+        server = FakeRedisServer(**server_options)
+        await server.start()
+        try:
+            await scenario(server)
+        finally:
+            await server.stop()
+
+    asyncio.run(main())
+
+
+def _directory(server: FakeRedisServer, node_id: str, node_url: str = "") -> RedisSessionDirectory:
+    return RedisSessionDirectory(
+        RedisClient(server.url, timeout=2),
+        node_id=node_id,
+        node_url=node_url or f"ws://{node_id}:8000"
+    )
+
+
+def test_claim_lookup_and_release(scripts):
+    async def scenario(server):
+        a, b = _directory(server, "a"), _directory(server, "b")
+
+        assert a.is_local(await a.claim("s1", "box-1", 30))
+        owner = await b.claim("s1", "box-2", 30)
+        assert owner.node_id == "a" and owner.node_url == "ws://a:8000" and owner.container == "box-1"
+        assert (await b.lookup("s1")).node_id == "a"
+
+        # Re-claiming our own session refreshes the entry
+        assert (await a.claim("s1", "box-3", 30)).container == "box-3"
+        assert (await b.lookup("s1")).container == "box-3"
+
+        # Only the owner can release
+        await b.release("s1")
+        assert await a.lookup("s1") is not None
+        await a.release("s1")
+        assert await a.lookup("s1") is None
+        assert b.is_local(await b.claim("s1", "box-2", 30))
+
+        await a.close()
+        await b.close()
+
+    _run(scenario, lua=scripts == "lua")
+
+
+def test_expired_lease_can_be_claimed(scripts):
+    async def scenario(server):
+        a, b = _directory(server, "a"), _directory(server, "b")
+
+        await a.claim("s1", None, 0.05)
+        await asyncio.sleep(0.1)
+        assert await a.lookup("s1") is None
+        server.commands.clear()
+        assert b.is_local(await b.claim("s1", None, 30))
+        # Claim-or-read is a single script, so the lease can't expire in between
+        assert [command[0] for command in server.commands] == ["EVAL"]
+
+        await a.close()
+        await b.close()
+
+    _run(scenario, lua=scripts == "lua")
+
+
+def test_renew_reports_lost_leases(scripts):
+    async def scenario(server):
+        a, b = _directory(server, "a"), _directory(server, "b")
+
+        await a.claim("kept", None, 30)
+        await a.claim("taken", None, 0.05)
+        await asyncio.sleep(0.1)
+        await b.claim("taken", None, 30)
+
+        assert await a.renew(["kept", "taken", "unknown"], 30) == ["taken", "unknown"]
+        assert await a.renew([], 30) == []
+
+        await a.close()
+        await b.close()
+
+    _run(scenario, lua=scripts == "lua")
+
+
+def test_heartbeat_rejects_a_node_url_in_use(scripts):
+    async def scenario(server):
+        a = _directory(server, "a", "ws://shared:8000")
+        b = _directory(server, "b", "ws://shared:8000")
+
+        await a.heartbeat(30)
+        with pytest.raises(NodeConfigurationError):
+            await b.heartbeat(30)
+        # The first node keeps its URL, and both still count as alive for the reaper
+        await a.heartbeat(30)
+        assert await a.is_node_alive("b")
+        assert await b.is_node_alive("a")
+        assert not await a.is_node_alive("c")
+
+        await a.close()
+        await b.close()
+
+    _run(scenario, lua=scripts == "lua")
+
+
+def test_node_url_is_required():
+    with pytest.raises(NodeConfigurationError):
+        RedisSessionDirectory(RedisClient(), node_id="a", node_url="")
+
+
+def test_client_authenticates_and_reconnects():
+    async def scenario(server):
+        client = RedisClient(server.url.replace("/0", "/2"), timeout=2)
+        assert await client.execute("SET", "key", "héllo") == "OK"
+        assert server.commands[:2] == [["AUTH", "secret"], ["SELECT", "2"]]
+
+        server.drop_connections()
+        assert await client.execute("GET", "key") == "héllo"
+        assert await client.execute("GET", "missing") is None
+
+        replies = await client.pipeline([["EXISTS", "key"], ["BOGUS"], ["DEL", "key"]])
+        assert replies[0] == 1 and isinstance(replies[1], RedisError) and replies[2] == 1
+        with pytest.raises(RedisError):
+            await client.execute("BOGUS")
+        await client.close()
+
+        wrong = RedisClient(f"redis://:wrong@127.0.0.1:{server.port}/0", timeout=2)
+        with pytest.raises(RedisError):
+            await wrong.execute("GET", "key")
+        await wrong.close()
+
+    _run(scenario, password="secret")
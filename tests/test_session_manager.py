@@ -0,0 +1,121 @@
+import asyncio
+from typing import List
+
+from app.core.execution import BACKEND_DOCKER
+from app.core.session_directory import InMemorySessionDirectory
+from app.core.session_manager import SessionManager
+from app.core.transport import CLOSE_SESSION_ENDED
+
+
+class FakeSandbox:
+    kind = BACKEND_DOCKER
+    memory_bytes = 0
+
+    def __init__(self, name: str, events: List[str]):
+        self.container_name = name
+        self.events = events
+
+    async def cleanup(self):
+        self.events.append(f"cleanup {self.container_name}")
+
+
+class FakeTransport:
+    def __init__(self, name: str, events: List[str]):
+        self.name = name
+        self.events = events
+
+    async def disconnect(self, code: int, reason: str):
+        self.events.append(f"disconnect {self.name} {code}")
+
+
+def _manager(**options) -> SessionManager:
+    return SessionManager(directory=InMemorySessionDirectory("node", "ws://node:8000"), **options)
+
+
+def test_eviction_prefers_detached_sessions():
+    async def scenario():
+        events: List[str] = []
+        manager = _manager(max_sandboxes=3, idle_timeout=3600, reconnect_grace=3600)
+        for name in ("a", "b", "c"):
+            await manager.register(name, FakeSandbox(name, events))
+            manager.attach(name, FakeTransport(name, events))
+        manager.detach("b", manager.get_session("b").transports.copy().pop())
+        manager.touch("a")
+
+        # c is the least recently used, but b is the only one nobody is connected to
+        await manager.register("d", FakeSandbox("d", events))
+        assert events == ["cleanup b"]
+        # Nobody has connected to d yet, so it isn't given away to a queued session
+        assert await manager.evict_detached(BACKEND_DOCKER) == 0
+        transport = FakeTransport("d", events)
+        manager.attach("d", transport)
+        manager.detach("d", transport)
+        assert await manager.evict_detached(BACKEND_DOCKER) == 1
+        assert events[-1] == "cleanup d"
+
+        # With every session connected, the least recently used one goes, websocket first
+        await manager.register("e", FakeSandbox("e", events))
+        manager.attach("e", FakeTransport("e", events))
+        await manager.register("f", FakeSandbox("f", events))
+        assert events[-2:] == [f"disconnect c {CLOSE_SESSION_ENDED}", "cleanup c"]
+        assert manager.session_ids() == ["a", "e", "f"]
+
+    asyncio.run(scenario())
+
+
+def test_reap_closes_connected_sessions_first():
+    async def scenario():
+        events: List[str] = []
+        manager = _manager(idle_timeout=0.2, reconnect_grace=0.05)
+        for name in ("idle", "detached", "active"):
+            await manager.register(name, FakeSandbox(name, events))
+        manager.attach("idle", FakeTransport("idle", events))
+        manager.attach("active", FakeTransport("active", events))
+
+        await asyncio.sleep(0.1)
+        assert await manager.reap() == 1
+        assert events == ["cleanup detached"]
+
+        await asyncio.sleep(0.15)
+        manager.touch("active")
+        assert await manager.reap() == 1
+        assert events[1:] == [f"disconnect idle {CLOSE_SESSION_ENDED}", "cleanup idle"]
+        assert manager.session_ids() == ["active"]
+
+    asyncio.run(scenario())
+
+
+def test_detach_ignores_connections_to_a_replaced_session():
+    async def scenario():
+        events: List[str] = []
+        manager = _manager(idle_timeout=3600, reconnect_grace=3600)
+        old = FakeTransport("old", events)
+        await manager.register("s1", FakeSandbox("first", events))
+        manager.attach("s1", old)
+
+        await manager.register("s1", FakeSandbox("second", events))
+        manager.attach("s1", FakeTransport("new", events))
+        manager.detach("s1", old)
+        assert manager.get_session("s1").connections == 1
+        assert manager.stats()["connected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_admitted_sessions_wait_for_their_learner():
+    async def scenario():
+        events: List[str] = []
+        manager = _manager(idle_timeout=3600, reconnect_grace=0.05)
+        # Sessions started for queued learners, one after another under a rush
+        for name in ("a", "b"):
+            await manager.register(name, FakeSandbox(name, events))
+            assert await manager.evict_detached(BACKEND_DOCKER) == 0
+        assert manager.session_ids() == ["a", "b"]
+
+        # A learner who never connects still has their sandbox reaped after the grace
+        await asyncio.sleep(0.1)
+        manager.attach("b", FakeTransport("b", events))
+        assert await manager.reap() == 1
+        assert manager.session_ids() == ["b"]
+
+    asyncio.run(scenario())
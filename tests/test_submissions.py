@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+from app.api import challenges
+from app.core.scoring import ScoringEngine
+from app.core.submissions import SubmissionPipeline
+from app.models.leaderboard import Leaderboard
+
+
+def test_rotating_user_ids_does_not_escape_the_rate_limit(monkeypatch):
+    from app import main
+
+    pipeline = SubmissionPipeline(
+        rate_burst=2, rate_per_second=0.001, address_rate_burst=6, address_rate_per_second=0.001
+    )
+    monkeypatch.setattr(challenges, "submission_pipeline", pipeline)
+    client = TestClient(main.app)
+
+    def submit(user_id: str) -> int:
+        return client.post("/api/challenges/basic-ls/submit", json={"user_id": user_id, "flag": "guess"}).status_code
+
+    # Each user gets their own bucket within the address
+    assert [submit("alice") for _ in range(3)] == [200, 200, 429]
+    # A fresh id per attempt only lasts until the address has used up its six
+    assert [submit(f"user-{i}") for i in range(4)] == [200, 200, 200, 429]
+    assert len(pipeline.limiter._buckets) == 4
+
+
+def test_solves_persist_the_points_they_awarded(monkeypatch):
+    from app import main
+
+    pipeline = SubmissionPipeline()
+    # Accept into the queue without a writer, so the queued attempts can be inspected
+    pipeline._accepting = True
+    monkeypatch.setattr(challenges, "submission_pipeline", pipeline)
+    monkeypatch.setattr(challenges, "scoring_engine", ScoringEngine(first_blood_bonuses="50"))
+    monkeypatch.setattr(challenges, "leaderboard", Leaderboard())
+    client = TestClient(main.app)
+    flag = challenges.get_challenge_or_404("basic-ls")["flag"]
+
+    def submit(user_id: str, guess: str = flag) -> int:
+        return client.post("/api/challenges/basic-ls/submit", json={"user_id": user_id, "flag": guess}).json()["points"]
+
+    awarded = [submit("alice"), submit("alice"), submit("bob", "guess"), submit("bob")]
+    queued = [pipeline._queue.get_nowait() for _ in range(4)]
+    assert [(item.user_id, item.correct, item.points) for item in queued] == [
+        ("alice", True, awarded[0]), ("alice", True, 0), ("bob", False, 0), ("bob", True, awarded[3])
+    ]
+    # The first solver's bonus is in what was stored, and the second solve already earns the decayed value
+    assert awarded[0] > awarded[3] > 0
@@ -0,0 +1,68 @@
+import asyncio
+import socket
+
+from app.core import terminal as terminal_module
+from app.core.terminal import PtyStream
+
+
+class BlockingSocket:
+    """Stands in for a TLS socket to the daemon, which only supports blocking calls"""
+
+    def __init__(self, sock: socket.socket):
+        self.connection = sock
+
+    def recv(self, size: int) -> bytes:
+        return self.connection.recv(size)
+
+    def sendall(self, data: bytes):
+        self.connection.sendall(data)
+
+    def shutdown(self, how: int):
+        self.connection.shutdown(how)
+
+    def close(self):
+        self.connection.close()
+
+
+class FakeDockerService:
+    def __init__(self, sock: BlockingSocket):
+        self.sock = sock
+        self.calls = []
+
+    async def exec_create(self, container, cmd, **kwargs):
+        return "exec-1"
+
+    async def exec_attach(self, exec_id, tty=True):
+        return self.sock
+
+    async def exec_resize(self, exec_id, height, width):
+        pass
+
+    async def run(self, kind, func, *args, **kwargs):
+        self.calls.append(kind)
+        return func(*args, **kwargs)
+
+
+def test_blocking_streams_do_not_hold_docker_workers(monkeypatch):
+    async def scenario():
+        ours, shell = socket.socketpair()
+        docker = FakeDockerService(BlockingSocket(ours))
+        monkeypatch.setattr(terminal_module, "docker_service", docker)
+
+        stream = PtyStream(container=None, working_dir="/workspace")
+        await stream.open()
+        await stream.write("ls\n")
+        assert shell.recv(16) == b"ls\n"
+        shell.sendall(b"file.txt\r\n")
+        assert await stream.read() == b"file.txt\r\n"
+
+        # An idle shell leaves a read blocked until the stream is closed
+        pending = asyncio.ensure_future(stream.read())
+        await asyncio.sleep(0.05)
+        assert not pending.done()
+        await stream.close()
+        assert await asyncio.wait_for(pending, timeout=2) == b""
+        assert docker.calls == []
+        shell.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import transcripts as transcripts_module
+from app.core.transcripts import EVENT_INPUT, EVENT_OUTPUT, TranscriptRecorder
+
+
+def _recorder(tmp_path) -> TranscriptRecorder:
+    return TranscriptRecorder(directory=str(tmp_path), enabled=True, max_pending_bytes=1024)
+
+
+def _fail_append(path, chunk, level, max_bytes=0):
+    raise OSError("No space left on device")
+
+
+async def _replay(recorder: TranscriptRecorder, session_id: str):
+    return [event.data async for event in recorder.replay(session_id, speed=0)]
+
+
+def test_append_after_torn_chunk(tmp_path):
+    async def scenario():
+        recorder = _recorder(tmp_path)
+        recorder.record("s1", EVENT_OUTPUT, "first")
+        await recorder.flush()
+
+        # A crash mid-write leaves part of a chunk at the end of the file
+        with open(recorder.path("s1"), "ab") as f:
+            f.write(b"\x40\x00\x00\x00partial")
+
+        # The same session id recorded again by a new process
+        restarted = _recorder(tmp_path)
+        restarted.record("s1", EVENT_INPUT, "second")
+        await restarted.flush()
+
+        assert len(await restarted.index("s1")) == 2
+        assert await _replay(restarted, "s1") == [b"first", b"second"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_write_is_retried(tmp_path, monkeypatch):
+    async def scenario():
+        recorder = _recorder(tmp_path)
+        append_chunk = transcripts_module._append_chunk
+
+        recorder.record("s1", EVENT_OUTPUT, "one")
+        monkeypatch.setattr(transcripts_module, "_append_chunk", _fail_append)
+        await recorder.flush()
+        assert recorder.chunks_written == 0
+        assert recorder.pending_bytes > 0
+
+        # Events recorded meanwhile stay behind the ones that failed
+        recorder.record("s1", EVENT_OUTPUT, "two")
+        monkeypatch.setattr(transcripts_module, "_append_chunk", append_chunk)
+        await recorder.flush()
+        assert recorder.pending_bytes == 0
+        assert await _replay(recorder, "s1") == [b"one", b"two"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_writes_are_bounded(tmp_path, monkeypatch):
+    async def scenario():
+        recorder = _recorder(tmp_path)
+        monkeypatch.setattr(transcripts_module, "_append_chunk", _fail_append)
+        for _ in range(3):
+            recorder.record("s1", EVENT_OUTPUT, "x" * 400)
+            await recorder.flush()
+        # Retried chunks never push a session past max_pending_bytes
+        assert recorder.pending_bytes <= recorder.max_pending_bytes
+        assert recorder.dropped > 0
+
+    asyncio.run(scenario())
+
+
+def test_transcript_endpoint(tmp_path, monkeypatch):
+    from app import config, main
+
+    recorder = _recorder(tmp_path)
+    monkeypatch.setattr(main, "transcripts", recorder)
+    monkeypatch.setattr(config, "WATCH_TOKEN", "secret")
+    recorder.record("s1", EVENT_OUTPUT, "hello")
+    (tmp_path / "bogus.transcript").write_bytes(b"not a transcript")
+
+    client = TestClient(main.app)
+    # Replay is off entirely until a token is configured
+    monkeypatch.setattr(config, "WATCH_TOKEN", "")
+    assert client.get("/api/sessions/s1/transcript?token=").status_code == 403
+    monkeypatch.setattr(config, "WATCH_TOKEN", "secret")
+
+    assert client.get("/api/sessions/s1/transcript").status_code == 403
+    assert client.get("/api/sessions/s1/transcript?token=wrong").status_code == 403
+
+    response = client.get("/api/sessions/s1/transcript?token=secret")
+    assert response.status_code == 200
+    assert '"data": "hello"' in response.text
+    assert client.get("/api/sessions/bogus/transcript?token=secret").status_code == 422
+    assert client.get("/api/sessions/missing/transcript?token=secret").status_code == 404
+
+
+def test_file_size_cap(tmp_path):
+    async def scenario():
+        recorder = TranscriptRecorder(directory=str(tmp_path), enabled=True, max_bytes=200, compression_level=0)
+        recorder.record("s1", EVENT_OUTPUT, "a" * 100)
+        await recorder.flush()
+        recorder.record("s1", EVENT_OUTPUT, "b" * 100)
+        recorder.record("s1", EVENT_INPUT, "c")
+        await recorder.flush()
+
+        # The second chunk would pass the cap, so its events are dropped instead of retried
+        assert await _replay(recorder, "s1") == [b"a" * 100]
+        assert (tmp_path / "s1.transcript").stat().st_size <= 200
+        assert recorder.dropped == 2 and recorder.pending_bytes == 0
+        assert recorder.chunks_written == 1
+
+    asyncio.run(scenario())
+
+
+def test_expired_transcripts_are_pruned(tmp_path):
+    async def scenario():
+        recorder = TranscriptRecorder(directory=str(tmp_path), enabled=True, retention_days=1)
+        for session_id in ("old", "new"):
+            recorder.record(session_id, EVENT_OUTPUT, "x")
+        await recorder.flush()
+        old = tmp_path / "old.transcript"
+        two_days_ago = time.time() - 2 * 86400
+        os.utime(old, (two_days_ago, two_days_ago))
+        (tmp_path / "notes.txt").write_text("not ours")
+
+        assert await recorder.prune() == 1
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["new.transcript", "notes.txt"]
+
+        # A session recorded again after pruning starts a fresh file
+        recorder.record("old", EVENT_INPUT, "y")
+        await recorder.flush()
+        assert await _replay(recorder, "old") == [b"y"]
+
+    asyncio.run(scenario())
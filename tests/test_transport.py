@@ -0,0 +1,61 @@
+import asyncio
+import json
+from typing import Any, List
+
+from app.core.transport import (
+    BINARY_SUBPROTOCOL,
+    FRAME_OUTPUT,
+    OVERFLOW_DROP,
+    TRUNCATED_NOTICE,
+    TerminalTransport,
+)
+
+
+class FakeWebSocket:
+    def __init__(self, binary: bool = False):
+        self.scope = {"subprotocols": [BINARY_SUBPROTOCOL] if binary else []}
+        self.sent: List[Any] = []
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def send_bytes(self, data: bytes):
+        self.sent.append(data)
+
+
+def test_json_output_carries_the_server_sequence_number():
+    async def scenario():
+        websocket = FakeWebSocket()
+        transport = TerminalTransport(websocket)
+        # Invalid UTF-8 is replaced, and a character split across chunks waits for its last byte
+        for data, seq in ((b"ab\xff", 3), (b"c\xe2\x82", 6), (b"\xac", 7)):
+            await transport.send_output(data, seq)
+            await transport._flush_pending()
+        assert websocket.sent == [
+            {"type": "output", "data": "ab�", "seq": 3},
+            {"type": "output", "data": "c", "seq": 4},
+            {"type": "output", "data": "€", "seq": 7},
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_truncation_notice_is_not_output():
+    async def scenario():
+        websocket = FakeWebSocket(binary=True)
+        transport = TerminalTransport(websocket, high_water=4, overflow_policy=OVERFLOW_DROP)
+        await transport.send_output(b"1234", 4)
+        await transport.send_output(b"5678", 8)
+        await transport._flush_pending()
+        await transport.send_output(b"9", 9)
+        await transport._flush_pending()
+
+        assert websocket.sent == [
+            bytes([FRAME_OUTPUT]) + b"1234",
+            {"type": "error", "data": TRUNCATED_NOTICE},
+            {"type": "sync", "seq": 8},
+            bytes([FRAME_OUTPUT]) + b"9",
+        ]
+        assert transport.bytes_dropped == 4
+
+    asyncio.run(scenario())
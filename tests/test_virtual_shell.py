@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from app.core.virtual_shell import ShellSyntaxError, Token, VirtualFilesystem, VirtualShell, tokenize
+
+FILES = {
+    "notes.txt": "one\ntwo\nthree\n",
+    "docs/a.md": "alpha\n",
+    "docs/b.md": "beta\n",
+    ".hidden": "secret\n",
+}
+
+
+def _shell(files=FILES) -> VirtualShell:
+    shell = VirtualShell("s1", challenge_files=files)
+    asyncio.run(shell.initialize())
+    return shell
+
+
+def _output(shell: VirtualShell, command: str) -> str:
+    return shell.run(command)[1]
+
+
+def test_tokenize_quotes_escapes_and_operators():
+    assert tokenize("""echo 'a  b' "c \\"d\\"" e\\ f|wc>>out;x&&y||z""") == [
+        Token("echo"), Token("a  b", quoted=True), Token('c "d"', quoted=True), Token("e f", quoted=True),
+        Token("|", operator=True), Token("wc"), Token(">>", operator=True), Token("out"),
+        Token(";", operator=True), Token("x"), Token("&&", operator=True), Token("y"),
+        Token("||", operator=True), Token("z"),
+    ]
+    with pytest.raises(ShellSyntaxError):
+        tokenize("echo 'unterminated")
+
+
+@pytest.mark.parametrize("command", ["| wc", "ls |", "ls &&", "; ls", "ls ;; pwd", "echo >", "echo > | wc", "sleep 1 &"])
+def test_syntax_errors_run_nothing(command):
+    shell = _shell()
+    status, output = shell.run(f"cd docs; {command}")
+    assert status == 2 and output.startswith("bash: syntax error")
+    assert shell.cwd == "/workspace"
+
+
+def test_command_lists():
+    shell = _shell()
+    assert _output(shell, "echo b; echo c") == "b\nc\n"
+    assert _output(shell, "cat notes.txt; echo z") == "one\ntwo\nthree\nz\n"
+    assert shell.run("cd docs && ls") == (0, "a.md  b.md\n")
+    assert _output(shell, "pwd;") == "/workspace/docs\n"
+    # && and || look at the status of the pipeline before them
+    assert shell.run("cat missing && echo no") == (1, "cat: missing: No such file or directory\n")
+    assert shell.run("cat missing || echo yes")[1].endswith("yes\n")
+    assert shell.run("cd /; cd nowhere || pwd") == (0, "bash: cd: nowhere: No such file or directory\n/\n")
+
+
+def test_globbing():
+    shell = _shell()
+    assert _output(shell, "echo docs/*.md") == "docs/a.md docs/b.md\n"
+    # Hidden files only match a pattern that starts with a dot
+    assert _output(shell, "echo *") == "docs notes.txt\n"
+    assert _output(shell, "echo .h*") == ".hidden\n"
+    # Unmatched and quoted patterns stay literal
+    assert _output(shell, "echo *.py '*.md'") == "*.py *.md\n"
+    # Each command of a list is expanded when it runs
+    assert _output(shell, "cd docs; echo *") == "a.md b.md\n"
+
+
+def test_head_and_tail_counts():
+    shell = _shell()
+    assert _output(shell, "head -n 2 notes.txt") == "one\ntwo\n"
+    assert _output(shell, "head -n -1 notes.txt") == "one\ntwo\n"
+    assert _output(shell, "tail -n -1 notes.txt") == "three\n"
+    assert _output(shell, "tail -1 notes.txt") == "three\n"
+    assert _output(shell, "tail -n +2 notes.txt") == "two\nthree\n"
+    assert _output(shell, "cat notes.txt | tail -n 0") == ""
+
+
+def test_redirection():
+    shell = _shell()
+    assert shell.run("echo hi > out.txt") == (0, "")
+    assert shell.run("echo there >> out.txt") == (0, "")
+    assert _output(shell, "cat out.txt") == "hi\nthere\n"
+    assert shell.run("grep t notes.txt | wc -l > count.txt") == (0, "")
+    assert _output(shell, "cat count.txt") == "2\n"
+
+    assert shell.run("echo hi > /") == (1, "bash: /: Is a directory\n")
+    assert shell.run("echo hi > docs") == (1, "bash: docs: Is a directory\n")
+    assert shell.run("echo hi > new/") == (1, "bash: new/: Is a directory\n")
+    assert shell.run("echo hi > missing/out.txt") == (1, "bash: missing/out.txt: No such file or directory\n")
+    assert "" not in shell.fs.root
+    assert _output(shell, "ls /") == "workspace\n"
+
+
+def test_copy_on_write_sessions_share_a_baseline():
+    baseline = VirtualFilesystem()
+    baseline.seed(FILES)
+    snapshot = baseline.snapshot()
+    first, second = VirtualShell("a", snapshot=snapshot), VirtualShell("b", snapshot=snapshot)
+    for shell in (first, second):
+        asyncio.run(shell.initialize())
+
+    assert first.run("echo changed > docs/a.md") == (0, "")
+    assert _output(first, "cat docs/a.md") == "changed\n"
+    assert _output(second, "cat docs/a.md") == "alpha\n"
+    assert snapshot.root["workspace"]["docs"]["a.md"] == "alpha\n"
+    # Only the directories on the written path were copied
+    assert first.fs.root["workspace"]["docs"] is not snapshot.root["workspace"]["docs"]
+    assert first.fs.root["workspace"]["notes.txt"] is snapshot.root["workspace"]["notes.txt"]
+    assert second.fs.root is snapshot.root
+
+    asyncio.run(first.reset())
+    assert first.fs.root is snapshot.root and first.fs.written_bytes == 0
+    assert _output(first, "cat docs/a.md") == "alpha\n"
+
+
+def test_write_budget():
+    fs = VirtualFilesystem(max_bytes=8)
+    fs.write("/workspace/a", "12345")
+    with pytest.raises(OSError):
+        fs.write("/workspace/b", "12345")
+    assert fs.lookup("/workspace/b") is None